@@ -1,16 +1,35 @@
+import base64
+import heapq
 import json
+from itertools import islice
 
 import frappe
 from bs4 import BeautifulSoup
 from frappe import _
 from frappe.desk.form.load import get_docinfo
 from frappe.query_builder import JoinType
+from frappe.utils import cint, get_datetime
 
-from crm.fcrm.doctype.crm_call_log.crm_call_log import parse_call_log
+from crm.fcrm.doctype.crm_call_log.crm_call_log import parse_call_logs
 
 
 @frappe.whitelist()
-def get_activities(name):
+def get_activities(name, timeline=True):
+	"""Returns `(activities, calls, notes, tasks, attachments)` of lead/deal `name`
+
+	:param timeline: if not set `activities` is empty, the timeline is then read with `get_activities_page`
+	"""
+	timeline = cint(timeline)
+	if is_activity_feed_ready() or not timeline:
+		references = get_timeline_references(name)
+		frappe.has_permission(references[0][0], "read", name, throw=True)
+
+		if is_activity_feed_ready():
+			return get_feed_timeline(references, None if timeline else ["call", "note", "task", "attachment"])
+
+		calls, notes, tasks = get_linked_activities([reference[1] for reference in references])
+		return [], calls, notes, tasks, get_attachments(references)
+
 	if frappe.db.exists("CRM Deal", name):
 		return get_deal_activities(name)
 	elif frappe.db.exists("CRM Lead", name):
@@ -19,34 +38,549 @@ def get_activities(name):
 		frappe.throw(_("Document not found"), frappe.DoesNotExistError)
 
 
-def get_deal_activities(name):
-	get_docinfo("", "CRM Deal", name)
-	docinfo = frappe.response["docinfo"]
-	deal_meta = frappe.get_meta("CRM Deal")
-	deal_fields = {
-		field.fieldname: {"label": field.label, "options": field.options} for field in deal_meta.fields
+TIMELINE_ACTIVITY_TYPES = [
+	"creation",
+	"version",
+	"comment",
+	"communication",
+	"attachment_log",
+	"call",
+	"note",
+	"task",
+]
+
+VERSION_ACTIVITY_TYPES = ["changed", "added", "removed"]
+
+
+@frappe.whitelist()
+def get_activities_page(name, cursor=None, limit=20, activity_types=None):
+	"""Returns a page of the timeline of lead/deal `name`, newest first
+
+	Once the `CRM Activity` feed is backfilled a page is a range read of the feed, until then every activity
+	source is read in `creation` order, `limit` rows at a time, and the sources are merged lazily so a page
+	only reads what it returns. Email bodies are not included, use `get_email_content`.
+
+	:param cursor: `next_cursor` returned with the previous page
+	:param activity_types: list of `TIMELINE_ACTIVITY_TYPES` to include, all if not set
+	:return: `{"activities": [...], "next_cursor": "..."}`
+	"""
+	references = get_timeline_references(name)
+	frappe.has_permission(references[0][0], "read", name, throw=True)
+
+	limit = cint(limit) or 20
+	activity_types = frappe.parse_json(activity_types) or TIMELINE_ACTIVITY_TYPES
+	before = decode_cursor(cursor) if cursor else None
+
+	sources = get_timeline_sources(references, activity_types, before, limit)
+	merged = heapq.merge(*sources, key=get_timeline_sort_key, reverse=True)
+	activities = list(islice(merged, limit))
+
+	next_cursor = None
+	for activity in merged:
+		# changes grouped together by `handle_multiple_versions` are not split across pages
+		if not is_same_version_group(activities[-1], activity):
+			next_cursor = encode_cursor(activities[-1])
+			break
+		activities.append(activity)
+
+	set_timeline_attachments(activities)
+	# calls of the page are enriched together, sources yield them as they are
+	parse_call_logs([activity for activity in activities if activity["activity_type"] == "call"])
+
+	return {"activities": handle_multiple_versions(activities), "next_cursor": next_cursor}
+
+
+@frappe.whitelist()
+def get_email_content(name):
+	"""Returns body of the email, timeline pages only have its subject and participants"""
+	communication = frappe.get_doc("Communication", name)
+	communication.check_permission("read")
+	return communication.content
+
+
+def is_same_version_group(activity, next_activity):
+	return (
+		activity["activity_type"] in VERSION_ACTIVITY_TYPES
+		and next_activity["activity_type"] in VERSION_ACTIVITY_TYPES
+		and activity.get("owner") == next_activity.get("owner")
+	)
+
+
+def get_timeline_references(name):
+	"""Returns `(doctype, name)` of the lead/deal `name` and, for a deal, of its lead"""
+	if frappe.db.exists("CRM Deal", name):
+		references = [("CRM Deal", name)]
+		if lead := frappe.db.get_value("CRM Deal", name, "lead"):
+			references.append(("CRM Lead", lead))
+		return references
+	elif frappe.db.exists("CRM Lead", name):
+		return [("CRM Lead", name)]
+	else:
+		frappe.throw(_("Document not found"), frappe.DoesNotExistError)
+
+
+def get_feed_timeline(references, activity_types=None):
+	"""Returns `(activities, calls, notes, tasks, attachments)` of `references` read from the feed
+
+	:param activity_types: feed activity types to read, e.g. `["call", "note"]`, all if not set
+	"""
+	filters = [
+		["reference_doctype", "in", list({reference[0] for reference in references})],
+		["reference_name", "in", [reference[1] for reference in references]],
+	]
+	if activity_types:
+		filters.append(["activity_type", "in", activity_types])
+
+	rows = frappe.db.get_all(
+		"CRM Activity",
+		filters=filters,
+		fields=["source_doctype", "source_name", "activity_type", "creation", "data"],
+		order_by="creation desc, source_name desc",
+	)
+
+	activities, calls, notes, tasks, attachments = [], [], [], [], []
+	buckets = {"call": calls, "note": notes, "task": tasks, "attachment": attachments}
+	sources = set()
+	for row in rows:
+		# calls and emails linked with both the deal and its lead are in the feed twice
+		if (row.source_doctype, row.source_name) in sources:
+			continue
+		sources.add((row.source_doctype, row.source_name))
+
+		activity = frappe.parse_json(row.data)
+		activity.update({"name": row.source_name, "creation": row.creation})
+		buckets.get(row.activity_type, activities).append(activity)
+
+	if not activity_types:
+		set_communication_content(activities)
+		set_timeline_attachments(activities)
+		for doctype, name in references:
+			activities += get_creation_activities(doctype, name, references, None)
+		activities.sort(key=get_timeline_sort_key, reverse=True)
+
+	call_notes, call_tasks = get_call_notes_and_tasks([call["name"] for call in calls])
+	notes += get_notes_by_names(call_notes, exclude={note["name"] for note in notes})
+	tasks += get_tasks_by_names(call_tasks, exclude={task["name"] for task in tasks})
+
+	return handle_multiple_versions(activities), parse_call_logs(calls), notes, tasks, attachments
+
+
+def set_communication_content(activities):
+	"""Set body of the emails of a timeline using a single query, the feed does not store it"""
+	communications = {
+		activity["name"]: activity for activity in activities if activity["activity_type"] == "communication"
 	}
-	avoid_fields = [
-		"lead",
-		"response_by",
-		"sla_creation",
-		"sla",
-		"first_response_time",
-		"first_responded_on",
+	if not communications:
+		return
+
+	for communication in frappe.db.get_all(
+		"Communication", filters={"name": ("in", list(communications))}, fields=["name", "content"]
+	):
+		communications[communication.name]["data"]["content"] = communication.content
+
+
+def get_call_notes_and_tasks(calls):
+	"""Returns `(notes, tasks)`, names of the notes and tasks linked with any of the `calls`"""
+	notes, tasks = [], []
+	if not calls:
+		return notes, tasks
+
+	for link in frappe.db.get_all(
+		"Dynamic Link",
+		filters={
+			"parenttype": "CRM Call Log",
+			"parent": ("in", calls),
+			"link_doctype": ("in", ["FCRM Note", "CRM Task"]),
+		},
+		fields=["link_doctype", "link_name"],
+	):
+		(notes if link.link_doctype == "FCRM Note" else tasks).append(link.link_name)
+	return notes, tasks
+
+
+def get_notes_by_names(names, exclude=()):
+	names = set(names) - set(exclude)
+	if not names:
+		return []
+	notes = frappe.db.get_all(
+		"FCRM Note",
+		filters={"name": ("in", list(names))},
+		fields=["name", "title", "content", "owner", "creation", "modified"],
+	)
+	for note in notes:
+		note["activity_type"] = "note"
+	return notes
+
+
+def get_tasks_by_names(names, exclude=()):
+	names = set(names) - set(exclude)
+	if not names:
+		return []
+	tasks = frappe.db.get_all(
+		"CRM Task",
+		filters={"name": ("in", list(names))},
+		fields=[
+			"name",
+			"title",
+			"description",
+			"assigned_to",
+			"due_date",
+			"priority",
+			"status",
+			"owner",
+			"creation",
+			"modified",
+		],
+	)
+	for task in tasks:
+		task["activity_type"] = "task"
+	return tasks
+
+
+def get_timeline_sources(references, activity_types, before, limit):
+	"""Returns iterators of activities of `references` sorted newest first, one per activity source"""
+	sources = []
+	names = [reference[1] for reference in references]
+
+	if "creation" in activity_types:
+		sources += [
+			get_creation_activities(doctype, name, references, before) for doctype, name in references
+		]
+
+	if is_activity_feed_ready():
+		sources.append(get_feed_activities(references, activity_types, before, limit))
+		return sources + get_call_note_and_task_sources(names, activity_types, before, limit)
+
+	for doctype, name in references:
+		if "version" in activity_types:
+			sources.append(get_version_activities(doctype, name, before, limit))
+		if "comment" in activity_types:
+			sources.append(get_comment_activities(doctype, name, before, limit))
+		if "attachment_log" in activity_types:
+			sources.append(get_attachment_log_activities(doctype, name, before, limit))
+		if "communication" in activity_types:
+			sources.append(get_communication_activities(doctype, name, before, limit))
+
+	if "call" in activity_types:
+		sources += get_call_activities(names, before, limit)
+	if "note" in activity_types:
+		sources.append(get_note_activities([["reference_docname", "in", names]], before, limit))
+	if "task" in activity_types:
+		sources.append(get_task_activities([["reference_docname", "in", names]], before, limit))
+
+	return sources + get_call_note_and_task_sources(names, activity_types, before, limit)
+
+
+def get_call_note_and_task_sources(names, activity_types, before, limit):
+	"""Returns sources of the notes and tasks linked with the calls of `names` and not referencing them"""
+	if "note" not in activity_types and "task" not in activity_types:
+		return []
+
+	linked_calls = frappe.db.get_all(
+		"Dynamic Link",
+		filters={"link_name": ("in", names), "parenttype": "CRM Call Log"},
+		pluck="parent",
+	)
+	notes, tasks = get_call_notes_and_tasks(linked_calls)
+
+	sources = []
+	if notes and "note" in activity_types:
+		notes = get_note_activities([["name", "in", notes]], before, limit)
+		sources.append(note for note in notes if note.reference_docname not in names)
+	if tasks and "task" in activity_types:
+		tasks = get_task_activities([["name", "in", tasks]], before, limit)
+		sources.append(task for task in tasks if task.reference_docname not in names)
+	return sources
+
+
+def is_activity_feed_ready():
+	"""Whether the `CRM Activity` feed has been backfilled and can be used to read timelines"""
+	return cint(frappe.db.get_global("crm_activity_feed_ready"))
+
+
+def get_feed_activities(references, activity_types, before, limit):
+	"""Yields activities of `references` from the `CRM Activity` feed, newest first"""
+	rows = iter_timeline_rows(
+		"CRM Activity",
+		[
+			["reference_doctype", "in", list({reference[0] for reference in references})],
+			["reference_name", "in", [reference[1] for reference in references]],
+			["activity_type", "in", activity_types],
+		],
+		["source_doctype", "source_name", "activity_type", "creation", "data"],
+		before,
+		limit,
+		name_field="source_name",
+	)
+
+	last_source = None
+	for row in rows:
+		# calls linked with both the deal and its lead are in the feed twice, one after the other
+		if (row.source_doctype, row.source_name) == last_source:
+			continue
+		last_source = (row.source_doctype, row.source_name)
+
+		activity = frappe.parse_json(row.data)
+		activity.update({"name": row.source_name, "creation": row.creation})
+		yield activity
+
+
+def get_creation_activities(doctype, name, references, before):
+	creation, owner = frappe.db.get_values(doctype, name, ["creation", "owner"])[0]
+
+	if doctype == "CRM Lead":
+		text = "created this lead"
+	elif len(references) > 1:
+		text = "converted the lead to this deal"
+	else:
+		text = "created this deal"
+
+	activity = {
+		"name": name,
+		"activity_type": "creation",
+		"creation": creation,
+		"owner": owner,
+		"data": text,
+		"is_lead": doctype == "CRM Lead",
+	}
+	if not before or get_timeline_sort_key(activity) < (get_datetime(before.creation), before.name):
+		yield activity
+
+
+def get_version_activities(doctype, name, before, limit):
+	meta_fields = get_timeline_fields(doctype)
+	avoid_fields = get_timeline_avoid_fields(doctype)
+	versions = iter_timeline_rows(
+		"Version",
+		[["ref_doctype", "=", doctype], ["docname", "=", name]],
+		["name", "owner", "creation", "data"],
+		before,
+		limit,
+	)
+	for version in versions:
+		if activity := get_version_activity(version, meta_fields, avoid_fields, doctype == "CRM Lead"):
+			activity["name"] = version.name
+			yield activity
+
+
+def get_comment_activities(doctype, name, before, limit):
+	comments = iter_timeline_rows(
+		"Comment",
+		[
+			["reference_doctype", "=", doctype],
+			["reference_name", "=", name],
+			["comment_type", "=", "Comment"],
+		],
+		["name", "creation", "owner", "content"],
+		before,
+		limit,
+	)
+	for comment in comments:
+		yield get_comment_activity(comment, [], doctype == "CRM Lead")
+
+
+def get_attachment_log_activities(doctype, name, before, limit):
+	attachment_logs = iter_timeline_rows(
+		"Comment",
+		[
+			["reference_doctype", "=", doctype],
+			["reference_name", "=", name],
+			["comment_type", "in", ["Attachment", "Attachment Removed"]],
+		],
+		["name", "creation", "owner", "content", "comment_type"],
+		before,
+		limit,
+	)
+	for attachment_log in attachment_logs:
+		yield get_attachment_log_activity(attachment_log, doctype == "CRM Lead")
+
+
+def get_communication_activities(doctype, name, before, limit):
+	communications = iter_timeline_rows(
+		"Communication",
+		[
+			["reference_doctype", "=", doctype],
+			["reference_name", "=", name],
+			["communication_type", "in", ["Communication", "Automated Message"]],
+		],
+		[
+			"name",
+			"communication_type",
+			"communication_date",
+			"creation",
+			"subject",
+			"sender_full_name",
+			"sender",
+			"recipients",
+			"cc",
+			"bcc",
+			"read_by_recipient",
+			"delivery_status",
+		],
+		before,
+		limit,
+	)
+	for communication in communications:
+		activity = get_communication_activity(communication, [], doctype == "CRM Lead")
+		activity["name"] = communication.name
+		yield activity
+
+
+def get_call_activities(names, before, limit):
+	"""Returns call sources: calls referencing `names` and calls linked with them"""
+	fields = [
+		"name",
+		"caller",
+		"receiver",
+		"from",
+		"to",
+		"duration",
+		"start_time",
+		"end_time",
+		"status",
+		"type",
+		"recording_url",
+		"creation",
+		"note",
 	]
+	calls = iter_timeline_rows("CRM Call Log", [["reference_docname", "in", names]], fields, before, limit)
+	sources = [({**call, "activity_type": "call"} for call in calls)]
+
+	linked_calls = frappe.db.get_all(
+		"Dynamic Link",
+		filters={"link_name": ("in", names), "parenttype": "CRM Call Log"},
+		pluck="parent",
+	)
+	if linked_calls:
+		other_calls = iter_timeline_rows(
+			"CRM Call Log",
+			[["name", "in", linked_calls], ["reference_docname", "not in", names]],
+			fields,
+			before,
+			limit,
+		)
+		sources.append({**call, "activity_type": "call"} for call in other_calls)
+
+	return sources
+
+
+def get_note_activities(filters, before, limit):
+	notes = iter_timeline_rows(
+		"FCRM Note",
+		filters,
+		["name", "title", "content", "owner", "creation", "modified", "reference_docname"],
+		before,
+		limit,
+	)
+	for note in notes:
+		note["activity_type"] = "note"
+		yield note
+
+
+def get_task_activities(filters, before, limit):
+	tasks = iter_timeline_rows(
+		"CRM Task",
+		filters,
+		[
+			"name",
+			"title",
+			"description",
+			"assigned_to",
+			"due_date",
+			"priority",
+			"status",
+			"owner",
+			"creation",
+			"modified",
+			"reference_docname",
+		],
+		before,
+		limit,
+	)
+	for task in tasks:
+		task["activity_type"] = "task"
+		yield task
+
+
+def iter_timeline_rows(doctype, filters, fields, before=None, limit=20, name_field="name"):
+	"""Yields rows of `doctype` newest first, fetching `limit` rows at a time after the `before` row
+
+	Rows created at the same time are ordered by `name_field`.
+	"""
+	while True:
+		_filters = filters.copy()
+		or_filters = None
+		if before:
+			_filters.append(["creation", "<=", before.creation])
+			or_filters = [["creation", "<", before.creation], [name_field, "<", before.name]]
+
+		rows = frappe.db.get_all(
+			doctype,
+			filters=_filters,
+			or_filters=or_filters,
+			fields=[*fields, name_field] if name_field not in fields else fields,
+			order_by=f"creation desc, {name_field} desc",
+			limit=limit,
+		)
+		yield from rows
+
+		if len(rows) < limit:
+			return
+		before = frappe._dict(creation=rows[-1].creation, name=rows[-1][name_field])
+
+
+def get_timeline_sort_key(activity):
+	return (get_datetime(activity.get("creation")), activity.get("name") or "")
+
+
+def set_timeline_attachments(activities):
+	"""Set attachments of the comments and emails of a timeline page using a single query"""
+	references = []
+	for activity in activities:
+		if activity["activity_type"] == "comment":
+			references.append(("Comment", activity["name"]))
+		elif activity["activity_type"] == "communication":
+			references.append(("Communication", activity["name"]))
+
+	attachments_map = get_attachments_map(references)
+	for activity in activities:
+		if activity["activity_type"] == "comment":
+			activity["attachments"] = attachments_map.get(("Comment", activity["name"]), [])
+		elif activity["activity_type"] == "communication":
+			activity["data"]["attachments"] = attachments_map.get(("Communication", activity["name"]), [])
+
+
+def encode_cursor(activity):
+	cursor = {"creation": str(activity.get("creation")), "name": activity.get("name")}
+	return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
 
+def decode_cursor(cursor):
+	try:
+		return frappe._dict(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+	except (ValueError, TypeError):
+		frappe.throw(_("Invalid cursor"), frappe.ValidationError)
+
+
+def get_deal_activities(name):
 	doc = frappe.db.get_values("CRM Deal", name, ["creation", "owner", "lead"])[0]
 	lead = doc[2]
 
+	lead_docinfo = get_timeline_docinfo("CRM Lead", lead) if lead else None
+	docinfo = get_timeline_docinfo("CRM Deal", name)
+
+	# one query each for all the attachments, calls, notes and tasks of the deal and its lead
+	references = [("CRM Deal", name), *get_docinfo_attachment_references(docinfo)]
+	if lead:
+		references += [("CRM Lead", lead), *get_docinfo_attachment_references(lead_docinfo)]
+	attachments_map = get_attachments_map(references)
+	calls, notes, tasks = get_linked_activities([lead, name] if lead else [name])
+
 	activities = []
-	calls = []
-	notes = []
-	tasks = []
-	attachments = []
 	creation_text = "created this deal"
 
 	if lead:
-		activities, calls, notes, tasks, attachments = get_lead_activities(lead)
+		activities = get_timeline_activities("CRM Lead", lead, lead_docinfo, attachments_map)
 		creation_text = "converted the lead to this deal"
 
 	activities.append(
@@ -58,105 +592,11 @@ def get_deal_activities(name):
 			"is_lead": False,
 		}
 	)
+	activities += get_docinfo_activities("CRM Deal", docinfo, attachments_map)
 
-	docinfo.versions.reverse()
-
-	for version in docinfo.versions:
-		data = json.loads(version.data)
-		if not data.get("changed"):
-			continue
-
-		if change := data.get("changed")[0]:
-			field = deal_fields.get(change[0], None)
-
-			if not field or change[0] in avoid_fields or (not change[1] and not change[2]):
-				continue
-
-			field_label = field.get("label") or change[0]
-			field_option = field.get("options") or None
-
-			activity_type = "changed"
-			data = {
-				"field": change[0],
-				"field_label": field_label,
-				"old_value": change[1],
-				"value": change[2],
-			}
-
-			if not change[1] and change[2]:
-				activity_type = "added"
-				data = {
-					"field": change[0],
-					"field_label": field_label,
-					"value": change[2],
-				}
-			elif change[1] and not change[2]:
-				activity_type = "removed"
-				data = {
-					"field": change[0],
-					"field_label": field_label,
-					"value": change[1],
-				}
-
-		activity = {
-			"activity_type": activity_type,
-			"creation": version.creation,
-			"owner": version.owner,
-			"data": data,
-			"is_lead": False,
-			"options": field_option,
-		}
-		activities.append(activity)
-
-	for comment in docinfo.comments:
-		activity = {
-			"name": comment.name,
-			"activity_type": "comment",
-			"creation": comment.creation,
-			"owner": comment.owner,
-			"content": comment.content,
-			"attachments": get_attachments("Comment", comment.name),
-			"is_lead": False,
-		}
-		activities.append(activity)
-
-	for communication in docinfo.communications + docinfo.automated_messages:
-		activity = {
-			"activity_type": "communication",
-			"communication_type": communication.communication_type,
-			"communication_date": communication.communication_date or communication.creation,
-			"creation": communication.creation,
-			"data": {
-				"subject": communication.subject,
-				"content": communication.content,
-				"sender_full_name": communication.sender_full_name,
-				"sender": communication.sender,
-				"recipients": communication.recipients,
-				"cc": communication.cc,
-				"bcc": communication.bcc,
-				"attachments": get_attachments("Communication", communication.name),
-				"read_by_recipient": communication.read_by_recipient,
-				"delivery_status": communication.delivery_status,
-			},
-			"is_lead": False,
-		}
-		activities.append(activity)
-
-	for attachment_log in docinfo.attachment_logs:
-		activity = {
-			"name": attachment_log.name,
-			"activity_type": "attachment_log",
-			"creation": attachment_log.creation,
-			"owner": attachment_log.owner,
-			"data": parse_attachment_log(attachment_log.content, attachment_log.comment_type),
-			"is_lead": False,
-		}
-		activities.append(activity)
-
-	calls = calls + get_linked_calls(name).get("calls", [])
-	notes = notes + get_linked_notes(name) + get_linked_calls(name).get("notes", [])
-	tasks = tasks + get_linked_tasks(name) + get_linked_calls(name).get("tasks", [])
-	attachments = attachments + get_attachments("CRM Deal", name)
+	attachments = attachments_map.get(("CRM Deal", name), [])
+	if lead:
+		attachments = attachments_map.get(("CRM Lead", lead), []) + attachments
 
 	activities.sort(key=lambda x: x["creation"], reverse=True)
 	activities = handle_multiple_versions(activities)
@@ -165,22 +605,20 @@ def get_deal_activities(name):
 
 
 def get_lead_activities(name):
-	get_docinfo("", "CRM Lead", name)
-	docinfo = frappe.response["docinfo"]
-	lead_meta = frappe.get_meta("CRM Lead")
-	lead_fields = {
-		field.fieldname: {"label": field.label, "options": field.options} for field in lead_meta.fields
-	}
-	avoid_fields = [
-		"converted",
-		"response_by",
-		"sla_creation",
-		"sla",
-		"first_response_time",
-		"first_responded_on",
-	]
+	docinfo = get_timeline_docinfo("CRM Lead", name)
+	references = [("CRM Lead", name), *get_docinfo_attachment_references(docinfo)]
+	attachments_map = get_attachments_map(references)
+	calls, notes, tasks = get_linked_activities([name])
+
+	activities = get_timeline_activities("CRM Lead", name, docinfo, attachments_map)
+	attachments = attachments_map.get(("CRM Lead", name), [])
+
+	return activities, calls, notes, tasks, attachments
 
-	doc = frappe.db.get_values("CRM Lead", name, ["creation", "owner"])[0]
+
+def get_timeline_activities(doctype, name, docinfo, attachments_map):
+	"""Returns sorted and grouped timeline of a lead including its creation"""
+	doc = frappe.db.get_values(doctype, name, ["creation", "owner"])[0]
 	activities = [
 		{
 			"activity_type": "creation",
@@ -190,139 +628,217 @@ def get_lead_activities(name):
 			"is_lead": True,
 		}
 	]
+	activities += get_docinfo_activities(doctype, docinfo, attachments_map)
+
+	activities.sort(key=lambda x: x["creation"], reverse=True)
+	return handle_multiple_versions(activities)
+
+
+def get_timeline_docinfo(doctype, name):
+	get_docinfo("", doctype, name)
+	return frappe.response["docinfo"]
+
+
+def get_docinfo_attachment_references(docinfo):
+	"""Returns (doctype, name) of comments and emails whose attachments are shown on the timeline"""
+	references = [("Comment", comment.name) for comment in docinfo.comments]
+	references += [
+		("Communication", communication.name)
+		for communication in docinfo.communications + docinfo.automated_messages
+	]
+	return references
+
+
+def get_docinfo_activities(doctype, docinfo, attachments_map):
+	"""Returns version, comment, email and attachment log activities from `docinfo`"""
+	is_lead = doctype == "CRM Lead"
+	meta_fields = get_timeline_fields(doctype)
+	avoid_fields = get_timeline_avoid_fields(doctype)
+
+	activities = []
 
 	docinfo.versions.reverse()
 
 	for version in docinfo.versions:
-		data = json.loads(version.data)
-		if not data.get("changed"):
-			continue
-
-		if change := data.get("changed")[0]:
-			field = lead_fields.get(change[0], None)
-
-			if not field or change[0] in avoid_fields or (not change[1] and not change[2]):
-				continue
-
-			field_label = field.get("label") or change[0]
-			field_option = field.get("options") or None
-
-			activity_type = "changed"
-			data = {
-				"field": change[0],
-				"field_label": field_label,
-				"old_value": change[1],
-				"value": change[2],
-			}
-
-			if not change[1] and change[2]:
-				activity_type = "added"
-				data = {
-					"field": change[0],
-					"field_label": field_label,
-					"value": change[2],
-				}
-			elif change[1] and not change[2]:
-				activity_type = "removed"
-				data = {
-					"field": change[0],
-					"field_label": field_label,
-					"value": change[1],
-				}
-
-		activity = {
-			"activity_type": activity_type,
-			"creation": version.creation,
-			"owner": version.owner,
-			"data": data,
-			"is_lead": True,
-			"options": field_option,
-		}
-		activities.append(activity)
+		if activity := get_version_activity(version, meta_fields, avoid_fields, is_lead):
+			activities.append(activity)
 
 	for comment in docinfo.comments:
-		activity = {
-			"name": comment.name,
-			"activity_type": "comment",
-			"creation": comment.creation,
-			"owner": comment.owner,
-			"content": comment.content,
-			"attachments": get_attachments("Comment", comment.name),
-			"is_lead": True,
-		}
-		activities.append(activity)
+		attachments = attachments_map.get(("Comment", comment.name), [])
+		activities.append(get_comment_activity(comment, attachments, is_lead))
 
 	for communication in docinfo.communications + docinfo.automated_messages:
-		activity = {
-			"activity_type": "communication",
-			"communication_type": communication.communication_type,
-			"communication_date": communication.communication_date or communication.creation,
-			"creation": communication.creation,
-			"data": {
-				"subject": communication.subject,
-				"content": communication.content,
-				"sender_full_name": communication.sender_full_name,
-				"sender": communication.sender,
-				"recipients": communication.recipients,
-				"cc": communication.cc,
-				"bcc": communication.bcc,
-				"attachments": get_attachments("Communication", communication.name),
-				"read_by_recipient": communication.read_by_recipient,
-				"delivery_status": communication.delivery_status,
-			},
-			"is_lead": True,
-		}
-		activities.append(activity)
+		attachments = attachments_map.get(("Communication", communication.name), [])
+		activities.append(get_communication_activity(communication, attachments, is_lead))
 
 	for attachment_log in docinfo.attachment_logs:
-		activity = {
-			"name": attachment_log.name,
-			"activity_type": "attachment_log",
-			"creation": attachment_log.creation,
-			"owner": attachment_log.owner,
-			"data": parse_attachment_log(attachment_log.content, attachment_log.comment_type),
-			"is_lead": True,
+		activities.append(get_attachment_log_activity(attachment_log, is_lead))
+
+	return activities
+
+
+def get_timeline_fields(doctype):
+	return {
+		field.fieldname: {"label": field.label, "options": field.options}
+		for field in frappe.get_meta(doctype).fields
+	}
+
+
+def get_timeline_avoid_fields(doctype):
+	return [
+		"converted" if doctype == "CRM Lead" else "lead",
+		"response_by",
+		"sla_creation",
+		"sla",
+		"first_response_time",
+		"first_responded_on",
+	]
+
+
+def get_version_activity(version, meta_fields, avoid_fields, is_lead):
+	"""Returns field change activity of the version, `None` if the change is not shown on the timeline"""
+	data = json.loads(version.data)
+	if not data.get("changed"):
+		return
+
+	change = data.get("changed")[0]
+	if not change:
+		return
+
+	field = meta_fields.get(change[0], None)
+
+	if not field or change[0] in avoid_fields or (not change[1] and not change[2]):
+		return
+
+	field_label = field.get("label") or change[0]
+	field_option = field.get("options") or None
+
+	activity_type = "changed"
+	data = {
+		"field": change[0],
+		"field_label": field_label,
+		"old_value": change[1],
+		"value": change[2],
+	}
+
+	if not change[1] and change[2]:
+		activity_type = "added"
+		data = {
+			"field": change[0],
+			"field_label": field_label,
+			"value": change[2],
 		}
-		activities.append(activity)
+	elif change[1] and not change[2]:
+		activity_type = "removed"
+		data = {
+			"field": change[0],
+			"field_label": field_label,
+			"value": change[1],
+		}
+
+	return {
+		"activity_type": activity_type,
+		"creation": version.creation,
+		"owner": version.owner,
+		"data": data,
+		"is_lead": is_lead,
+		"options": field_option,
+	}
 
-	calls = get_linked_calls(name).get("calls", [])
-	notes = get_linked_notes(name) + get_linked_calls(name).get("notes", [])
-	tasks = get_linked_tasks(name) + get_linked_calls(name).get("tasks", [])
-	attachments = get_attachments("CRM Lead", name)
 
-	activities.sort(key=lambda x: x["creation"], reverse=True)
-	activities = handle_multiple_versions(activities)
+def get_comment_activity(comment, attachments, is_lead):
+	return {
+		"name": comment.name,
+		"activity_type": "comment",
+		"creation": comment.creation,
+		"owner": comment.owner,
+		"content": comment.content,
+		"attachments": attachments,
+		"is_lead": is_lead,
+	}
 
-	return activities, calls, notes, tasks, attachments
+
+def get_communication_activity(communication, attachments, is_lead):
+	return {
+		"activity_type": "communication",
+		"communication_type": communication.communication_type,
+		"communication_date": communication.communication_date or communication.creation,
+		"creation": communication.creation,
+		"data": {
+			"subject": communication.subject,
+			"content": communication.get("content"),
+			"sender_full_name": communication.sender_full_name,
+			"sender": communication.sender,
+			"recipients": communication.recipients,
+			"cc": communication.cc,
+			"bcc": communication.bcc,
+			"attachments": attachments,
+			"read_by_recipient": communication.read_by_recipient,
+			"delivery_status": communication.delivery_status,
+		},
+		"is_lead": is_lead,
+	}
 
 
-def get_attachments(doctype, name):
-	return (
-		frappe.db.get_all(
-			"File",
-			filters={"attached_to_doctype": doctype, "attached_to_name": name},
-			fields=[
-				"name",
-				"file_name",
-				"file_type",
-				"file_url",
-				"file_size",
-				"is_private",
-				"modified",
-				"creation",
-				"owner",
-			],
-		)
-		or []
+def get_attachment_log_activity(attachment_log, is_lead):
+	return {
+		"name": attachment_log.name,
+		"activity_type": "attachment_log",
+		"creation": attachment_log.creation,
+		"owner": attachment_log.owner,
+		"data": parse_attachment_log(attachment_log.content, attachment_log.comment_type),
+		"is_lead": is_lead,
+	}
+
+
+def get_attachments_map(references):
+	"""Returns attachments of all `references` ((doctype, name) pairs) fetched in a single query,
+	mapped by (doctype, name)
+	"""
+	attachments_map = {}
+	if not references:
+		return attachments_map
+
+	files = frappe.db.get_all(
+		"File",
+		filters={
+			"attached_to_doctype": ("in", list({r[0] for r in references})),
+			"attached_to_name": ("in", list({r[1] for r in references})),
+		},
+		fields=[
+			"name",
+			"file_name",
+			"file_type",
+			"file_url",
+			"file_size",
+			"is_private",
+			"modified",
+			"creation",
+			"owner",
+			"attached_to_doctype",
+			"attached_to_name",
+		],
 	)
 
+	for file in files:
+		key = (file.pop("attached_to_doctype"), file.pop("attached_to_name"))
+		attachments_map.setdefault(key, []).append(file)
+
+	return attachments_map
+
+
+def get_attachments(references):
+	"""Returns files attached to `references`, the lead's before the deal's"""
+	attachments_map = get_attachments_map(references)
+	return [file for reference in reversed(references) for file in attachments_map.get(reference, [])]
+
 
 def handle_multiple_versions(versions):
 	activities = []
 	grouped_versions = []
 	old_version = None
 	for version in versions:
-		is_version = version["activity_type"] in ["changed", "added", "removed"]
+		is_version = version["activity_type"] in VERSION_ACTIVITY_TYPES
 		if not is_version:
 			activities.append(version)
 		if not old_version:
@@ -354,10 +870,19 @@ def parse_grouped_versions(versions):
 	return version
 
 
-def get_linked_calls(name):
+def get_linked_activities(names):
+	"""Returns calls, notes and tasks linked with any of the `names` (lead/deal)"""
+	calls, call_notes, call_tasks = get_linked_calls(names)
+	notes = get_linked_notes(names, call_notes)
+	tasks = get_linked_tasks(names, call_tasks)
+	return calls, notes, tasks
+
+
+def get_linked_calls(names):
+	"""Returns calls linked with any of the `names` along with notes and tasks linked to those calls"""
 	calls = frappe.db.get_all(
 		"CRM Call Log",
-		filters={"reference_docname": name},
+		filters={"reference_docname": ("in", names)},
 		fields=[
 			"name",
 			"caller",
@@ -376,7 +901,9 @@ def get_linked_calls(name):
 	)
 
 	linked_calls = frappe.db.get_all(
-		"Dynamic Link", filters={"link_name": name, "parenttype": "CRM Call Log"}, pluck="parent"
+		"Dynamic Link",
+		filters={"link_name": ("in", names), "parenttype": "CRM Call Log"},
+		pluck="parent",
 	)
 
 	notes = []
@@ -420,47 +947,32 @@ def get_linked_calls(name):
 		if _calls:
 			calls = calls + _calls
 
-	if notes:
-		notes = frappe.db.get_all(
-			"FCRM Note",
-			filters={"name": ("in", notes)},
-			fields=["name", "title", "content", "owner", "modified"],
-		)
+	calls = parse_call_logs(calls)
 
-	if tasks:
-		tasks = frappe.db.get_all(
-			"CRM Task",
-			filters={"name": ("in", tasks)},
-			fields=[
-				"name",
-				"title",
-				"description",
-				"assigned_to",
-				"due_date",
-				"priority",
-				"status",
-				"modified",
-			],
-		)
-
-	calls = [parse_call_log(call) for call in calls] if calls else []
+	return calls, notes, tasks
 
-	return {"calls": calls, "notes": notes, "tasks": tasks}
 
+def get_linked_notes(names, linked_notes=None):
+	or_filters = {"reference_docname": ("in", names)}
+	if linked_notes:
+		or_filters["name"] = ("in", linked_notes)
 
-def get_linked_notes(name):
 	notes = frappe.db.get_all(
 		"FCRM Note",
-		filters={"reference_docname": name},
+		or_filters=or_filters,
 		fields=["name", "title", "content", "owner", "modified"],
 	)
 	return notes or []
 
 
-def get_linked_tasks(name):
+def get_linked_tasks(names, linked_tasks=None):
+	or_filters = {"reference_docname": ("in", names)}
+	if linked_tasks:
+		or_filters["name"] = ("in", linked_tasks)
+
 	tasks = frappe.db.get_all(
 		"CRM Task",
-		filters={"reference_docname": name},
+		or_filters=or_filters,
 		fields=[
 			"name",
 			"title",
@@ -1,6 +1,8 @@
 import frappe
 from frappe import _
 
+from crm.utils.dedup import find_contact_matches, find_organization_matches
+
 
 def validate(doc, method):
 	update_deals_email_mobile_no(doc)
@@ -151,3 +153,23 @@ def search_emails(txt: str):
 	)
 
 	return results
+
+
+@frappe.whitelist()
+def find_duplicates(records):
+	"""
+	Find existing contacts and organizations of records about to be imported or created
+
+	:param records: list of dicts with `email`, `phone`, `mobile_no` and `organization`
+	:return: `{"contact": match, "organization": name}` per record, in order
+	"""
+	if not frappe.has_permission("Contact", "read") or not frappe.has_permission("CRM Organization", "read"):
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+	records = [frappe._dict(record) for record in frappe.parse_json(records)]
+	contacts = find_contact_matches(records)
+	organizations = find_organization_matches([record.organization for record in records])
+	return [
+		{"contact": contact, "organization": organization}
+		for contact, organization in zip(contacts, organizations, strict=True)
+	]
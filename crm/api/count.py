@@ -0,0 +1,99 @@
+import hashlib
+import json
+
+import frappe
+from frappe.desk.reportview import get_match_cond
+from frappe.utils import cint, flt
+
+# exact counts are cached for a short time, estimates can live a little longer
+EXACT_COUNT_TTL = 30
+ESTIMATED_COUNT_TTL = 120
+
+# tables with fewer rows than this are always counted exactly
+ESTIMATE_THRESHOLD = 100000
+
+
+@frappe.whitelist()
+def get_count(doctype: str, filters=None, exact: bool = False):
+	"""Returns total count of records of `doctype` matching `filters`
+
+	:param exact: skip the estimation and always count the records
+	:return: `{"total_count": 100, "estimated": False}`
+	"""
+	from crm.api.doc import set_session_user_in_filters
+
+	frappe.has_permission(doctype, "read", throw=True)
+	filters = set_session_user_in_filters(frappe.parse_json(filters or "{}"))
+
+	total_count, estimated = get_total_count(doctype, filters, exact=cint(exact))
+	return {"total_count": total_count, "estimated": estimated}
+
+
+def get_total_count(doctype, filters, exact=False):
+	"""Returns `(count, is_estimated)` for records of `doctype` matching `filters`
+
+	Counts are cached per doctype, filters and permission scope of the session user. Large tables
+	are not scanned unless `exact` is set, instead the row estimate of the query plan is returned.
+	"""
+	cache_key = get_count_cache_key(doctype, filters)
+	cached = frappe.cache.get_value(cache_key)
+	if cached and not (exact and cached.get("estimated")):
+		return cached.get("count"), cached.get("estimated")
+
+	if not exact:
+		estimated_count = get_estimated_count(doctype, filters)
+		if estimated_count is not None:
+			frappe.cache.set_value(
+				cache_key,
+				{"count": estimated_count, "estimated": True},
+				expires_in_sec=ESTIMATED_COUNT_TTL,
+			)
+			return estimated_count, True
+
+	count = frappe.get_list(doctype, filters=filters, fields="count(*) as total_count")[0].total_count
+	frappe.cache.set_value(cache_key, {"count": count, "estimated": False}, expires_in_sec=EXACT_COUNT_TTL)
+	return count, False
+
+
+def get_estimated_count(doctype, filters):
+	"""Returns row estimate of the list query if the table is large enough to be worth estimating"""
+	if frappe.db.db_type != "mariadb":
+		return None
+
+	table_rows = cint(frappe.db.estimate_count(doctype))
+	if table_rows < ESTIMATE_THRESHOLD:
+		return None
+
+	if not filters and not get_match_cond(doctype):
+		return table_rows
+
+	query = frappe.get_list(doctype, filters=filters, fields=["name"], order_by="", run=0)
+	plan = frappe.db.sql(f"explain extended {query}", as_dict=True)
+	row = next((r for r in plan if r.get("table") == f"tab{doctype}"), plan[0] if plan else None)
+	if not row or row.get("rows") is None:
+		return None
+
+	estimate = flt(row.get("rows")) * flt(row.get("filtered") or 100) / 100
+	if estimate < ESTIMATE_THRESHOLD:
+		# small result sets are cheap enough to count exactly
+		return None
+
+	return cint(estimate)
+
+
+def get_count_cache_key(doctype, filters):
+	"""Cache key for (doctype, normalized filters, permission scope)
+
+	Permission scope is the match condition of the session user, so users who can see the same set of
+	records share the cached count.
+	"""
+	if isinstance(filters, dict):
+		normalized_filters = json.dumps(filters, sort_keys=True, default=str)
+	else:
+		normalized_filters = json.dumps(
+			sorted(json.dumps(f, sort_keys=True, default=str) for f in filters or [])
+		)
+
+	scope = get_match_cond(doctype)
+	digest = hashlib.sha1(f"{normalized_filters}|{scope}".encode()).hexdigest()
+	return f"crm:list_count:{doctype}:{digest}"
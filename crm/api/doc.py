@@ -1,3 +1,4 @@
+import base64
 import json
 
 import frappe
@@ -6,15 +7,25 @@ from frappe.custom.doctype.property_setter.property_setter import make_property_
 from frappe.desk.form.assign_to import set_status
 from frappe.model import no_value_fields
 from frappe.model.document import get_controller
-from frappe.utils import make_filter_tuple
+from frappe.utils import cint, make_filter_tuple
 from pypika import Criterion
 
+from crm.api.count import get_total_count
 from crm.api.views import get_views
 from crm.fcrm.doctype.crm_form_script.crm_form_script import get_form_script
 
+# versioned cache entries are unreachable after invalidation and expire on their own
+UI_META_CACHE_TTL = 24 * 60 * 60
+# fields set on every insert, safe to compare against in a keyset condition
+KEYSET_SORT_FIELDS = ("name", "creation", "modified")
+
 
 @frappe.whitelist()
 def sort_options(doctype: str):
+	return get_ui_meta(doctype)["sort_options"]
+
+
+def build_sort_options(doctype):
 	fields = frappe.get_meta(doctype).fields
 	fields = [field for field in fields if field.fieldtype not in no_value_fields]
 	fields = [
@@ -45,6 +56,10 @@ def sort_options(doctype: str):
 
 @frappe.whitelist()
 def get_filterable_fields(doctype: str):
+	return get_ui_meta(doctype)["filterable_fields"]
+
+
+def build_filterable_fields(doctype):
 	allowed_fieldtypes = [
 		"Check",
 		"Data",
@@ -111,6 +126,10 @@ def get_filterable_fields(doctype: str):
 
 @frappe.whitelist()
 def get_group_by_fields(doctype: str):
+	return get_ui_meta(doctype)["group_by_fields"]
+
+
+def build_group_by_fields(doctype):
 	allowed_fieldtypes = [
 		"Check",
 		"Data",
@@ -179,6 +198,118 @@ def get_doctype_fields_meta(DocField, doctype, allowed_fieldtypes, restricted_fi
 	)
 
 
+def build_list_fields(doctype):
+	fields = frappe.get_meta(doctype).fields
+	fields = [field for field in fields if field.fieldtype not in no_value_fields]
+	fields = [
+		{
+			"label": _(field.label),
+			"fieldtype": field.fieldtype,
+			"fieldname": field.fieldname,
+			"options": field.options,
+		}
+		for field in fields
+		if field.label and field.fieldname
+	]
+
+	for field in get_list_standard_fields():
+		if field not in fields:
+			field["label"] = _(field["label"])
+			fields.append(field)
+
+	return fields
+
+
+def get_list_standard_fields():
+	return [
+		{"label": "Name", "fieldtype": "Data", "fieldname": "name"},
+		{"label": "Created On", "fieldtype": "Datetime", "fieldname": "creation"},
+		{"label": "Last Modified", "fieldtype": "Datetime", "fieldname": "modified"},
+		{
+			"label": "Modified By",
+			"fieldtype": "Link",
+			"fieldname": "modified_by",
+			"options": "User",
+		},
+		{"label": "Assigned To", "fieldtype": "Text", "fieldname": "_assign"},
+		{"label": "Owner", "fieldtype": "Link", "fieldname": "owner", "options": "User"},
+		{"label": "Like", "fieldtype": "Data", "fieldname": "_liked_by"},
+	]
+
+
+def get_ui_meta(doctype):
+	"""Returns cached UI metadata bundle of the doctype
+
+	Bundle holds everything list and form pages build from the doctype meta: fields, sort options,
+	filterable and group by fields, fields meta and form scripts. It is cached per meta version and
+	language, the version is reset whenever any of its sources change (see `clear_ui_meta_cache`).
+	"""
+	cache_key = f"crm:ui_meta:{doctype}:{get_ui_meta_version(doctype)}:{frappe.local.lang}"
+	bundle = frappe.cache.get_value(cache_key)
+	if bundle is None:
+		bundle = {
+			"list_fields": build_list_fields(doctype),
+			"sort_options": build_sort_options(doctype),
+			"filterable_fields": build_filterable_fields(doctype),
+			"group_by_fields": build_group_by_fields(doctype),
+			"fields_meta": build_fields_meta(doctype),
+			"form_script": get_form_script(doctype),
+			"list_script": get_form_script(doctype, "List"),
+		}
+		frappe.cache.set_value(cache_key, bundle, expires_in_sec=UI_META_CACHE_TTL)
+	return bundle
+
+
+def get_ui_meta_views(doctype):
+	"""Returns cached views of the doctype visible to the session user"""
+	cache_key = f"crm:ui_meta_views:{doctype}:{get_ui_meta_version(doctype)}:{frappe.session.user}"
+	views = frappe.cache.get_value(cache_key)
+	if views is None:
+		views = get_views(doctype)
+		frappe.cache.set_value(cache_key, views, expires_in_sec=UI_META_CACHE_TTL)
+	return views
+
+
+def get_ui_meta_version(doctype):
+	version_key = f"crm:ui_meta_version:{doctype}"
+	version = frappe.cache.get_value(version_key)
+	if not version:
+		version = frappe.generate_hash(length=10)
+		frappe.cache.set_value(version_key, version)
+	return version
+
+
+def get_ui_meta_etag(doctype):
+	return f"{get_ui_meta_version(doctype)}-{frappe.local.lang}"
+
+
+def clear_ui_meta_cache(doc, method=None):
+	"""Reset UI metadata version of the doctype `doc` belongs to
+
+	Hooked on DocType, Custom Field, Property Setter, CRM Form Script and CRM View Settings changes.
+	"""
+	doctype_field = {
+		"DocType": "name",
+		"Custom Field": "dt",
+		"Property Setter": "doc_type",
+		"CRM Form Script": "dt",
+		"CRM View Settings": "dt",
+	}.get(doc.doctype)
+	doctype = doctype_field and doc.get(doctype_field)
+	if not doctype:
+		return
+
+	reset_ui_meta_version(doctype)
+
+
+def reset_ui_meta_version(doctype):
+	if frappe.db.get_value("DocType", doctype, "istable"):
+		# child table fields are part of their parent's fields meta
+		frappe.cache.delete_keys("crm:ui_meta_version:")
+	else:
+		frappe.cache.delete_value(f"crm:ui_meta_version:{doctype}")
+
+
 @frappe.whitelist()
 def get_quick_filters(doctype: str, cached: bool = True):
 	meta = frappe.get_meta(doctype, cached)
@@ -242,6 +373,8 @@ def update_quick_filters(quick_filters: str, old_filters: str, doctype: str):
 	for filter in new_filters:
 		update_in_standard_filter(filter, doctype, 1)
 
+	reset_ui_meta_version(doctype)
+
 
 def create_update_global_settings(doctype, quick_filters):
 	if global_settings := frappe.db.exists("CRM Global Settings", {"dt": doctype, "type": "Quick Filters"}):
@@ -287,6 +420,8 @@ def get_data(
 	kanban_fields=[],
 	view=None,
 	default_filters=None,
+	cursor=None,
+	meta_etag=None,
 ):
 	custom_view = False
 	filters = frappe._dict(filters)
@@ -299,17 +434,7 @@ def get_data(
 	view_type = view.get("view_type") if view else None
 	group_by_field = view.get("group_by_field") if view else None
 
-	for key in filters:
-		value = filters[key]
-		if isinstance(value, list):
-			if "@me" in value:
-				value[value.index("@me")] = frappe.session.user
-			elif "%@me%" in value:
-				index = [i for i, v in enumerate(value) if v == "%@me%"]
-				for i in index:
-					value[i] = "%" + frappe.session.user + "%"
-		elif value == "@me":
-			filters[key] = frappe.session.user
+	filters = set_session_user_in_filters(filters)
 
 	if default_filters:
 		default_filters = frappe.parse_json(default_filters)
@@ -317,6 +442,7 @@ def get_data(
 
 	is_default = True
 	data = []
+	next_cursor = None
 	_list = get_controller(doctype)
 	default_rows = []
 	if hasattr(_list, "default_list_data"):
@@ -374,16 +500,25 @@ def get_data(
 		if group_by_field and group_by_field not in rows:
 			rows.append(group_by_field)
 
+		# rows after the cursor are fetched with a keyset condition on (order_by field, name)
+		# so every page costs the same irrespective of how deep it is
+		pagination = get_cursor_pagination(doctype, filters, order_by, cursor)
+		if pagination.sort_field and pagination.sort_field not in rows:
+			rows.append(pagination.sort_field)
+
 		data = (
 			frappe.get_list(
 				doctype,
 				fields=rows,
-				filters=filters,
-				order_by=order_by,
+				filters=pagination.filters,
+				or_filters=pagination.or_filters,
+				order_by=pagination.order_by,
+				start=pagination.start,
 				page_length=page_length,
 			)
 			or []
 		)
+		next_cursor = get_next_cursor(pagination, data, page_length)
 		data = parse_list_data(data, doctype)
 
 	if view_type == "kanban":
@@ -418,14 +553,24 @@ def get_data(
 			if field not in rows:
 				rows.append(field)
 
-		for kc in kanban_columns:
-			# Start with base filters
-			column_filters = []
+		base_filters = convert_filter_to_tuple(doctype, filters) if filters else []
+		active_columns = [kc for kc in kanban_columns if not kc.get("delete")]
+
+		# one grouped count query for all columns
+		column_counts = {}
+		if column_field:
+			column_counts = get_kanban_column_counts(doctype, column_field, base_filters)
+
+		# one windowed query for the first page of every column which is not manually ordered
+		windowed_columns = [
+			kc for kc in active_columns if column_field and kc.get("name") and not kc.get("order")
+		]
+		column_records = get_kanban_column_records(
+			doctype, rows, base_filters, column_field, windowed_columns, order_by
+		)
 
-			# Convert and add the main filters first
-			if filters:
-				base_filters = convert_filter_to_tuple(doctype, filters)
-				column_filters.extend(base_filters)
+		for kc in kanban_columns:
+			column_filters = base_filters.copy()
 
 			# Add the column-specific filter
 			if column_field and kc.get("name"):
@@ -435,26 +580,31 @@ def get_data(
 			if kc.get("delete"):
 				column_data = []
 			else:
-				page_length = kc.get("page_length", 20)
+				column_page_length = kc.get("page_length", 20)
 
 				if order:
 					column_data = get_records_based_on_order(
-						doctype, rows, column_filters, page_length, order
+						doctype, rows, column_filters, column_page_length, order
 					)
+				elif kc in windowed_columns:
+					column_data = column_records.get(kc.get("name"), [])[:column_page_length]
 				else:
 					column_data = frappe.get_list(
 						doctype,
 						fields=rows,
 						filters=column_filters,
 						order_by=order_by,
-						page_length=page_length,
+						page_length=column_page_length,
 					)
 
-				all_count = frappe.get_list(
-					doctype,
-					filters=column_filters,
-					fields="count(*) as total_count",
-				)[0].total_count
+				if column_field and kc.get("name"):
+					all_count = column_counts.get(kc.get("name"), 0)
+				else:
+					all_count = frappe.get_list(
+						doctype,
+						filters=column_filters,
+						fields="count(*) as total_count",
+					)[0].total_count
 
 				kc["all_count"] = all_count
 				kc["count"] = len(column_data)
@@ -467,40 +617,12 @@ def get_data(
 
 			data.append({"column": kc, "fields": kanban_fields, "data": column_data})
 
-	fields = frappe.get_meta(doctype).fields
-	fields = [field for field in fields if field.fieldtype not in no_value_fields]
-	fields = [
-		{
-			"label": _(field.label),
-			"fieldtype": field.fieldtype,
-			"fieldname": field.fieldname,
-			"options": field.options,
-		}
-		for field in fields
-		if field.label and field.fieldname
-	]
-
-	std_fields = [
-		{"label": "Name", "fieldtype": "Data", "fieldname": "name"},
-		{"label": "Created On", "fieldtype": "Datetime", "fieldname": "creation"},
-		{"label": "Last Modified", "fieldtype": "Datetime", "fieldname": "modified"},
-		{
-			"label": "Modified By",
-			"fieldtype": "Link",
-			"fieldname": "modified_by",
-			"options": "User",
-		},
-		{"label": "Assigned To", "fieldtype": "Text", "fieldname": "_assign"},
-		{"label": "Owner", "fieldtype": "Link", "fieldname": "owner", "options": "User"},
-		{"label": "Like", "fieldtype": "Data", "fieldname": "_liked_by"},
-	]
+	ui_meta = get_ui_meta(doctype)
+	fields = ui_meta["list_fields"]
 
-	for field in std_fields:
+	for field in get_list_standard_fields():
 		if field.get("fieldname") not in rows:
 			rows.append(field.get("fieldname"))
-		if field not in fields:
-			field["label"] = _(field["label"])
-			fields.append(field)
 
 	if not is_default and custom_view_name:
 		is_default = frappe.db.get_value("CRM View Settings", custom_view_name, "load_default_columns")
@@ -539,11 +661,17 @@ def get_data(
 					"options": get_options(field.get("fieldtype"), field.get("options")),
 				}
 
+	total_count, total_count_estimated = get_total_count(doctype, filters)
+
+	# skip sending metadata the client already has
+	current_meta_etag = get_ui_meta_etag(doctype)
+	meta_not_modified = bool(meta_etag) and meta_etag == current_meta_etag
+
 	return {
 		"data": data,
 		"columns": columns,
 		"rows": rows,
-		"fields": fields,
+		"fields": None if meta_not_modified else fields,
 		"column_field": column_field,
 		"title_field": title_field,
 		"kanban_columns": kanban_columns,
@@ -552,17 +680,127 @@ def get_data(
 		"page_length": page_length,
 		"page_length_count": page_length_count,
 		"is_default": is_default,
-		"views": get_views(doctype),
-		"total_count": frappe.get_list(doctype, filters=filters, fields="count(*) as total_count")[
-			0
-		].total_count,
+		"views": get_ui_meta_views(doctype),
+		"total_count": total_count,
+		"total_count_estimated": total_count_estimated,
 		"row_count": len(data),
-		"form_script": get_form_script(doctype),
-		"list_script": get_form_script(doctype, "List"),
+		"next_cursor": next_cursor,
+		"form_script": None if meta_not_modified else ui_meta["form_script"],
+		"list_script": None if meta_not_modified else ui_meta["list_script"],
+		"meta_etag": current_meta_etag,
+		"meta_not_modified": meta_not_modified,
 		"view_type": view_type,
 	}
 
 
+def set_session_user_in_filters(filters):
+	"""Replace `@me` placeholders in filter values with the session user"""
+	for key in filters:
+		value = filters[key]
+		if isinstance(value, list):
+			if "@me" in value:
+				value[value.index("@me")] = frappe.session.user
+			elif "%@me%" in value:
+				index = [i for i, v in enumerate(value) if v == "%@me%"]
+				for i in index:
+					value[i] = "%" + frappe.session.user + "%"
+		elif value == "@me":
+			filters[key] = frappe.session.user
+	return filters
+
+
+def get_cursor_pagination(doctype, filters, order_by, cursor=None):
+	"""Returns filters, ordering and offset to fetch the page after `cursor`
+
+	Keyset pagination is used when the list is sorted on a single field which is never NULL, `name` is
+	added as a tie breaker. For other sort orders the cursor falls back to an offset, a keyset condition
+	would skip rows with a NULL sort value.
+	"""
+	sort_field, sort_order = get_keyset_sort(doctype, order_by)
+	pagination = frappe._dict(
+		filters=filters,
+		or_filters=None,
+		order_by=order_by,
+		requested_order_by=order_by or "",
+		start=0,
+		sort_field=sort_field,
+		sort_order=sort_order,
+	)
+
+	if sort_field:
+		pagination.order_by = f"{sort_field} {sort_order}"
+		if sort_field != "name":
+			pagination.order_by += f", name {sort_order}"
+
+	if not cursor:
+		return pagination
+
+	cursor = decode_cursor(cursor)
+	if cursor.get("order_by") != (order_by or ""):
+		frappe.throw(_("Cursor does not match the sort order of the list"), frappe.ValidationError)
+
+	if not sort_field:
+		pagination.start = cint(cursor.get("start"))
+		return pagination
+
+	operator = "<" if sort_order == "desc" else ">"
+	filters = convert_filter_to_tuple(doctype, filters).copy()
+	if sort_field == "name":
+		filters.append([doctype, "name", operator, cursor.get("name")])
+	else:
+		filters.append([doctype, sort_field, f"{operator}=", cursor.get("value")])
+		pagination.or_filters = [
+			[doctype, sort_field, operator, cursor.get("value")],
+			[doctype, "name", operator, cursor.get("name")],
+		]
+	pagination.filters = filters
+	return pagination
+
+
+def get_keyset_sort(doctype, order_by):
+	"""Returns `(fieldname, sort_order)` if `order_by` can be paginated with a keyset"""
+	order_by = (order_by or "").strip()
+	if not order_by or "," in order_by:
+		return None, None
+
+	fieldname, _sep, sort_order = order_by.partition(" ")
+	fieldname = fieldname.split(".")[-1].strip("`")
+	sort_order = "asc" if sort_order.strip().lower() == "asc" else "desc"
+
+	# mandatory fields can still be NULL in rows inserted before they were made mandatory or by imports
+	if fieldname in KEYSET_SORT_FIELDS:
+		return fieldname, sort_order
+
+	return None, None
+
+
+def get_next_cursor(pagination, data, page_length):
+	"""Returns cursor of the page after `data`, `None` if this is the last page"""
+	if not data or len(data) < cint(page_length):
+		return None
+
+	last_row = data[-1]
+	return encode_cursor(
+		{
+			"order_by": pagination.requested_order_by,
+			"value": last_row.get(pagination.sort_field) if pagination.sort_field else None,
+			"name": last_row.get("name"),
+			"start": pagination.start + len(data),
+		}
+	)
+
+
+def encode_cursor(cursor):
+	return base64.urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode()
+
+
+def decode_cursor(cursor):
+	try:
+		return frappe._dict(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+	except (ValueError, TypeError):
+		frappe.throw(_("Invalid cursor"), frappe.ValidationError)
+
+
 def parse_list_data(data, doctype):
 	_list = get_controller(doctype)
 	if hasattr(_list, "parse_list_data"):
@@ -608,20 +846,110 @@ def get_records_based_on_order(doctype, rows, filters, page_length, order):
 	return records
 
 
+def get_kanban_column_counts(doctype, column_field, filters):
+	"""Returns total record count of every kanban column using a single grouped query"""
+	counts = frappe.get_list(
+		doctype,
+		filters=filters,
+		fields=[f"`tab{doctype}`.`{column_field}` as name", "count(*) as count"],
+		group_by=f"`tab{doctype}`.`{column_field}`",
+		order_by="count desc",
+	)
+	return {d.name: d.count for d in counts}
+
+
+def get_kanban_column_records(doctype, rows, filters, column_field, columns, order_by):
+	"""Returns first page of records of every kanban column using a single windowed query
+
+	Records are ranked within their column with `ROW_NUMBER() OVER (PARTITION BY column_field)`
+	so that the page of all the columns can be fetched in one round trip.
+	"""
+	if not columns:
+		return {}
+
+	page_length = max(cint(kc.get("page_length", 20)) for kc in columns)
+	order_by = get_qualified_order_by(doctype, order_by)
+
+	column_filters = filters.copy()
+	column_filters.append([doctype, column_field, "in", [kc.get("name") for kc in columns]])
+
+	fields = rows.copy()
+	if column_field not in fields:
+		fields.append(column_field)
+	fields.append(
+		f"row_number() over (partition by `tab{doctype}`.`{column_field}` order by {order_by}) as _kanban_rank"
+	)
+
+	query = frappe.get_list(doctype, fields=fields, filters=column_filters, order_by=order_by, run=0)
+	records = frappe.db.sql(
+		f"select * from ({query}) `kanban` where `_kanban_rank` <= %(page_length)s order by `_kanban_rank`",
+		{"page_length": page_length},
+		as_dict=True,
+	)
+
+	column_records = {}
+	for record in records:
+		record.pop("_kanban_rank", None)
+		column = record.get(column_field)
+		if column_field not in rows:
+			record.pop(column_field, None)
+		column_records.setdefault(column, []).append(record)
+
+	return column_records
+
+
+def get_qualified_order_by(doctype, order_by):
+	"""Prefix bare fieldnames of `order_by` with table name, e.g. `modified desc` -> `tabCRM Lead`.`modified` desc"""
+	if not order_by:
+		return f"`tab{doctype}`.`modified` desc"
+
+	qualified = []
+	for part in order_by.split(","):
+		field, _sep, sort_order = part.strip().partition(" ")
+		if "`" not in field and "." not in field:
+			field = f"`tab{doctype}`.`{field}`"
+		qualified.append(f"{field} {sort_order.strip()}".strip())
+	return ", ".join(qualified)
+
+
 @frappe.whitelist()
 def get_fields_meta(doctype, restricted_fieldtypes=None, as_array=False, only_required=False):
+	fields_meta = get_ui_meta(doctype)["fields_meta"]
+
+	if restricted_fieldtypes:
+		restricted_fieldtypes = frappe.parse_json(restricted_fieldtypes)
+
+	fields = [
+		field
+		for field in fields_meta["fields"]
+		if not restricted_fieldtypes or field.get("fieldtype") not in restricted_fieldtypes
+	]
+
+	if only_required:
+		fields = [field for field in fields if field.get("reqd")]
+
+	if as_array:
+		return fields
+
+	_fields_meta = {}
+	for field in fields:
+		_fields_meta[field.get("fieldname")] = field
+		if field.get("fieldtype") == "Table":
+			_fields = fields_meta["table_fields"].get(field.get("fieldname"), [])
+			_fields_meta[field.get("fieldname")] = {"df": field, "fields": _fields}
+
+	return _fields_meta
+
+
+def build_fields_meta(doctype):
 	not_allowed_fieldtypes = [
 		"Tab Break",
 		"Section Break",
 		"Column Break",
 	]
 
-	if restricted_fieldtypes:
-		restricted_fieldtypes = frappe.parse_json(restricted_fieldtypes)
-		not_allowed_fieldtypes += restricted_fieldtypes
-
 	fields = frappe.get_meta(doctype).fields
-	fields = [field for field in fields if field.fieldtype not in not_allowed_fieldtypes]
+	fields = [field.as_dict(no_nulls=True) for field in fields if field.fieldtype not in not_allowed_fieldtypes]
 
 	standard_fields = [
 		{"fieldname": "name", "fieldtype": "Link", "label": "ID", "options": doctype},
@@ -639,25 +967,16 @@ def get_fields_meta(doctype, restricted_fieldtypes=None, as_array=False, only_re
 		{"fieldname": "creation", "fieldtype": "Datetime", "label": "Created On"},
 		{"fieldname": "modified", "fieldtype": "Datetime", "label": "Last Updated On"},
 	]
+	fields.extend(standard_fields)
 
-	for field in standard_fields:
-		if not restricted_fieldtypes or field.get("fieldtype") not in restricted_fieldtypes:
-			fields.append(field)
-
-	if only_required:
-		fields = [field for field in fields if field.get("reqd")]
-
-	if as_array:
-		return fields
-
-	fields_meta = {}
+	table_fields = {}
 	for field in fields:
-		fields_meta[field.get("fieldname")] = field
 		if field.get("fieldtype") == "Table":
-			_fields = frappe.get_meta(field.get("options")).fields
-			fields_meta[field.get("fieldname")] = {"df": field, "fields": _fields}
+			table_fields[field.get("fieldname")] = [
+				df.as_dict(no_nulls=True) for df in frappe.get_meta(field.get("options")).fields
+			]
 
-	return fields_meta
+	return {"fields": fields, "table_fields": table_fields}
 
 
 @frappe.whitelist()
@@ -1,32 +1,73 @@
+from functools import partial
+
 import frappe
+from frappe import _
 from frappe.query_builder import Order
 
+from crm.api.realtime import publish_debounced
+
+NOTIFICATIONS_PAGE_LENGTH = 20
+UNREAD_COUNT_CACHE_KEY = "crm:unread_notifications_count"
+# counts are cleared whenever they change, the expiry bounds a count cached from a stale read
+UNREAD_COUNT_CACHE_TTL = 60 * 60
+
 
 @frappe.whitelist()
-def get_notifications():
+def get_notifications(limit=NOTIFICATIONS_PAGE_LENGTH, before=None):
+    """
+    Get the latest `limit` notifications of the session user
+
+    :param before: `[creation, name]` of the last notification of the previous page
+    """
     Notification = frappe.qb.DocType("CRM Notification")
+    User = frappe.qb.DocType("User")
     query = (
         frappe.qb.from_(Notification)
-        .select("*")
+        .left_join(User)
+        .on(User.name == Notification.from_user)
+        .select(
+            Notification.name,
+            Notification.creation,
+            Notification.from_user,
+            User.full_name.as_("from_user_full_name"),
+            Notification.type,
+            Notification.to_user,
+            Notification.read,
+            Notification.comment,
+            Notification.message,
+            Notification.notification_text,
+            Notification.notification_type_doctype,
+            Notification.notification_type_doc,
+            Notification.reference_doctype,
+            Notification.reference_name,
+        )
         .where(Notification.to_user == frappe.session.user)
-        .orderby("creation", order=Order.desc)
+        .orderby(Notification.creation, order=Order.desc)
+        .orderby(Notification.name, order=Order.desc)
+        .limit(min(frappe.utils.cint(limit) or NOTIFICATIONS_PAGE_LENGTH, 100))
     )
+    if before:
+        creation, name = frappe.parse_json(before)
+        query = query.where(
+            (Notification.creation < creation)
+            | ((Notification.creation == creation) & (Notification.name < name))
+        )
     notifications = query.run(as_dict=True)
 
     _notifications = []
     for notification in notifications:
         _notifications.append(
             {
+                "name": notification.name,
                 "creation": notification.creation,
                 "from_user": {
                     "name": notification.from_user,
-                    "full_name": frappe.get_value(
-                        "User", notification.from_user, "full_name"
-                    ),
+                    "full_name": notification.from_user_full_name,
                 },
                 "type": notification.type,
                 "to_user": notification.to_user,
                 "read": notification.read,
+                "comment": notification.comment,
                 "hash": get_hash(notification),
                 "notification_text": notification.notification_text,
                 "notification_type_doctype": notification.notification_type_doctype,
@@ -44,20 +85,53 @@ def get_notifications():
     return _notifications
 
 
+@frappe.whitelist()
+def get_unread_count():
+    """Get the number of unread notifications of the session user, cached until they change"""
+    user = frappe.session.user
+    cache_key = get_unread_count_key(user)
+    count = frappe.cache.get_value(cache_key)
+    if count is None:
+        count = frappe.db.count("CRM Notification", {"to_user": user, "read": False})
+        frappe.cache.set_value(cache_key, count, expires_in_sec=UNREAD_COUNT_CACHE_TTL)
+    return count
+
+
+def get_unread_count_key(user):
+    return f"{UNREAD_COUNT_CACHE_KEY}:{user}"
+
+
+def clear_unread_count(user):
+    """Clear the cached count of the user once the transaction is committed
+
+    Clearing it before would let a concurrent request cache the count read before the commit again.
+    """
+    frappe.db.after_commit.add(partial(frappe.cache.delete_value, get_unread_count_key(user)))
+
+
 @frappe.whitelist()
 def mark_as_read(user=None, doc=None):
-    user = user or frappe.session.user
-    filters = {"to_user": user, "read": False}
-    or_filters = []
+    """Mark unread notifications of the session user, or only the ones of `doc`, as read in a single update"""
+    if user and user != frappe.session.user:
+        frappe.throw(_("Not allowed to mark notifications of other users as read"), frappe.PermissionError)
+
+    user = frappe.session.user
+    Notification = frappe.qb.DocType("CRM Notification")
+    query = (
+        frappe.qb.update(Notification)
+        .set(Notification.read, 1)
+        .set(Notification.modified, frappe.utils.now())
+        .set(Notification.modified_by, frappe.session.user)
+        .where(Notification.to_user == user)
+        .where(Notification.read == 0)
+    )
     if doc:
-        or_filters = [
-            {"comment": doc},
-            {"notification_type_doc": doc},
-        ]
-    for n in frappe.get_all("CRM Notification", filters=filters, or_filters=or_filters):
-        d = frappe.get_doc("CRM Notification", n.name)
-        d.read = True
-        d.save()
+        query = query.where((Notification.comment == doc) | (Notification.notification_type_doc == doc))
+    query.run()
+
+    clear_unread_count(user)
+    publish_debounced("crm_notification", user=user)
+
 
 def get_hash(notification):
     _hash = ""
@@ -71,4 +145,4 @@ def get_hash(notification):
         _hash = "#tasks"
         if "has been removed by" in notification.message:
             _hash = ""
-    return _hash
\ No newline at end of file
+    return _hash
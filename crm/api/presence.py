@@ -0,0 +1,80 @@
+import time
+
+import frappe
+
+PRESENCE_KEY = "crm:presence"
+# users are online until this many seconds after their last heartbeat, the UI sends one every 30 seconds
+PRESENCE_TTL = 90
+
+# presence of each site when redis is not used, i.e. in tests
+_local_presence = {}
+
+
+class RedisPresenceStore:
+	"""Last heartbeat of each user in a sorted set of the site, scored by the heartbeat's timestamp"""
+
+	def __init__(self):
+		self.key = frappe.cache.make_key(PRESENCE_KEY)
+
+	def touch(self, user, timestamp):
+		pipeline = frappe.cache.pipeline()
+		pipeline.zadd(self.key, {user: timestamp})
+		pipeline.zremrangebyscore(self.key, "-inf", timestamp - PRESENCE_TTL)
+		pipeline.execute()
+
+	def remove(self, user):
+		frappe.cache.zrem(self.key, user)
+
+	def get_last_seen(self, users):
+		pipeline = frappe.cache.pipeline()
+		for user in users:
+			pipeline.zscore(self.key, user)
+		return dict(zip(users, pipeline.execute()))
+
+
+class LocalPresenceStore:
+	"""In-memory presence of the site, for a single process"""
+
+	def __init__(self):
+		self.last_seen = _local_presence.setdefault(frappe.local.site, {})
+
+	def touch(self, user, timestamp):
+		self.last_seen[user] = timestamp
+
+	def remove(self, user):
+		self.last_seen.pop(user, None)
+
+	def get_last_seen(self, users):
+		return {user: self.last_seen.get(user) for user in users}
+
+
+def get_presence_store():
+	if frappe.flags.in_test:
+		return LocalPresenceStore()
+	return RedisPresenceStore()
+
+
+@frappe.whitelist()
+def heartbeat():
+	"""Mark the session user online, called by the UI when the socket connects and periodically after"""
+	if frappe.session.user == "Guest":
+		return
+	get_presence_store().touch(frappe.session.user, time.time())
+
+
+def mark_offline(user=None):
+	get_presence_store().remove(user or frappe.session.user)
+
+
+def on_logout(login_manager=None):
+	mark_offline()
+
+
+def get_online_users(users):
+	"""Filter the users who sent a heartbeat recently, in the given order"""
+	if not users:
+		return []
+	since = time.time() - PRESENCE_TTL
+	last_seen = get_presence_store().get_last_seen(list(users))
+	return [user for user in users if (last_seen.get(user) or 0) >= since]
+
@@ -0,0 +1,134 @@
+import json
+import time
+
+import frappe
+
+# the first event of a window is published right away, the later ones for the same document and user are
+# coalesced and the latest message is published when the window ends
+REALTIME_DEBOUNCE_WINDOW = 2
+DEBOUNCE_CACHE_KEY = "crm:realtime_debounce"
+# keys with a deferred message, scored by the end of their window
+DEFERRED_EVENTS_KEY = f"{DEBOUNCE_CACHE_KEY}:deferred"
+# set while the job publishing deferred messages is queued or running, expires if the job is lost
+FLUSH_JOB_KEY = f"{DEBOUNCE_CACHE_KEY}:flush_job"
+FLUSH_JOB_TTL = 60
+
+
+def publish_debounced(event, message=None, user=None, key=None):
+	"""
+	Publish a realtime `event` after the transaction is committed
+
+	Events with the same `event`, `key` (e.g. the reference document) and `user` are coalesced within the
+	transaction. Across requests, the ones following a published event within `REALTIME_DEBOUNCE_WINDOW`
+	seconds are coalesced, and a job publishes the latest message when the window ends.
+	"""
+	events = get_pending_events()
+	if not events:
+		frappe.db.after_commit.add(flush_realtime_events)
+		frappe.db.after_rollback.add(clear_realtime_events)
+	events[(event, key, user)] = message
+
+
+def get_pending_events():
+	if not hasattr(frappe.local, "crm_realtime_events"):
+		frappe.local.crm_realtime_events = {}
+	return frappe.local.crm_realtime_events
+
+
+def clear_realtime_events():
+	frappe.local.crm_realtime_events = {}
+
+
+def flush_realtime_events():
+	events = get_pending_events()
+	clear_realtime_events()
+	for (event, key, user), message in events.items():
+		publish_or_defer(event, message, user, key)
+
+
+def publish_or_defer(event, message, user, key):
+	"""Publish the message if no message was published within the window, else defer it to its end"""
+	# redis commands are sent as is, so every key is made here
+	cache_key = get_debounce_key(event, key, user)
+	window_key = frappe.cache.make_key(cache_key)
+	pending_key = frappe.cache.make_key(f"{cache_key}:pending")
+
+	if frappe.cache.set(window_key, 1, ex=REALTIME_DEBOUNCE_WINDOW, nx=True):
+		# a message deferred before is older than this one
+		frappe.cache.delete(pending_key)
+		frappe.publish_realtime(event, message, user=user)
+		return
+
+	pipeline = frappe.cache.pipeline()
+	pipeline.set(
+		pending_key,
+		frappe.as_json({"event": event, "user": user, "message": message}, indent=None),
+		ex=FLUSH_JOB_TTL,
+	)
+	pipeline.pttl(window_key)
+	window_ttl = pipeline.execute()[1]
+
+	window_end = get_redis_time() + max(window_ttl, 0) / 1000
+	frappe.cache.zadd(frappe.cache.make_key(DEFERRED_EVENTS_KEY), {cache_key: window_end}, nx=True)
+	if frappe.cache.set(frappe.cache.make_key(FLUSH_JOB_KEY), 1, ex=FLUSH_JOB_TTL, nx=True):
+		frappe.enqueue("crm.api.realtime.publish_deferred_events", queue="short")
+
+
+def publish_deferred_events():
+	"""
+	Publish deferred messages of the site as their windows end
+
+	A single job per site runs while messages are deferred, waiting at most `REALTIME_DEBOUNCE_WINDOW`
+	seconds between publishes.
+	"""
+	deferred_key = frappe.cache.make_key(DEFERRED_EVENTS_KEY)
+	flush_job_key = frappe.cache.make_key(FLUSH_JOB_KEY)
+
+	while True:
+		now = get_redis_time()
+		pipeline = frappe.cache.pipeline()
+		pipeline.zrangebyscore(deferred_key, "-inf", now)
+		pipeline.zremrangebyscore(deferred_key, "-inf", now)
+		for cache_key in pipeline.execute()[0]:
+			publish_deferred_event(frappe.safe_decode(cache_key))
+
+		next_window_end = frappe.cache.zrange(deferred_key, 0, 0, withscores=True)
+		if next_window_end:
+			frappe.cache.expire(flush_job_key, FLUSH_JOB_TTL)
+			wait = next_window_end[0][1] - get_redis_time()
+			time.sleep(min(max(wait, 0), REALTIME_DEBOUNCE_WINDOW))
+			continue
+
+		frappe.cache.delete(flush_job_key)
+		# a message deferred before the flag was cleared did not queue a job, publish it here
+		if not frappe.cache.zcard(deferred_key):
+			return
+		if not frappe.cache.set(flush_job_key, 1, ex=FLUSH_JOB_TTL, nx=True):
+			return
+
+
+def publish_deferred_event(cache_key):
+	window_key = frappe.cache.make_key(cache_key)
+	pending_key = frappe.cache.make_key(f"{cache_key}:pending")
+
+	pipeline = frappe.cache.pipeline()
+	pipeline.get(pending_key)
+	pipeline.delete(pending_key)
+	pending = pipeline.execute()[0]
+
+	# the window is taken by a message published after the deferred one, which is outdated
+	if not pending or not frappe.cache.set(window_key, 1, ex=REALTIME_DEBOUNCE_WINDOW, nx=True):
+		return
+
+	pending = json.loads(pending)
+	frappe.publish_realtime(pending["event"], pending["message"], user=pending["user"])
+
+
+def get_redis_time():
+	"""Current time of the redis server, windows expire by its clock"""
+	seconds, microseconds = frappe.cache.time()
+	return seconds + microseconds / 1e6
+
+
+def get_debounce_key(event, key, user):
+	return f"{DEBOUNCE_CACHE_KEY}:{event}:{key or ''}:{user or ''}"
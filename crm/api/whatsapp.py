@@ -2,10 +2,12 @@ import json
 
 import frappe
 from frappe import _
+from frappe.query_builder import Order
 
 from crm.api.doc import get_assigned_users
+from crm.api.realtime import publish_debounced
 from crm.fcrm.doctype.crm_notification.crm_notification import notify_user
-
+from crm.fcrm.doctype.crm_phone_index.crm_phone_index import get_references_by_phone
 
 def validate(doc, method):
 	if doc.type == "Incoming" and doc.get("from"):
@@ -14,16 +16,33 @@ def validate(doc, method):
 		doc.reference_name = name
 
 
+# provider updates of these fields (sent, delivered, read, ...) don't notify the agents again
+STATUS_FIELDS = {"status", "modified", "modified_by"}
+
+
 def on_update(doc, method):
-	frappe.publish_realtime(
+	publish_debounced(
 		"whatsapp_message",
 		{
 			"reference_doctype": doc.reference_doctype,
 			"reference_name": doc.reference_name,
 		},
+		key=f"{doc.reference_doctype}:{doc.reference_name}",
 	)
 
-	notify_agent(doc)
+	if not is_status_only_update(doc):
+		notify_agent(doc)
+
+
+def is_status_only_update(doc):
+	before = doc.get_doc_before_save()
+	if not before:
+		return False
+	return all(
+		doc.get(fieldname) == before.get(fieldname)
+		for fieldname in doc.meta.get_valid_columns()
+		if fieldname not in STATUS_FIELDS
+	)
 
 
 def notify_agent(doc):
@@ -57,29 +76,32 @@ def notify_agent(doc):
 
 def get_lead_or_deal_from_number(number):
 	"""Get lead/deal from the given number."""
+	number = parse_mobile_no(number)
+	if not number.startswith("+"):
+		# whatsapp numbers always have the country code
+		number = f"+{number}"
+	return find_lead_or_deal(number)
+
+
+def find_lead_or_deal(number):
+	"""Find deal, else open lead, else converted lead with `number` using the phone index"""
+	references = get_references_by_phone(number, ["CRM Deal", "CRM Lead"])
+
+	if references.get("CRM Deal"):
+		return references["CRM Deal"][0], "CRM Deal"
+
+	if references.get("CRM Lead"):
+		leads = frappe.db.get_all(
+			"CRM Lead",
+			filters={"name": ("in", references["CRM Lead"])},
+			order_by="converted asc",
+			pluck="name",
+			limit=1,
+		)
+		if leads:
+			return leads[0], "CRM Lead"
 
-	def find_record(doctype, mobile_no, where=""):
-		mobile_no = parse_mobile_no(mobile_no)
-
-		query = f"""
-            SELECT name, mobile_no
-            FROM `tab{doctype}`
-            WHERE CONCAT('+', REGEXP_REPLACE(mobile_no, '[^0-9]', '')) = {mobile_no}
-        """
-
-		data = frappe.db.sql(query + where, as_dict=True)
-		return data[0].name if data else None
-
-	doctype = "CRM Deal"
-
-	doc = find_record(doctype, number) or None
-	if not doc:
-		doctype = "CRM Lead"
-		doc = find_record(doctype, number, "AND converted is not True")
-		if not doc:
-			doc = find_record(doctype, number)
-
-	return doc, doctype
+	return None, "CRM Lead"
 
 
 def parse_mobile_no(mobile_no: str):
@@ -104,13 +126,153 @@ def is_whatsapp_installed():
 	return True
 
 
-@frappe.whitelist()
-def get_whatsapp_messages(reference_doctype, reference_name):
+WHATSAPP_MESSAGE_FIELDS = [
+	"name",
+	"type",
+	"to",
+	"from",
+	"content_type",
+	"message_type",
+	"attach",
+	"template",
+	"use_template",
+	"message_id",
+	"is_reply",
+	"reply_to_message_id",
+	"creation",
+	"message",
+	"status",
+	"reference_doctype",
+	"reference_name",
+	"template_parameters",
+	"template_header_parameters",
+]
+
+
+CONVERSATION_PAGE_LENGTH = 50
+# a sync returns the messages changed this many seconds before the previous one as well, so that messages
+# saved before it but committed after it are not missed
+CONVERSATION_SYNC_OVERLAP = 60
+
+
+def is_whatsapp_messages_available():
 	# twilio integration app is not compatible with crm app
 	# crm has its own twilio integration in built
 	if "twilio_integration" in frappe.get_installed_apps():
-		return []
+		return False
+	return bool(frappe.db.exists("DocType", "WhatsApp Message"))
+
+
+def add_whatsapp_message_indexes():
+	"""Index WhatsApp Message for conversation windows and thread lookups, called after migrate"""
 	if not frappe.db.exists("DocType", "WhatsApp Message"):
+		return
+	frappe.db.add_index("WhatsApp Message", ["reference_doctype", "reference_name", "creation"])
+	frappe.db.add_index("WhatsApp Message", ["reference_doctype", "reference_name", "modified"])
+	frappe.db.add_index("WhatsApp Message", ["message_id"])
+	frappe.db.add_index("WhatsApp Message", ["reply_to_message_id"])
+
+
+@frappe.whitelist()
+def get_whatsapp_conversation(
+	reference_doctype, reference_name, limit=CONVERSATION_PAGE_LENGTH, before=None, since=None
+):
+	"""
+	Get a window of the lead/deal conversation, oldest message first
+
+	:param before: `[creation, name]` of the oldest loaded message, to get the window before it
+	:param since: `synced_at` of the previous call, to get only the messages created or updated after it
+	:return: `{"messages": [...], "has_more": bool, "synced_at": timestamp}`, messages changed around
+		`synced_at` are returned again by the next sync
+	"""
+	synced_at = str(
+		frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=-CONVERSATION_SYNC_OVERLAP)
+	)
+	if not is_whatsapp_messages_available():
+		return {"messages": [], "has_more": False, "synced_at": synced_at}
+
+	Message = frappe.qb.DocType("WhatsApp Message")
+	# queries are copied when a condition is added, so this one is shared by all of them
+	conversation = get_conversation_query(reference_doctype, reference_name)
+	has_more = False
+
+	if since:
+		changed = conversation.where(Message.modified >= since).run(as_dict=True)
+		messages = [message for message in changed if message["content_type"] != "reaction"]
+		# a changed reaction is sent as an update of the message it reacts to
+		messages += get_messages_by_id(
+			conversation,
+			{message["reply_to_message_id"] for message in changed if message["content_type"] == "reaction"}
+			- {message["message_id"] for message in messages},
+		)
+	else:
+		limit = min(frappe.utils.cint(limit) or CONVERSATION_PAGE_LENGTH, 500)
+		query = (
+			conversation.where(Message.content_type.isnull() | (Message.content_type != "reaction"))
+			.orderby(Message.creation, order=Order.desc)
+			.orderby(Message.name, order=Order.desc)
+			.limit(limit + 1)
+		)
+		if before:
+			creation, name = frappe.parse_json(before)
+			query = query.where(
+				(Message.creation < creation) | ((Message.creation == creation) & (Message.name < name))
+			)
+		messages = query.run(as_dict=True)
+		has_more = len(messages) > limit
+		messages = messages[:limit][::-1]
+
+	names = {message["name"] for message in messages}
+	message_ids = {message["message_id"] for message in messages if message["message_id"]}
+	reply_to_ids = {message["reply_to_message_id"] for message in messages if message["is_reply"]}
+
+	# reactions to the window and replied messages outside it are needed to assemble the thread
+	reactions = get_reactions(conversation, message_ids)
+	replied_messages = get_messages_by_id(conversation, reply_to_ids - message_ids)
+	thread = build_whatsapp_thread(messages + replied_messages + reactions)
+
+	return {
+		"messages": [message for message in thread if message["name"] in names],
+		"has_more": has_more,
+		"synced_at": synced_at,
+	}
+
+
+def get_conversation_query(reference_doctype, reference_name):
+	"""Query of the messages of the lead/deal, along with the ones of the lead a deal was converted from"""
+	Message = frappe.qb.DocType("WhatsApp Message")
+	condition = (Message.reference_doctype == reference_doctype) & (Message.reference_name == reference_name)
+	if reference_doctype == "CRM Deal":
+		lead = frappe.db.get_value(reference_doctype, reference_name, "lead")
+		if lead:
+			condition |= (Message.reference_doctype == "CRM Lead") & (Message.reference_name == lead)
+
+	fields = [Message[field] for field in WHATSAPP_MESSAGE_FIELDS]
+	return frappe.qb.from_(Message).select(*fields).where(condition)
+
+
+def get_messages_by_id(query, message_ids):
+	if not message_ids:
+		return []
+	Message = frappe.qb.DocType("WhatsApp Message")
+	return query.where(Message.message_id.isin(list(message_ids))).run(as_dict=True)
+
+
+def get_reactions(query, message_ids):
+	if not message_ids:
+		return []
+	Message = frappe.qb.DocType("WhatsApp Message")
+	return (
+		query.where(Message.content_type == "reaction")
+		.where(Message.reply_to_message_id.isin(list(message_ids)))
+		.orderby(Message.creation, order=Order.asc)
+		.run(as_dict=True)
+	)
+
+
+@frappe.whitelist()
+def get_whatsapp_messages(reference_doctype, reference_name):
+	if not is_whatsapp_messages_available():
 		return []
 	messages = []
 
@@ -123,27 +285,7 @@ def get_whatsapp_messages(reference_doctype, reference_name):
 					"reference_doctype": "CRM Lead",
 					"reference_name": lead,
 				},
-				fields=[
-					"name",
-					"type",
-					"to",
-					"from",
-					"content_type",
-					"message_type",
-					"attach",
-					"template",
-					"use_template",
-					"message_id",
-					"is_reply",
-					"reply_to_message_id",
-					"creation",
-					"message",
-					"status",
-					"reference_doctype",
-					"reference_name",
-					"template_parameters",
-					"template_header_parameters",
-				],
+				fields=WHATSAPP_MESSAGE_FIELDS,
 			)
 
 	messages += frappe.get_all(
@@ -152,82 +294,47 @@ def get_whatsapp_messages(reference_doctype, reference_name):
 			"reference_doctype": reference_doctype,
 			"reference_name": reference_name,
 		},
-		fields=[
-			"name",
-			"type",
-			"to",
-			"from",
-			"content_type",
-			"message_type",
-			"attach",
-			"template",
-			"use_template",
-			"message_id",
-			"is_reply",
-			"reply_to_message_id",
-			"creation",
-			"message",
-			"status",
-			"reference_doctype",
-			"reference_name",
-			"template_parameters",
-			"template_header_parameters",
-		],
+		fields=WHATSAPP_MESSAGE_FIELDS,
 	)
 
-	# Filter messages to get only Template messages
-	template_messages = [message for message in messages if message["message_type"] == "Template"]
+	return build_whatsapp_thread(messages)
 
-	# Iterate through template messages
-	for template_message in template_messages:
-		# Find the template that this message is using
-		template = frappe.get_doc("WhatsApp Templates", template_message["template"])
-
-		# If the template is found, add the template details to the template message
-		if template:
-			template_message["template_name"] = template.template_name
-			if template_message["template_parameters"]:
-				parameters = json.loads(template_message["template_parameters"])
-				template.template = parse_template_parameters(template.template, parameters)
-
-			template_message["template"] = template.template
-			if template_message["template_header_parameters"]:
-				header_parameters = json.loads(template_message["template_header_parameters"])
-				template.header = parse_template_parameters(template.header, header_parameters)
-			template_message["header"] = template.header
-			template_message["footer"] = template.footer
-
-	# Filter messages to get only reaction messages
-	reaction_messages = [message for message in messages if message["content_type"] == "reaction"]
-
-	# Iterate through reaction messages
-	for reaction_message in reaction_messages:
-		# Find the message that this reaction is reacting to
-		reacted_message = next(
-			(m for m in messages if m["message_id"] == reaction_message["reply_to_message_id"]),
-			None,
-		)
 
-		# If the reacted message is found, add the reaction to it
-		if reacted_message:
-			reacted_message["reaction"] = reaction_message["message"]
+def build_whatsapp_thread(messages):
+	"""
+	Add template, reaction, reply and sender details to the messages and drop the reactions
+
+	Messages are indexed by `message_id` once, templates are loaded in a single query and the sender
+	name is resolved once per reference document.
+	"""
+	set_template_details([message for message in messages if message["message_type"] == "Template"])
+
+	messages_by_id = {message["message_id"]: message for message in messages if message["message_id"]}
 
+	# Add reactions to the messages they react to, the last reaction wins
 	for message in messages:
-		from_name = get_from_name(message) if message["from"] else _("You")
-		message["from_name"] = from_name
-	# Filter messages to get only replies
-	reply_messages = [message for message in messages if message["is_reply"]]
-
-	# Iterate through reply messages
-	for reply_message in reply_messages:
-		# Find the message that this message is replying to
-		replied_message = next(
-			(m for m in messages if m["message_id"] == reply_message["reply_to_message_id"]),
-			None,
-		)
+		if message["content_type"] == "reaction":
+			reacted_message = messages_by_id.get(message["reply_to_message_id"])
+			if reacted_message:
+				reacted_message["reaction"] = message["message"]
+
+	from_names = {}
 
-		# If the replied message is found, add the reply details to the reply message
-		from_name = get_from_name(reply_message) if replied_message["from"] else _("You")
+	def _get_from_name(message):
+		key = (message["reference_doctype"], message["reference_name"])
+		if key not in from_names:
+			from_names[key] = get_from_name(message)
+		return from_names[key]
+
+	for message in messages:
+		message["from_name"] = _get_from_name(message) if message["from"] else _("You")
+
+	# Add details of the replied message to the replies
+	for reply_message in messages:
+		if not reply_message["is_reply"]:
+			continue
+
+		replied_message = messages_by_id.get(reply_message["reply_to_message_id"])
 		if replied_message:
 			message = replied_message["message"]
 			if replied_message["message_type"] == "Template":
@@ -237,11 +344,48 @@ def get_whatsapp_messages(reference_doctype, reference_name):
 			reply_message["footer"] = replied_message.get("footer") or ""
 			reply_message["reply_to"] = replied_message["name"]
 			reply_message["reply_to_type"] = replied_message["type"]
-			reply_message["reply_to_from"] = from_name
+			reply_message["reply_to_from"] = (
+				_get_from_name(reply_message) if replied_message["from"] else _("You")
+			)
 
 	return [message for message in messages if message["content_type"] != "reaction"]
 
 
+def set_template_details(template_messages):
+	"""Add template name, body, header and footer to the template messages"""
+	template_names = {message["template"] for message in template_messages if message["template"]}
+	if not template_names:
+		return
+
+	templates = {
+		template.name: template
+		for template in frappe.get_all(
+			"WhatsApp Templates",
+			filters={"name": ("in", list(template_names))},
+			fields=["name", "template_name", "template", "header", "footer"],
+		)
+	}
+
+	for template_message in template_messages:
+		template = templates.get(template_message["template"])
+		if not template:
+			continue
+
+		template_message["template_name"] = template.template_name
+		body = template.template
+		if template_message["template_parameters"]:
+			parameters = json.loads(template_message["template_parameters"])
+			body = parse_template_parameters(body, parameters)
+
+		template_message["template"] = body
+		header = template.header
+		if template_message["template_header_parameters"]:
+			header_parameters = json.loads(template_message["template_header_parameters"])
+			header = parse_template_parameters(header, header_parameters)
+		template_message["header"] = header
+		template_message["footer"] = template.footer
+
+
 @frappe.whitelist()
 def create_whatsapp_message(
 	reference_doctype,
@@ -324,9 +468,9 @@ def parse_template_parameters(string, parameters):
 
 
 def get_from_name(message):
-	doc = frappe.get_doc(message["reference_doctype"], message["reference_name"])
 	from_name = ""
 	if message["reference_doctype"] == "CRM Deal":
+		doc = frappe.get_doc(message["reference_doctype"], message["reference_name"])
 		if doc.get("contacts"):
 			for c in doc.get("contacts"):
 				if c.is_primary:
@@ -335,5 +479,8 @@ def get_from_name(message):
 		else:
 			from_name = doc.get("lead_name")
 	else:
-		from_name = doc.get("first_name") + " " + doc.get("last_name")
+		first_name, last_name = frappe.db.get_value(
+			message["reference_doctype"], message["reference_name"], ["first_name", "last_name"]
+		)
+		from_name = first_name + " " + last_name
 	return from_name
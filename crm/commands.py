@@ -0,0 +1,22 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("backfill-crm-activity-feed")
+@click.option("--batch-size", default=1000, type=int, help="Number of documents processed at a time")
+@pass_context
+def backfill_crm_activity_feed(context, batch_size):
+	"""Create CRM Activity feed rows of existing versions, comments, emails, files, calls, notes and tasks"""
+	import frappe
+
+	from crm.fcrm.doctype.crm_activity.crm_activity import backfill_activity_feed
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		backfill_activity_feed(batch_size=batch_size)
+	finally:
+		frappe.destroy()
+
+
+commands = [backfill_crm_activity_feed]
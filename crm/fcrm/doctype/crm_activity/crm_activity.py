@@ -0,0 +1,329 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from crm.api.activities import (
+	get_attachment_log_activity,
+	get_comment_activity,
+	get_communication_activity,
+	get_timeline_avoid_fields,
+	get_timeline_fields,
+	get_version_activity,
+)
+
+FEED_REFERENCE_DOCTYPES = ["CRM Lead", "CRM Deal"]
+BACKFILL_BATCH_SIZE = 1000
+
+ACTIVITY_FEED_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"modified_by",
+	"owner",
+	"activity_type",
+	"reference_doctype",
+	"reference_name",
+	"source_doctype",
+	"source_name",
+	"data",
+]
+
+COMMUNICATION_FIELDS = [
+	"name",
+	"owner",
+	"creation",
+	"reference_doctype",
+	"reference_name",
+	"communication_type",
+	"communication_date",
+	"subject",
+	"sender_full_name",
+	"sender",
+	"recipients",
+	"cc",
+	"bcc",
+	"read_by_recipient",
+	"delivery_status",
+]
+FILE_FIELDS = [
+	"name",
+	"file_name",
+	"file_type",
+	"file_url",
+	"file_size",
+	"is_private",
+	"modified",
+	"creation",
+	"owner",
+]
+CALL_FIELDS = [
+	"name",
+	"caller",
+	"receiver",
+	"from",
+	"to",
+	"duration",
+	"start_time",
+	"end_time",
+	"status",
+	"type",
+	"recording_url",
+	"creation",
+	"note",
+]
+NOTE_FIELDS = ["name", "title", "content", "owner", "creation", "modified"]
+TASK_FIELDS = [
+	"name",
+	"title",
+	"description",
+	"assigned_to",
+	"due_date",
+	"priority",
+	"status",
+	"owner",
+	"creation",
+	"modified",
+]
+
+# child tables which link a source with more than one lead/deal: doctype -> (child doctype, fieldname)
+FEED_LINK_TABLES = {
+	"Communication": ("Communication Link", "timeline_links"),
+	"CRM Call Log": ("Dynamic Link", "links"),
+}
+
+
+class CRMActivity(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("CRM Activity", ["reference_doctype", "reference_name", "creation"])
+
+
+def update_activity_feed(doc, method=None):
+	"""Replace the feed rows of `doc` (version, comment, email, file, call, note or task)"""
+	# every save of any document inserts a version, most of them are not of a lead/deal
+	if doc.doctype == "Version" and doc.ref_doctype not in FEED_REFERENCE_DOCTYPES:
+		return
+
+	entries = get_activity_feed_entries(doc)
+	# only documents which are, or were before the save, on a lead/deal timeline have rows to replace
+	if method != "after_insert" and (entries or is_on_activity_feed(doc.get_doc_before_save())):
+		frappe.db.delete("CRM Activity", {"source_doctype": doc.doctype, "source_name": doc.name})
+
+	for entry in entries:
+		frappe.get_doc({"doctype": "CRM Activity", **entry}).db_insert()
+
+
+def delete_activity_feed(doc, method=None):
+	if not is_on_activity_feed(doc):
+		return
+	frappe.db.delete("CRM Activity", {"source_doctype": doc.doctype, "source_name": doc.name})
+
+
+def is_on_activity_feed(doc):
+	"""Whether `doc` is shown on the timeline of any lead/deal"""
+	if not doc:
+		return False
+	return any(
+		get_activity_feed_data(doc, reference_doctype)[0]
+		for reference_doctype, _ in get_activity_feed_references(doc)
+	)
+
+
+def get_activity_feed_entries(doc):
+	"""Returns `CRM Activity` rows of `doc`, one for every lead/deal timeline it is shown on"""
+	entries = []
+	for reference_doctype, reference_name in get_activity_feed_references(doc):
+		activity_type, data = get_activity_feed_data(doc, reference_doctype)
+		if not data:
+			continue
+
+		entries.append(
+			{
+				"name": frappe.generate_hash(length=10),
+				"creation": doc.creation,
+				"modified": frappe.utils.now(),
+				"modified_by": frappe.session.user,
+				"owner": doc.owner,
+				"activity_type": activity_type,
+				"reference_doctype": reference_doctype,
+				"reference_name": reference_name,
+				"source_doctype": doc.doctype,
+				"source_name": doc.name,
+				"data": frappe.as_json(data, indent=None),
+			}
+		)
+	return entries
+
+
+def get_activity_feed_references(doc):
+	if doc.doctype == "Version":
+		references = [(doc.ref_doctype, doc.docname)]
+	elif doc.doctype == "File":
+		references = [(doc.attached_to_doctype, doc.attached_to_name)]
+	elif doc.doctype in ["CRM Call Log", "FCRM Note", "CRM Task"]:
+		references = [(doc.reference_doctype, doc.reference_docname)]
+	else:
+		references = [(doc.reference_doctype, doc.reference_name)]
+
+	if link_table := FEED_LINK_TABLES.get(doc.doctype):
+		references += [(link.link_doctype, link.link_name) for link in doc.get(link_table[1]) or []]
+
+	return list(dict.fromkeys(r for r in references if r[0] in FEED_REFERENCE_DOCTYPES and r[1]))
+
+
+def get_activity_feed_data(doc, reference_doctype):
+	"""Returns `(activity_type, data)` of `doc` as shown on the timeline of `reference_doctype`"""
+	is_lead = reference_doctype == "CRM Lead"
+
+	if doc.doctype == "Version":
+		meta_fields = get_timeline_fields(reference_doctype)
+		avoid_fields = get_timeline_avoid_fields(reference_doctype)
+		return "version", get_version_activity(doc, meta_fields, avoid_fields, is_lead)
+
+	if doc.doctype == "Comment":
+		if doc.comment_type == "Comment":
+			return "comment", get_comment_activity(doc, [], is_lead)
+		if doc.comment_type in ["Attachment", "Attachment Removed"]:
+			return "attachment_log", get_attachment_log_activity(doc, is_lead)
+		return None, None
+
+	if doc.doctype == "Communication":
+		if doc.communication_type not in ["Communication", "Automated Message"]:
+			return None, None
+		activity = get_communication_activity(doc, [], is_lead)
+		# email bodies are fetched when the email is opened
+		activity["data"].pop("content", None)
+		return "communication", activity
+
+	if doc.doctype == "File":
+		data = {field: doc.get(field) for field in FILE_FIELDS}
+		data["activity_type"] = "attachment"
+		return "attachment", data
+
+	if doc.doctype == "CRM Call Log":
+		return "call", {**{field: doc.get(field) for field in CALL_FIELDS}, "activity_type": "call"}
+
+	if doc.doctype == "FCRM Note":
+		return "note", {**{field: doc.get(field) for field in NOTE_FIELDS}, "activity_type": "note"}
+
+	if doc.doctype == "CRM Task":
+		return "task", {**{field: doc.get(field) for field in TASK_FIELDS}, "activity_type": "task"}
+
+	return None, None
+
+
+def get_activity_feed_sources():
+	"""Returns `(doctype, filters, fields)` of the documents shown on lead/deal timelines"""
+	return [
+		(
+			"Version",
+			[["ref_doctype", "in", FEED_REFERENCE_DOCTYPES]],
+			["name", "ref_doctype", "docname", "data", "owner", "creation"],
+		),
+		(
+			"Comment",
+			[
+				["reference_doctype", "in", FEED_REFERENCE_DOCTYPES],
+				["comment_type", "in", ["Comment", "Attachment", "Attachment Removed"]],
+			],
+			["name", "reference_doctype", "reference_name", "comment_type", "content", "owner", "creation"],
+		),
+		(
+			"Communication",
+			[["communication_type", "in", ["Communication", "Automated Message"]]],
+			COMMUNICATION_FIELDS,
+		),
+		(
+			"File",
+			[["attached_to_doctype", "in", FEED_REFERENCE_DOCTYPES]],
+			[*FILE_FIELDS, "attached_to_doctype", "attached_to_name"],
+		),
+		("CRM Call Log", [], [*CALL_FIELDS, "owner", "reference_doctype", "reference_docname"]),
+		(
+			"FCRM Note",
+			[["reference_doctype", "in", FEED_REFERENCE_DOCTYPES]],
+			[*NOTE_FIELDS, "reference_doctype", "reference_docname"],
+		),
+		(
+			"CRM Task",
+			[["reference_doctype", "in", FEED_REFERENCE_DOCTYPES]],
+			[*TASK_FIELDS, "reference_doctype", "reference_docname"],
+		),
+	]
+
+
+def backfill_activity_feed(batch_size=BACKFILL_BATCH_SIZE):
+	"""Create the missing feed rows of existing documents, `batch_size` documents at a time
+
+	Rows created by the doc events while the backfill runs are not duplicated. Once done, timelines are
+	read from the feed.
+	"""
+	for doctype, filters, fields in get_activity_feed_sources():
+		last_name = None
+		while True:
+			_filters = (filters + [["name", ">", last_name]]) if last_name else filters
+			rows = frappe.db.get_all(
+				doctype, filters=_filters, fields=fields, order_by="name asc", limit=batch_size
+			)
+			if not rows:
+				break
+
+			insert_missing_activity_feed(doctype, rows)
+			frappe.db.commit()
+			last_name = rows[-1].name
+
+	frappe.db.set_global("crm_activity_feed_ready", 1)
+	frappe.db.commit()
+
+
+def insert_missing_activity_feed(doctype, rows):
+	existing = set(
+		frappe.db.get_all(
+			"CRM Activity",
+			filters={"source_doctype": doctype, "source_name": ("in", [row.name for row in rows])},
+			pluck="source_name",
+		)
+	)
+	rows = [row for row in rows if row.name not in existing]
+	if not rows:
+		return
+
+	set_activity_feed_links(doctype, rows)
+
+	values = []
+	for row in rows:
+		row.doctype = doctype
+		values += [
+			[entry[field] for field in ACTIVITY_FEED_FIELDS] for entry in get_activity_feed_entries(row)
+		]
+
+	if values:
+		frappe.db.bulk_insert("CRM Activity", ACTIVITY_FEED_FIELDS, values)
+
+
+def set_activity_feed_links(doctype, rows):
+	"""Set lead/deal links of `rows` from their child table using a single query"""
+	if doctype not in FEED_LINK_TABLES:
+		return
+
+	link_doctype, fieldname = FEED_LINK_TABLES[doctype]
+	links = frappe.db.get_all(
+		link_doctype,
+		filters={
+			"parenttype": doctype,
+			"parent": ("in", [row.name for row in rows]),
+			"link_doctype": ("in", FEED_REFERENCE_DOCTYPES),
+		},
+		fields=["parent", "link_doctype", "link_name"],
+	)
+
+	links_map = {}
+	for link in links:
+		links_map.setdefault(link.parent, []).append(link)
+
+	for row in rows:
+		row[fieldname] = links_map.get(row.name, [])
@@ -0,0 +1,49 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from crm.api import activities
+from crm.fcrm.doctype.crm_activity import crm_activity
+
+
+class TestCRMActivity(UnitTestCase):
+	def test_timeline_sources_include_call_linked_notes_and_tasks(self):
+		note = frappe._dict(name="note-1", activity_type="note", reference_docname="CRM-LEAD-1")
+		references = [("CRM Deal", "CRM-DEAL-1")]
+
+		for feed_ready in (False, True):
+			with (
+				patch.object(activities, "is_activity_feed_ready", return_value=feed_ready),
+				patch.object(activities, "get_feed_activities", return_value=iter([])),
+				patch.object(activities, "get_note_activities", return_value=iter([])),
+				patch.object(activities, "get_task_activities", return_value=iter([])),
+				patch.object(activities, "get_call_activities", return_value=[]),
+				patch.object(
+					activities, "get_call_note_and_task_sources", return_value=[iter([note])]
+				) as get_call_note_and_task_sources,
+			):
+				sources = activities.get_timeline_sources(references, ["call", "note", "task"], None, 20)
+				timeline = [activity for source in sources for activity in source]
+
+			self.assertIn(note, timeline, f"feed ready: {feed_ready}")
+			get_call_note_and_task_sources.assert_called_once_with(
+				["CRM-DEAL-1"], ["call", "note", "task"], None, 20
+			)
+
+	def test_call_feed_data_has_activity_type(self):
+		call = frappe._dict(doctype="CRM Call Log", name="call-1", status="Completed")
+		activity_type, data = crm_activity.get_activity_feed_data(call, "CRM Deal")
+
+		self.assertEqual(activity_type, "call")
+		self.assertEqual(data["activity_type"], "call")
+
+	def test_versions_of_other_doctypes_are_skipped(self):
+		version = frappe._dict(doctype="Version", name="version-1", ref_doctype="Contact", docname="c-1")
+		with patch.object(crm_activity, "get_activity_feed_entries") as get_activity_feed_entries:
+			crm_activity.update_activity_feed(version, "after_insert")
+
+		get_activity_feed_entries.assert_not_called()
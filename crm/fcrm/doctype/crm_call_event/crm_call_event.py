@@ -0,0 +1,101 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, now_datetime
+
+CALL_EVENT_BATCH_SIZE = 500
+# days processed events are kept for, failed ones are kept until they are looked into
+CALL_EVENT_RETENTION_DAYS = 7
+
+# applies queued events of a call: `apply_call_events(call_sid, events)`
+CALL_EVENT_HANDLERS = {
+	"Exotel": "crm.integrations.exotel.handler.apply_call_events",
+	"Twilio": "crm.integrations.twilio.api.apply_call_events",
+}
+
+
+class CRMCallEvent(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("CRM Call Event", ["status", "creation"])
+
+
+def queue_call_event(telephony_medium, event_type, call_sid, payload):
+	"""Store the webhook payload and process it in the background, called by the webhooks"""
+	frappe.get_doc(
+		{
+			"doctype": "CRM Call Event",
+			"telephony_medium": telephony_medium,
+			"event_type": event_type,
+			"call_sid": call_sid,
+			"payload": frappe.as_json(payload, indent=None),
+		}
+	).insert(ignore_permissions=True)
+	frappe.db.commit()
+	enqueue_call_event_processing()
+
+
+def enqueue_call_event_processing():
+	frappe.enqueue(
+		"crm.fcrm.doctype.crm_call_event.crm_call_event.process_call_events",
+		queue="short",
+		job_id="crm_call_events",
+		deduplicate=True,
+	)
+
+
+def process_call_events(batch_size=CALL_EVENT_BATCH_SIZE):
+	"""
+	Apply queued call events, oldest first, `batch_size` at a time
+
+	Events of a call are applied together so that a burst of status updates results in a single call log
+	update. Failed calls are marked and logged without blocking the rest of the batch.
+	"""
+	while True:
+		events = frappe.get_all(
+			"CRM Call Event",
+			filters={"status": "Queued"},
+			fields=["name", "telephony_medium", "event_type", "call_sid", "payload"],
+			order_by="creation asc",
+			limit=batch_size,
+		)
+		if not events:
+			break
+
+		calls = {}
+		for event in events:
+			event.payload = frappe.parse_json(event.payload or "{}")
+			calls.setdefault((event.telephony_medium, event.call_sid), []).append(event)
+
+		for (telephony_medium, call_sid), call_events in calls.items():
+			status, error = "Processed", None
+			try:
+				frappe.get_attr(CALL_EVENT_HANDLERS[telephony_medium])(call_sid, call_events)
+			except Exception:
+				frappe.db.rollback()
+				status, error = "Failed", frappe.get_traceback()
+				frappe.log_error(title=f"Error while applying {telephony_medium} call events")
+
+			CallEvent = frappe.qb.DocType("CRM Call Event")
+			(
+				frappe.qb.update(CallEvent)
+				.set(CallEvent.status, status)
+				.set(CallEvent.error, error)
+				.where(CallEvent.name.isin([event.name for event in call_events]))
+			).run()
+			frappe.db.commit()
+
+		if len(events) < batch_size:
+			break
+
+
+def delete_processed_call_events(days=CALL_EVENT_RETENTION_DAYS):
+	"""Delete events processed more than `days` ago, runs daily"""
+	frappe.db.delete(
+		"CRM Call Event",
+		{"status": "Processed", "creation": ("<", add_days(now_datetime(), -days))},
+	)
@@ -0,0 +1,74 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.utils import add_days, now_datetime
+
+from crm.fcrm.doctype.crm_call_event import crm_call_event
+from crm.integrations.exotel import handler as exotel_handler
+
+
+def fail_call_events(call_sid, events):
+	raise frappe.ValidationError("Call log could not be updated")
+
+
+class UnitTestCRMCallEvent(UnitTestCase):
+	def test_call_log_errors_are_raised(self):
+		call_log = MagicMock()
+		call_log.save.side_effect = frappe.ValidationError
+		event = frappe._dict(payload={"CallSid": "call-1", "Status": "completed"})
+
+		with (
+			patch.object(exotel_handler, "get_call_log", return_value=call_log),
+			self.assertRaises(frappe.ValidationError),
+		):
+			exotel_handler.apply_call_events("call-1", [event, event])
+
+
+class IntegrationTestCRMCallEvent(IntegrationTestCase):
+	def tearDown(self):
+		frappe.db.delete("CRM Call Event", {"call_sid": ("like", "test-call-%")})
+		frappe.db.commit()
+
+	def insert_call_event(self, call_sid, status="Queued", creation=None):
+		event = frappe.get_doc(
+			{
+				"doctype": "CRM Call Event",
+				"telephony_medium": "Exotel",
+				"event_type": "Status",
+				"call_sid": call_sid,
+				"status": status,
+				"payload": "{}",
+			}
+		).insert(ignore_permissions=True)
+		if creation:
+			event.db_set("creation", creation)
+		# processing rolls back a failed call, the events are committed like those of the webhooks
+		frappe.db.commit()
+		return event.name
+
+	def test_failed_events_are_marked_failed(self):
+		name = self.insert_call_event("test-call-1")
+		handlers = {"Exotel": f"{__name__}.fail_call_events"}
+
+		with patch.dict(crm_call_event.CALL_EVENT_HANDLERS, handlers):
+			crm_call_event.process_call_events()
+
+		status, error = frappe.db.get_value("CRM Call Event", name, ["status", "error"])
+		self.assertEqual(status, "Failed")
+		self.assertIn("Call log could not be updated", error)
+
+	def test_processed_events_are_deleted(self):
+		old = add_days(now_datetime(), -crm_call_event.CALL_EVENT_RETENTION_DAYS - 1)
+		old_processed = self.insert_call_event("test-call-1", "Processed", old)
+		old_failed = self.insert_call_event("test-call-2", "Failed", old)
+		processed = self.insert_call_event("test-call-3", "Processed")
+
+		crm_call_event.delete_processed_call_events()
+
+		self.assertFalse(frappe.db.exists("CRM Call Event", old_processed))
+		self.assertTrue(frappe.db.exists("CRM Call Event", old_failed))
+		self.assertTrue(frappe.db.exists("CRM Call Event", processed))
@@ -4,7 +4,7 @@
 import frappe
 from frappe.model.document import Document
 
-from crm.integrations.api import get_contact_by_phone_number
+from crm.integrations.api import get_contacts_by_phone_numbers
 from crm.utils import seconds_to_duration
 
 
@@ -81,7 +81,7 @@ class CRMCallLog(Document):
 		return {"columns": columns, "rows": rows}
 
 	def parse_list_data(calls):
-		return [parse_call_log(call) for call in calls] if calls else []
+		return parse_call_logs(calls)
 
 	def has_link(self, doctype, name):
 		for link in self.links:
@@ -96,42 +96,71 @@ class CRMCallLog(Document):
 
 
 def parse_call_log(call):
-	call["show_recording"] = False
-	call["_duration"] = seconds_to_duration(call.get("duration"))
-	if call.get("type") == "Incoming":
-		call["activity_type"] = "incoming_call"
-		contact = get_contact_by_phone_number(call.get("from"))
-		receiver = (
-			frappe.db.get_values("User", call.get("receiver"), ["full_name", "user_image"])[0]
-			if call.get("receiver")
-			else [None, None]
-		)
-		call["_caller"] = {
-			"label": contact.get("full_name", "Unknown"),
-			"image": contact.get("image"),
-		}
-		call["_receiver"] = {
-			"label": receiver[0],
-			"image": receiver[1],
-		}
-	elif call.get("type") == "Outgoing":
-		call["activity_type"] = "outgoing_call"
-		contact = get_contact_by_phone_number(call.get("to"))
-		caller = (
-			frappe.db.get_values("User", call.get("caller"), ["full_name", "user_image"])[0]
-			if call.get("caller")
-			else [None, None]
-		)
-		call["_caller"] = {
-			"label": caller[0],
-			"image": caller[1],
-		}
-		call["_receiver"] = {
-			"label": contact.get("full_name", "Unknown"),
-			"image": contact.get("image"),
-		}
-
-	return call
+	return parse_call_logs([call])[0]
+
+
+def parse_call_logs(calls):
+	"""
+	Set duration, caller and receiver of `calls`. Contacts of all the numbers and all the users are fetched
+	together and memoized for the request.
+	"""
+	if not calls:
+		return []
+
+	numbers = set()
+	users = set()
+	for call in calls:
+		if call.get("type") == "Incoming":
+			numbers.add(call.get("from"))
+			users.add(call.get("receiver"))
+		elif call.get("type") == "Outgoing":
+			numbers.add(call.get("to"))
+			users.add(call.get("caller"))
+
+	contacts = get_contacts_by_phone_numbers([number for number in numbers if number])
+	users = get_users_info([user for user in users if user])
+
+	for call in calls:
+		call["show_recording"] = False
+		call["_duration"] = seconds_to_duration(call.get("duration"))
+		if call.get("type") == "Incoming":
+			call["activity_type"] = "incoming_call"
+			contact = contacts.get(call.get("from")) or {}
+			receiver = users.get(call.get("receiver")) or {}
+			call["_caller"] = {
+				"label": contact.get("full_name", "Unknown"),
+				"image": contact.get("image"),
+			}
+			call["_receiver"] = {
+				"label": receiver.get("full_name"),
+				"image": receiver.get("user_image"),
+			}
+		elif call.get("type") == "Outgoing":
+			call["activity_type"] = "outgoing_call"
+			contact = contacts.get(call.get("to")) or {}
+			caller = users.get(call.get("caller")) or {}
+			call["_caller"] = {
+				"label": caller.get("full_name"),
+				"image": caller.get("user_image"),
+			}
+			call["_receiver"] = {
+				"label": contact.get("full_name", "Unknown"),
+				"image": contact.get("image"),
+			}
+
+	return calls
+
+
+def get_users_info(users):
+	"""Get full name and image of `users` with a single query, memoized for the request"""
+	memo = frappe.local.cache.setdefault("crm:call_log_users", {})
+	missing = [user for user in users if user not in memo]
+	if missing:
+		for user in frappe.db.get_all(
+			"User", filters={"name": ("in", missing)}, fields=["name", "full_name", "user_image"]
+		):
+			memo[user.name] = user
+	return {user: memo.get(user) for user in users}
 
 
 @frappe.whitelist()
@@ -1,7 +1,6 @@
 import frappe
 
-from crm.api.doc import get_assigned_users, get_fields_meta
-from crm.fcrm.doctype.crm_form_script.crm_form_script import get_form_script
+from crm.api.doc import get_assigned_users, get_fields_meta, get_ui_meta
 
 
 @frappe.whitelist()
@@ -12,7 +11,7 @@ def get_deal(name):
 	deal = deal.as_dict()
 
 	deal["fields_meta"] = get_fields_meta("CRM Deal")
-	deal["_form_script"] = get_form_script("CRM Deal")
+	deal["_form_script"] = get_ui_meta("CRM Deal")["form_script"]
 	return deal
 
 
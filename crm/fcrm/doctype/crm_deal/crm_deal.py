@@ -6,10 +6,11 @@ from frappe import _
 from frappe.desk.form.assign_to import add as assign
 from frappe.model.document import Document
 
-from crm.fcrm.doctype.crm_service_level_agreement.utils import get_sla
+from crm.fcrm.doctype.crm_service_level_agreement.utils import get_sla, get_sla_doc
 from crm.fcrm.doctype.crm_status_change_log.crm_status_change_log import (
 	add_status_change_log,
 )
+from crm.utils.dedup import find_contact_matches, find_organization_matches
 
 
 class CRMDeal(Document):
@@ -129,7 +130,7 @@ class CRMDeal(Document):
 		"""
 		if not self.sla:
 			return
-		sla = frappe.get_last_doc("CRM Service Level Agreement", {"name": self.sla})
+		sla = get_sla_doc(self.sla)
 		if sla:
 			sla.apply(self)
 
@@ -245,9 +246,7 @@ def create_organization(doc):
 	if not doc.get("organization_name"):
 		return
 
-	existing_organization = frappe.db.exists(
-		"CRM Organization", {"organization_name": doc.get("organization_name")}
-	)
+	existing_organization = find_organization_matches([doc.get("organization_name")])[0]
 	if existing_organization:
 		return existing_organization
 
@@ -266,16 +265,8 @@ def create_organization(doc):
 
 
 def contact_exists(doc):
-	email_exist = frappe.db.exists("Contact Email", {"email_id": doc.get("email")})
-	mobile_exist = frappe.db.exists("Contact Phone", {"phone": doc.get("mobile_no")})
-
-	doctype = "Contact Email" if email_exist else "Contact Phone"
-	name = email_exist or mobile_exist
-
-	if name:
-		return frappe.db.get_value(doctype, name, "parent")
-
-	return False
+	match = find_contact_matches([doc], fields=("email", "mobile_no"))[0]
+	return match.contact if match else False
 
 
 def create_contact(doc):
@@ -328,3 +319,7 @@ def create_deal(args):
 
 	deal.insert(ignore_permissions=True)
 	return deal.name
+
+
+def on_doctype_update():
+	frappe.db.add_index("CRM Deal", ["sla_status", "response_by"])
@@ -6,11 +6,16 @@ import requests
 from frappe import _
 from frappe.model.document import Document
 
+from crm.integrations.exotel.client import clear_exotel_cache
+
 
 class CRMExotelSettings(Document):
 	def validate(self):
 		self.verify_credentials()
 
+	def on_update(self):
+		clear_exotel_cache()
+
 	def verify_credentials(self):
 		if self.enabled:
 			response = requests.get(
@@ -4,6 +4,12 @@
 # import frappe
 from frappe.model.document import Document
 
+from crm.fcrm.doctype.crm_service_level_agreement.utils import clear_sla_cache
+
 
 class CRMHolidayList(Document):
-	pass
+	def on_update(self):
+		clear_sla_cache()
+
+	def on_trash(self):
+		clear_sla_cache()
@@ -1,7 +1,6 @@
 import frappe
 
-from crm.api.doc import get_assigned_users, get_fields_meta
-from crm.fcrm.doctype.crm_form_script.crm_form_script import get_form_script
+from crm.api.doc import get_assigned_users, get_fields_meta, get_ui_meta
 
 
 @frappe.whitelist()
@@ -12,5 +11,5 @@ def get_lead(name):
 	lead = lead.as_dict()
 
 	lead["fields_meta"] = get_fields_meta("CRM Lead")
-	lead["_form_script"] = get_form_script("CRM Lead")
+	lead["_form_script"] = get_ui_meta("CRM Lead")["form_script"]
 	return lead
@@ -0,0 +1,207 @@
+import frappe
+from frappe import _
+
+from crm.fcrm.doctype.crm_lead.crm_lead import (
+	build_contact,
+	build_deal,
+	get_converted_lead_values,
+	get_lead_deal_field_map,
+)
+from crm.utils.dedup import find_contact_matches, find_organization_matches
+
+CONVERSION_CHUNK_SIZE = 100
+CONTACT_FIELDS = ["salutation", "first_name", "last_name", "email_id", "mobile_no"]
+
+
+@frappe.whitelist()
+def convert_leads_to_deals(leads=None, filters=None):
+	"""
+	Convert the given leads, or the open leads matching `filters`, to deals in a background job
+
+	Progress is published to the user as `crm_lead_conversion` realtime events.
+	"""
+	if not frappe.has_permission("CRM Lead", "write"):
+		frappe.throw(_("Not allowed to convert Lead to Deal"), frappe.PermissionError)
+
+	filters = frappe.parse_json(filters) if filters else {}
+	if leads:
+		filters = {"name": ("in", frappe.parse_json(leads))}
+
+	if isinstance(filters, dict):
+		filters["converted"] = 0
+	else:
+		filters.append(["CRM Lead", "converted", "=", 0])
+
+	lead_names = frappe.get_list(
+		"CRM Lead", filters=filters, pluck="name", order_by="creation asc", limit_page_length=0
+	)
+	if not lead_names:
+		return {"total": 0}
+
+	frappe.enqueue(
+		"crm.fcrm.doctype.crm_lead.conversion.convert_leads",
+		queue="long",
+		timeout=60 * 60,
+		lead_names=lead_names,
+		user=frappe.session.user,
+		enqueue_after_commit=True,
+	)
+	return {"total": len(lead_names)}
+
+
+def convert_leads(lead_names, user=None, chunk_size=CONVERSION_CHUNK_SIZE):
+	"""Convert leads to deals, `chunk_size` leads per transaction"""
+	user = user or frappe.session.user
+	progress = frappe._dict(total=len(lead_names), converted=0, failed=0, errors=[])
+	field_map = get_lead_deal_field_map()
+
+	for start in range(0, len(lead_names), chunk_size):
+		LeadConversion(lead_names[start : start + chunk_size], field_map).run(progress)
+		frappe.db.commit()
+		publish_progress(progress, user)
+
+	progress.done = True
+	publish_progress(progress, user)
+	return progress
+
+
+def publish_progress(progress, user):
+	frappe.publish_realtime(
+		"crm_lead_conversion",
+		{
+			"total": progress.total,
+			"converted": progress.converted,
+			"failed": progress.failed,
+			"errors": progress.errors[-10:],
+			"done": bool(progress.done),
+		},
+		user=user,
+	)
+
+
+class LeadConversion:
+	"""Converts a chunk of leads, existing contacts and organizations of the chunk are fetched upfront"""
+
+	def __init__(self, lead_names, field_map):
+		self.field_map = field_map
+		self.leads = frappe.get_all(
+			"CRM Lead", filters={"name": ("in", lead_names), "converted": 0}, fields=["*"]
+		)
+		self.contacts = get_existing_contacts(self.leads)
+		self.organizations = {
+			lead.organization: organization
+			for lead, organization in zip(
+				self.leads, find_organization_matches([lead.organization for lead in self.leads]), strict=True
+			)
+			if organization
+		}
+		# contacts created by the chunk, by email and phone, for the later leads with the same ones
+		self.new_contacts = {}
+		self.converted_values = {}
+
+	def run(self, progress):
+		for lead in self.leads:
+			frappe.db.savepoint("lead_conversion")
+			# contacts and organizations created for the lead are rolled back with it if it fails
+			new_contacts, organizations = dict(self.new_contacts), dict(self.organizations)
+			try:
+				self.convert(lead)
+				progress.converted += 1
+			except Exception:
+				frappe.db.rollback(save_point="lead_conversion")
+				self.new_contacts, self.organizations = new_contacts, organizations
+				frappe.clear_last_message()
+				progress.failed += 1
+				progress.errors.append(lead.name)
+				frappe.log_error(title=_("Error while converting lead {0}").format(lead.name))
+
+	def convert(self, lead):
+		values = self.get_converted_values(lead)
+		contact = self.get_existing_contact(lead)
+		if contact:
+			values.update(get_lead_contact_values(contact))
+			contact = contact.name
+		else:
+			contact = self.create_contact(lead)
+
+		frappe.db.set_value("CRM Lead", lead.name, values)
+		build_deal(lead, contact, self.get_organization(lead), field_map=self.field_map).insert(
+			ignore_permissions=True
+		)
+
+	def get_converted_values(self, lead):
+		# only depends on whether the lead has an sla
+		key = bool(lead.sla)
+		if key not in self.converted_values:
+			self.converted_values[key] = get_converted_lead_values(lead)
+		return dict(self.converted_values[key])
+
+	def get_existing_contact(self, lead):
+		return self.contacts.get(lead.name) or next(
+			(
+				self.new_contacts[value]
+				for value in (lead.email, lead.phone, lead.mobile_no)
+				if value and value in self.new_contacts
+			),
+			None,
+		)
+
+	def create_contact(self, lead):
+		contact = build_contact(lead)
+		contact.insert(ignore_permissions=True)
+
+		values = frappe._dict({field: contact.get(field) for field in ["name", *CONTACT_FIELDS]})
+		for value in (lead.email, lead.phone, lead.mobile_no):
+			if value:
+				self.new_contacts.setdefault(value, values)
+		return contact.name
+
+	def get_organization(self, lead):
+		if not lead.organization:
+			return
+		if lead.organization not in self.organizations:
+			organization = frappe.new_doc("CRM Organization")
+			organization.update(
+				{
+					"organization_name": lead.organization,
+					"website": lead.website,
+					"territory": lead.territory,
+					"industry": lead.industry,
+					"annual_revenue": lead.annual_revenue,
+				}
+			)
+			organization.insert(ignore_permissions=True)
+			self.organizations[lead.organization] = organization.name
+		return self.organizations[lead.organization]
+
+
+def get_lead_contact_values(contact):
+	"""Values of the lead updated from its existing contact, as `CRMLead.update_lead_contact` does"""
+	return {
+		"salutation": contact.salutation,
+		"first_name": contact.first_name,
+		"last_name": contact.last_name,
+		"email": contact.email_id,
+		"mobile_no": contact.mobile_no,
+	}
+
+
+def get_existing_contacts(leads):
+	"""Get `{lead: contact}` of the leads matching an existing contact, with the contacts' values"""
+	matches = {
+		lead.name: match.contact
+		for lead, match in zip(leads, find_contact_matches(leads), strict=True)
+		if match
+	}
+	if not matches:
+		return {}
+
+	contacts = {
+		contact.name: contact
+		for contact in frappe.get_all(
+			"Contact",
+			filters={"name": ("in", list(set(matches.values())))},
+			fields=["name", *CONTACT_FIELDS],
+		)
+	}
+	return {lead: contacts[contact] for lead, contact in matches.items() if contact in contacts}
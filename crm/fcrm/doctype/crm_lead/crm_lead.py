@@ -7,10 +7,11 @@ from frappe.desk.form.assign_to import add as assign
 from frappe.model.document import Document
 from frappe.utils import has_gravatar, validate_email_address
 
-from crm.fcrm.doctype.crm_service_level_agreement.utils import get_sla
+from crm.fcrm.doctype.crm_service_level_agreement.utils import get_sla, get_sla_doc
 from crm.fcrm.doctype.crm_status_change_log.crm_status_change_log import (
 	add_status_change_log,
 )
+from crm.utils.dedup import find_contact_matches, find_organization_matches
 
 
 class CRMLead(Document):
@@ -125,28 +126,7 @@ class CRMLead(Document):
 			self.update_lead_contact(existing_contact)
 			return existing_contact
 
-		contact = frappe.new_doc("Contact")
-		contact.update(
-			{
-				"first_name": self.first_name or self.lead_name,
-				"last_name": self.last_name,
-				"salutation": self.salutation,
-				"gender": self.gender,
-				"designation": self.job_title,
-				"company_name": self.organization,
-				"image": self.image or "",
-			}
-		)
-
-		if self.email:
-			contact.append("email_ids", {"email_id": self.email, "is_primary": 1})
-
-		if self.phone:
-			contact.append("phone_nos", {"phone": self.phone, "is_primary_phone": 1})
-
-		if self.mobile_no:
-			contact.append("phone_nos", {"phone": self.mobile_no, "is_primary_mobile_no": 1})
-
+		contact = build_contact(self)
 		contact.insert(ignore_permissions=True)
 		contact.reload()  # load changes by hooks on contact
 
@@ -156,9 +136,7 @@ class CRMLead(Document):
 		if not self.organization and not existing_organization:
 			return
 
-		existing_organization = existing_organization or frappe.db.exists(
-			"CRM Organization", {"organization_name": self.organization}
-		)
+		existing_organization = existing_organization or find_organization_matches([self.organization])[0]
 		if existing_organization:
 			self.db_set("organization", existing_organization)
 			return existing_organization
@@ -191,106 +169,21 @@ class CRMLead(Document):
 		)
 
 	def contact_exists(self, throw=True):
-		email_exist = frappe.db.exists("Contact Email", {"email_id": self.email})
-		phone_exist = frappe.db.exists("Contact Phone", {"phone": self.phone})
-		mobile_exist = frappe.db.exists("Contact Phone", {"phone": self.mobile_no})
-
-		doctype = "Contact Email" if email_exist else "Contact Phone"
-		name = email_exist or phone_exist or mobile_exist
-
-		if name:
-			text = "Email" if email_exist else "Phone" if phone_exist else "Mobile No"
-			data = self.email if email_exist else self.phone if phone_exist else self.mobile_no
-
-			value = "{0}: {1}".format(text, data)
-
-			contact = frappe.db.get_value(doctype, name, "parent")
-
-			if throw:
-				frappe.throw(
-					_("Contact already exists with {0}").format(value),
-					title=_("Contact Already Exists"),
-				)
-			return contact
-
-		return False
-
-	def create_deal(self, contact, organization, deal=None):
-		new_deal = frappe.new_doc("CRM Deal")
-
-		lead_deal_map = {
-			"lead_owner": "deal_owner",
-		}
-
-		restricted_fieldtypes = [
-			"Tab Break",
-			"Section Break",
-			"Column Break",
-			"HTML",
-			"Button",
-			"Attach",
-		]
-		restricted_map_fields = [
-			"name",
-			"naming_series",
-			"creation",
-			"owner",
-			"modified",
-			"modified_by",
-			"idx",
-			"docstatus",
-			"status",
-			"email",
-			"mobile_no",
-			"phone",
-			"sla",
-			"sla_status",
-			"response_by",
-			"first_response_time",
-			"first_responded_on",
-			"communication_status",
-			"sla_creation",
-			"status_change_log",
-		]
-
-		for field in self.meta.fields:
-			if field.fieldtype in restricted_fieldtypes:
-				continue
-			if field.fieldname in restricted_map_fields:
-				continue
-
-			fieldname = field.fieldname
-			if field.fieldname in lead_deal_map:
-				fieldname = lead_deal_map[field.fieldname]
-
-			if hasattr(new_deal, fieldname):
-				if fieldname == "organization":
-					new_deal.update({fieldname: organization})
-				else:
-					new_deal.update({fieldname: self.get(field.fieldname)})
-
-		new_deal.update(
-			{
-				"lead": self.name,
-				"contacts": [{"contact": contact}],
-			}
-		)
-
-		if self.first_responded_on:
-			new_deal.update(
-				{
-					"sla_creation": self.sla_creation,
-					"response_by": self.response_by,
-					"sla_status": self.sla_status,
-					"communication_status": self.communication_status,
-					"first_response_time": self.first_response_time,
-					"first_responded_on": self.first_responded_on,
-				}
+		match = find_contact_matches([self])[0]
+		if not match:
+			return False
+
+		if throw:
+			text = {"email": "Email", "phone": "Phone", "mobile_no": "Mobile No"}[match.field]
+			value = "{0}: {1}".format(text, match.value)
+			frappe.throw(
+				_("Contact already exists with {0}").format(value),
+				title=_("Contact Already Exists"),
 			)
+		return match.contact
 
-		if deal:
-			new_deal.update(deal)
-
+	def create_deal(self, contact, organization, deal=None):
+		new_deal = build_deal(self, contact, organization, deal)
 		new_deal.insert(ignore_permissions=True)
 		return new_deal.name
 
@@ -314,7 +207,7 @@ class CRMLead(Document):
 		"""
 		if not self.sla:
 			return
-		sla = frappe.get_last_doc("CRM Service Level Agreement", {"name": self.sla})
+		sla = get_sla_doc(self.sla)
 		if sla:
 			sla.apply(self)
 
@@ -408,12 +301,135 @@ def convert_to_deal(lead, doc=None, deal=None, existing_contact=None, existing_o
 		frappe.throw(_("Not allowed to convert Lead to Deal"), frappe.PermissionError)
 
 	lead = frappe.get_cached_doc("CRM Lead", lead)
-	if frappe.db.exists("CRM Lead Status", "Qualified"):
-		lead.db_set("status", "Qualified")
-	lead.db_set("converted", 1)
-	if lead.sla and frappe.db.exists("CRM Communication Status", "Replied"):
-		lead.db_set("communication_status", "Replied")
+	lead.db_set(get_converted_lead_values(lead))
 	contact = lead.create_contact(existing_contact, False)
 	organization = lead.create_organization(existing_organization)
 	_deal = lead.create_deal(contact, organization, deal)
 	return _deal
+
+
+def get_converted_lead_values(lead):
+	"""Values set on the lead when it is converted to a deal"""
+	values = {"converted": 1}
+	if frappe.db.exists("CRM Lead Status", "Qualified"):
+		values["status"] = "Qualified"
+	if lead.sla and frappe.db.exists("CRM Communication Status", "Replied"):
+		values["communication_status"] = "Replied"
+	return values
+
+
+def build_contact(lead):
+	"""New contact of the lead, `lead` can be the document or a dict of its values"""
+	contact = frappe.new_doc("Contact")
+	contact.update(
+		{
+			"first_name": lead.first_name or lead.lead_name,
+			"last_name": lead.last_name,
+			"salutation": lead.salutation,
+			"gender": lead.gender,
+			"designation": lead.job_title,
+			"company_name": lead.organization,
+			"image": lead.image or "",
+		}
+	)
+
+	if lead.email:
+		contact.append("email_ids", {"email_id": lead.email, "is_primary": 1})
+
+	if lead.phone:
+		contact.append("phone_nos", {"phone": lead.phone, "is_primary_phone": 1})
+
+	if lead.mobile_no:
+		contact.append("phone_nos", {"phone": lead.mobile_no, "is_primary_mobile_no": 1})
+
+	return contact
+
+
+def get_lead_deal_field_map():
+	"""Get `(lead fieldname, deal fieldname)` of the lead fields copied to the deal on conversion"""
+	lead_deal_map = {
+		"lead_owner": "deal_owner",
+	}
+
+	restricted_fieldtypes = [
+		"Tab Break",
+		"Section Break",
+		"Column Break",
+		"HTML",
+		"Button",
+		"Attach",
+	]
+	restricted_map_fields = [
+		"name",
+		"naming_series",
+		"creation",
+		"owner",
+		"modified",
+		"modified_by",
+		"idx",
+		"docstatus",
+		"status",
+		"email",
+		"mobile_no",
+		"phone",
+		"sla",
+		"sla_status",
+		"response_by",
+		"first_response_time",
+		"first_responded_on",
+		"communication_status",
+		"sla_creation",
+		"status_change_log",
+	]
+
+	deal_meta = frappe.get_meta("CRM Deal")
+	field_map = []
+	for field in frappe.get_meta("CRM Lead").fields:
+		if field.fieldtype in restricted_fieldtypes:
+			continue
+		if field.fieldname in restricted_map_fields:
+			continue
+
+		fieldname = lead_deal_map.get(field.fieldname, field.fieldname)
+		if deal_meta.has_field(fieldname):
+			field_map.append((field.fieldname, fieldname))
+	return field_map
+
+
+def build_deal(lead, contact, organization, deal=None, field_map=None):
+	"""New deal of the lead, `lead` can be the document or a dict of its values"""
+	new_deal = frappe.new_doc("CRM Deal")
+
+	for lead_fieldname, fieldname in field_map or get_lead_deal_field_map():
+		if fieldname == "organization":
+			new_deal.update({fieldname: organization})
+		else:
+			new_deal.update({fieldname: lead.get(lead_fieldname)})
+
+	new_deal.update(
+		{
+			"lead": lead.name,
+			"contacts": [{"contact": contact}],
+		}
+	)
+
+	if lead.first_responded_on:
+		new_deal.update(
+			{
+				"sla_creation": lead.sla_creation,
+				"response_by": lead.response_by,
+				"sla_status": lead.sla_status,
+				"communication_status": lead.communication_status,
+				"first_response_time": lead.first_response_time,
+				"first_responded_on": lead.first_responded_on,
+			}
+		)
+
+	if deal:
+		new_deal.update(deal)
+
+	return new_deal
+
+
+def on_doctype_update():
+	frappe.db.add_index("CRM Lead", ["sla_status", "response_by"])
@@ -1,9 +1,76 @@
 # Copyright (c) 2023, Frappe Technologies Pvt. Ltd. and Contributors
 # See license.txt
 
-# import frappe
-from frappe.tests import UnitTestCase
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from crm.fcrm.doctype.crm_lead.conversion import LeadConversion
+from crm.utils.dedup import find_contact_matches, find_organization_matches
 
 
 class TestCRMLead(UnitTestCase):
-	pass
+	def test_failed_lead_conversion_forgets_its_contacts_and_organizations(self):
+		conversion = LeadConversion.__new__(LeadConversion)
+		conversion.leads = [frappe._dict(name="lead-1"), frappe._dict(name="lead-2")]
+		conversion.new_contacts = {"old@example.com": frappe._dict(name="old-contact")}
+		conversion.organizations = {"Old Org": "Old Org"}
+
+		def convert(lead):
+			# creates a contact and an organization before failing for the second lead
+			conversion.new_contacts[f"{lead.name}@example.com"] = frappe._dict(name=f"{lead.name}-contact")
+			conversion.organizations[f"{lead.name} Org"] = f"{lead.name} Org"
+			if lead.name == "lead-2":
+				raise frappe.ValidationError
+
+		progress = frappe._dict(converted=0, failed=0, errors=[])
+		with (
+			patch.object(conversion, "convert", side_effect=convert),
+			patch.object(frappe.db, "savepoint"),
+			patch.object(frappe.db, "rollback") as rollback,
+			patch.object(frappe, "log_error"),
+		):
+			conversion.run(progress)
+
+		rollback.assert_called_once_with(save_point="lead_conversion")
+		self.assertEqual((progress.converted, progress.failed, progress.errors), (1, 1, ["lead-2"]))
+		self.assertEqual(set(conversion.new_contacts), {"old@example.com", "lead-1@example.com"})
+		self.assertEqual(set(conversion.organizations), {"Old Org", "lead-1 Org"})
+
+
+class IntegrationTestCRMLead(IntegrationTestCase):
+	def test_find_contact_matches(self):
+		contact = frappe.get_doc(
+			{
+				"doctype": "Contact",
+				"first_name": "Dedup",
+				"email_ids": [{"email_id": "dedup.contact@example.com", "is_primary": 1}],
+				"phone_nos": [{"phone": "+91 98765 43210", "is_primary_mobile_no": 1}],
+			}
+		).insert(ignore_permissions=True)
+
+		matches = find_contact_matches(
+			[
+				{"email": " Dedup.Contact@Example.com"},
+				{"email": "someone.else@example.com", "mobile_no": "098765-43210"},
+				{"email": "someone.else@example.com", "mobile_no": "+1 201 555 0123"},
+				{},
+			],
+			default_region="IN",
+		)
+
+		self.assertEqual((matches[0].contact, matches[0].field), (contact.name, "email"))
+		self.assertEqual((matches[1].contact, matches[1].field), (contact.name, "mobile_no"))
+		self.assertIsNone(matches[2])
+		self.assertIsNone(matches[3])
+
+	def test_find_organization_matches(self):
+		organization = frappe.get_doc(
+			{"doctype": "CRM Organization", "organization_name": "Dedup Test Org"}
+		).insert(ignore_permissions=True)
+
+		self.assertEqual(
+			find_organization_matches(["dedup test org ", "DEDUP TEST ORG", "Dedup  Test Org", "", None]),
+			[organization.name, organization.name, None, None, None],
+		)
@@ -5,11 +5,24 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from crm.api.notifications import clear_unread_count
+from crm.api.realtime import publish_debounced
+
 
 class CRMNotification(Document):
 	def on_update(self):
 		if self.to_user:
-			frappe.publish_realtime("crm_notification", user= self.to_user)
+			clear_unread_count(self.to_user)
+			publish_debounced("crm_notification", user=self.to_user)
+
+	def on_trash(self):
+		if self.to_user:
+			clear_unread_count(self.to_user)
+
+
+def on_doctype_update():
+	frappe.db.add_index("CRM Notification", ["to_user", "read", "creation"])
+
 
 def notify_user(args):
 	"""
@@ -0,0 +1,142 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now
+
+from crm.utils import get_phone_keys
+
+PHONE_INDEX_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"modified_by",
+	"owner",
+	"phone_key",
+	"phone",
+	"reference_doctype",
+	"reference_name",
+]
+REBUILD_BATCH_SIZE = 1000
+
+
+class CRMPhoneIndex(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("CRM Phone Index", ["reference_doctype", "reference_name"])
+
+
+def update_phone_index(doc, method=None):
+	"""Re-index phone numbers of a contact, lead or deal when they change"""
+	if doc.doctype != "Contact" and not doc.has_value_changed("mobile_no"):
+		return
+
+	delete_phone_index(doc)
+	insert_phone_index(doc.doctype, [(doc.name, phone) for phone in get_phone_numbers(doc)])
+
+
+def delete_phone_index(doc, method=None):
+	frappe.db.delete("CRM Phone Index", {"reference_doctype": doc.doctype, "reference_name": doc.name})
+
+
+def get_phone_numbers(doc):
+	if doc.doctype == "Contact":
+		return [row.phone for row in doc.phone_nos]
+	return [doc.mobile_no]
+
+
+def insert_phone_index(reference_doctype, phones):
+	"""Index `phones`, a list of (reference_name, phone number) of `reference_doctype`"""
+	timestamp = now()
+	rows = {}
+	for reference_name, phone in phones:
+		for phone_key in get_phone_keys(phone):
+			rows[(reference_name, phone_key)] = [
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				frappe.session.user,
+				frappe.session.user,
+				phone_key,
+				phone,
+				reference_doctype,
+				reference_name,
+			]
+
+	if rows:
+		frappe.db.bulk_insert("CRM Phone Index", PHONE_INDEX_FIELDS, list(rows.values()))
+
+
+def get_references_by_phone(phone_number, doctypes, default_region=None):
+	"""
+	Get names of the `doctypes` records with `phone_number`, in any format
+
+	:return: `{doctype: [names]}`
+	"""
+	return get_references_by_phone_numbers([phone_number], doctypes, default_region).get(phone_number, {})
+
+
+def get_references_by_phone_numbers(phone_numbers, doctypes, default_region=None):
+	"""
+	Get names of the `doctypes` records with each of the `phone_numbers` using a single query. Records
+	matching the main key of a number are preferred over those matching only its fallback key.
+
+	:return: `{phone_number: {doctype: [names]}}`
+	"""
+	keys = {number: get_phone_keys(number, default_region) for number in phone_numbers if number}
+	references = get_references_by_phone_keys({key for _keys in keys.values() for key in _keys}, doctypes)
+	return {
+		number: next((references[key] for key in _keys if key in references), {})
+		for number, _keys in keys.items()
+	}
+
+
+def get_references_by_phone_keys(phone_keys, doctypes):
+	"""
+	Get names of the `doctypes` records indexed with any of the `phone_keys` using a single query
+
+	:return: `{phone_key: {doctype: [names]}}`
+	"""
+	if not phone_keys:
+		return {}
+
+	references = {}
+	for row in frappe.db.get_all(
+		"CRM Phone Index",
+		filters={"phone_key": ("in", list(phone_keys)), "reference_doctype": ("in", doctypes)},
+		fields=["phone_key", "reference_doctype", "reference_name"],
+	):
+		references.setdefault(row.phone_key, {}).setdefault(row.reference_doctype, []).append(
+			row.reference_name
+		)
+	return references
+
+
+def rebuild_phone_index(batch_size=REBUILD_BATCH_SIZE):
+	"""Index phone numbers of all contacts, leads and deals, `batch_size` records at a time"""
+	frappe.db.delete("CRM Phone Index")
+
+	sources = [
+		("Contact", "Contact Phone", [["parenttype", "=", "Contact"]], "parent", "phone"),
+		("CRM Lead", "CRM Lead", [["mobile_no", "is", "set"]], "name", "mobile_no"),
+		("CRM Deal", "CRM Deal", [["mobile_no", "is", "set"]], "name", "mobile_no"),
+	]
+	for reference_doctype, doctype, filters, reference_field, phone_field in sources:
+		last_name = None
+		while True:
+			_filters = (filters + [["name", ">", last_name]]) if last_name else filters
+			rows = frappe.db.get_all(
+				doctype,
+				filters=_filters,
+				fields=list(dict.fromkeys(["name", reference_field, phone_field])),
+				order_by="name asc",
+				limit=batch_size,
+			)
+			if not rows:
+				break
+
+			insert_phone_index(reference_doctype, [(row[reference_field], row[phone_field]) for row in rows])
+			last_name = rows[-1].name
@@ -0,0 +1,55 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+from frappe.tests import UnitTestCase
+
+from crm import utils
+from crm.fcrm.doctype.crm_phone_index import crm_phone_index
+from crm.utils import get_phone_key, get_phone_keys, get_phone_number, parse_phone_number
+
+
+class TestCRMPhoneIndex(UnitTestCase):
+	def test_phone_keys(self):
+		self.assertEqual(get_phone_keys("+1 (201) 555-0123", "IN"), ["+12015550123", "2015550123"])
+		self.assertEqual(get_phone_keys("(201) 555-0123", "US"), ["+12015550123", "2015550123"])
+		self.assertEqual(get_phone_keys("098765 43210", "IN"), ["+919876543210", "9876543210"])
+		self.assertEqual(get_phone_keys("12-345", "IN"), ["12345"])
+		self.assertEqual(get_phone_keys("", "IN"), [])
+		self.assertEqual(get_phone_key("+91 98765 43210", "US"), "+919876543210")
+		self.assertIsNone(get_phone_key(None))
+
+	def test_phone_numbers_are_parsed_once(self):
+		get_phone_number.cache_clear()
+		number = get_phone_number("+91 98765 43210", "IN")
+		self.assertIs(get_phone_number("+91 98765 43210", "IN"), number)
+		self.assertEqual(get_phone_number.cache_info().hits, 1)
+
+		self.assertTrue(number.is_valid)
+		self.assertEqual(number.e164, "+919876543210")
+		self.assertEqual(parse_phone_number("+91 98765 43210")["formats"]["E164"], "+919876543210")
+		self.assertFalse(parse_phone_number("not a number")["success"])
+
+	def test_default_region_is_the_system_country(self):
+		with patch.object(utils, "get_default_phone_region", return_value="US"):
+			self.assertEqual(get_phone_key("(201) 555-0123"), "+12015550123")
+
+	def test_main_key_is_preferred_over_fallback_key(self):
+		references = {
+			"+12015550123": {"Contact": ["by-e164"]},
+			"2015550123": {"Contact": ["by-national-number"]},
+		}
+		with patch.object(crm_phone_index, "get_references_by_phone_keys", return_value=references):
+			self.assertEqual(
+				crm_phone_index.get_references_by_phone_numbers(["+12015550123"], ["Contact"], "IN"),
+				{"+12015550123": {"Contact": ["by-e164"]}},
+			)
+
+		# a number saved without its country code, in another region, is matched by its national number
+		references = {"2015550123": {"Contact": ["saved-without-country-code"]}}
+		with patch.object(crm_phone_index, "get_references_by_phone_keys", return_value=references):
+			self.assertEqual(
+				crm_phone_index.get_references_by_phone(" +1 201 555 0123", ["Contact"], "IN"),
+				{"Contact": ["saved-without-country-code"]},
+			)
@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta
+
+# `working_hours` used below maps weekday (0 is Monday) to `(start, end)` of the working hours on that day
+# in seconds since midnight. Days missing from it are not working days.
+
+
+def get_working_seconds(
+	start_at: datetime,
+	end_at: datetime,
+	working_hours: dict[int, tuple[float, float]],
+	holidays: set[date] | None = None,
+) -> float:
+	"""
+	Get working seconds between `start_at` and `end_at`, one day at a time
+
+	:param holidays: Dates on which no time is counted
+	:return: Number of seconds
+	"""
+	holidays = holidays or set()
+	total_seconds = 0
+	day = start_at.date()
+
+	while day <= end_at.date():
+		window = get_working_window(day, working_hours, holidays)
+		if window:
+			window_start = max(window[0], start_at)
+			window_end = min(window[1], end_at)
+			if window_end > window_start:
+				total_seconds += (window_end - window_start).total_seconds()
+		day += timedelta(days=1)
+
+	return total_seconds
+
+
+def add_working_seconds(
+	start_at: datetime,
+	duration_seconds: float,
+	working_hours: dict[int, tuple[float, float]],
+	holidays: set[date] | None = None,
+) -> datetime | None:
+	"""
+	Get the time at which `duration_seconds` of working time starting at `start_at` runs out
+
+	:param holidays: Dates which are skipped
+	:return: End time, `None` if there are no working hours
+	"""
+	if not any(end > start for start, end in working_hours.values()):
+		return None
+
+	holidays = holidays or set()
+	time_needed = duration_seconds
+	day = start_at.date()
+
+	while True:
+		window = get_working_window(day, working_hours, holidays)
+		if window:
+			window_start = max(window[0], start_at)
+			time_left = (window[1] - window_start).total_seconds()
+			if time_left > 0:
+				if time_needed <= time_left:
+					return window_start + timedelta(seconds=time_needed)
+				time_needed -= time_left
+		day += timedelta(days=1)
+
+
+def get_working_window(
+	day: date, working_hours: dict[int, tuple[float, float]], holidays: set[date]
+) -> tuple[datetime, datetime] | None:
+	"""Returns start and end of the working hours of `day`, `None` on holidays and days off"""
+	if day in holidays or day.weekday() not in working_hours:
+		return None
+
+	start, end = working_hours[day.weekday()]
+	midnight = datetime.combine(day, datetime.min.time())
+	return midnight + timedelta(seconds=start), midnight + timedelta(seconds=end)
+
@@ -3,24 +3,39 @@
 
 import frappe
 from frappe import _
-from datetime import timedelta
 from frappe.model.document import Document
 from frappe.utils import (
-	add_to_date,
 	get_datetime,
 	get_weekdays,
 	getdate,
 	now_datetime,
-	time_diff_in_seconds,
+	to_timedelta,
+)
+from crm.fcrm.doctype.crm_service_level_agreement.business_hours import (
+	add_working_seconds,
+	get_working_seconds,
+)
+from crm.fcrm.doctype.crm_service_level_agreement.utils import (
+	clear_sla_cache,
+	compile_condition,
+	get_context,
 )
-from crm.fcrm.doctype.crm_service_level_agreement.utils import get_context
 
 
 class CRMServiceLevelAgreement(Document):
+	_business_hours = None
+	_holiday_dates = None
+
 	def validate(self):
 		self.validate_default()
 		self.validate_condition()
 
+	def on_update(self):
+		clear_sla_cache()
+
+	def on_trash(self):
+		clear_sla_cache()
+
 	def validate_default(self):
 		if self.default:
 			other_slas = frappe.get_all(
@@ -39,6 +54,8 @@ class CRMServiceLevelAgreement(Document):
 		if not self.condition:
 			return
 		try:
+			# the compiled condition is what `get_sla` evaluates
+			compile_condition(self.condition)
 			temp_doc = frappe.new_doc(self.apply_on)
 			frappe.safe_eval(self.condition, None, get_context(temp_doc))
 		except Exception as e:
@@ -112,62 +129,31 @@ class CRMServiceLevelAgreement(Document):
 		start_at: str,
 		duration_seconds: int,
 	):
-		res = get_datetime(start_at)
-		time_needed = duration_seconds
-		holidays = self.get_holidays()
-		weekdays = get_weekdays()
-		workdays = self.get_workdays()
-		while time_needed:
-			today = res
-			today_day = getdate(today)
-			today_weekday = weekdays[today.weekday()]
-			is_workday = today_weekday in workdays
-			is_holiday = today_day in holidays
-			if is_holiday or not is_workday:
-				res = add_to_date(res, days=1, as_datetime=True)
-				continue
-			today_workday = workdays[today_weekday]
-			now_in_seconds = time_diff_in_seconds(today, today_day)
-			start_time = max(today_workday.start_time.total_seconds(), now_in_seconds)
-			till_start_time = max(start_time - now_in_seconds, 0)
-			end_time = max(today_workday.end_time.total_seconds(), now_in_seconds)
-			time_left = max(end_time - start_time, 0)
-			if not time_left:
-				res = getdate(add_to_date(res, days=1, as_datetime=True))
-				continue
-			time_taken = min(time_needed, time_left)
-			time_needed -= time_taken
-			time_required = till_start_time + time_taken
-			res = add_to_date(res, seconds=time_required, as_datetime=True)
-		return res
+		"""
+		Get the time at which `duration_seconds` of working time starting at `start_at` runs out,
+		skipping non-working hours and holidays
+		"""
+		return add_working_seconds(
+			get_datetime(start_at),
+			duration_seconds,
+			self.get_business_hours(),
+			self.get_holiday_dates(),
+		)
 
 	def calc_elapsed_time(self, start_time, end_time) -> float:
 		"""
-		Get took from start to end, excluding non-working hours
+		Get took from start to end, excluding non-working hours and holidays
 
 		:param start_at: Date at which calculation starts
 		:param end_at: Date at which calculation ends
 		:return: Number of seconds
 		"""
-		start_time = get_datetime(start_time)
-		end_time = get_datetime(end_time)
-		holiday_list = []
-		working_day_list = self.get_working_days()
-		working_hours = self.get_working_hours()
-
-		total_seconds = 0
-		current_time = start_time
-
-		while current_time < end_time:
-			in_holiday_list = current_time.date() in holiday_list
-			not_in_working_day_list = get_weekdays()[current_time.weekday()] not in working_day_list
-			if in_holiday_list or not_in_working_day_list or not self.is_working_time(current_time, working_hours):
-				current_time += timedelta(seconds=1)
-				continue
-			total_seconds += 1
-			current_time += timedelta(seconds=1)
-
-		return total_seconds
+		return get_working_seconds(
+			get_datetime(start_time),
+			get_datetime(end_time),
+			self.get_business_hours(),
+			self.get_holiday_dates(),
+		)
 
 	def get_priorities(self):
 		"""
@@ -188,32 +174,33 @@ class CRMServiceLevelAgreement(Document):
 
 		return self.priorities[0].priority
 
-	def get_workdays(self) -> dict[str, dict]:
+	def get_business_hours(self) -> dict[int, tuple[float, float]]:
 		"""
-		Return workdays related info as a dict. With `workday` as key
+		Return working hours as a dict of weekday (0 is Monday) to (start, end) seconds since midnight
 		"""
-		res = {}
-		for row in self.working_hours:
-			res[row.workday] = row
-		return res
+		if self._business_hours is not None:
+			return self._business_hours
 
-	def get_working_days(self) -> dict[str, dict]:
-		workdays = []
-		for row in self.working_hours:
-			workdays.append(row.workday)
-		return workdays
-
-	def get_working_hours(self) -> dict[str, dict]:
+		weekdays = get_weekdays()
 		res = {}
 		for row in self.working_hours:
-			res[row.workday] = (row.start_time, row.end_time)
+			res[weekdays.index(row.workday)] = (
+				to_timedelta(row.start_time).total_seconds(),
+				to_timedelta(row.end_time).total_seconds(),
+			)
+		self._business_hours = res
 		return res
 
-	def is_working_time(self, date_time, working_hours):
-		day_of_week = get_weekdays()[date_time.weekday()]
-		start_time, end_time = working_hours.get(day_of_week, (0, 0))
-		date_time = timedelta(hours=date_time.hour, minutes=date_time.minute, seconds=date_time.second)
-		return start_time <= date_time < end_time
+	def get_holiday_dates(self) -> set:
+		"""
+		Return dates of the holiday list as a set, loaded once per document
+		"""
+		if self._holiday_dates is None:
+			self._holiday_dates = {getdate(date) for date in self.get_holidays()}
+		return self._holiday_dates
+
+	def set_holiday_dates(self, dates: set):
+		self._holiday_dates = dates
 
 	def get_holidays(self):
 		res = []
@@ -1,9 +1,73 @@
 # Copyright (c) 2023, Frappe Technologies Pvt. Ltd. and Contributors
 # See license.txt
 
-# import frappe
+from datetime import date, datetime
+
+import frappe
 from frappe.tests import UnitTestCase
 
+from crm.fcrm.doctype.crm_service_level_agreement.business_hours import (
+	add_working_seconds,
+	get_working_seconds,
+)
+from crm.fcrm.doctype.crm_service_level_agreement.utils import compile_condition
+
+# 9 to 18, Monday to Friday
+WORKING_HOURS = {weekday: (9 * 3600, 18 * 3600) for weekday in range(5)}
+HOUR = 3600
+
 
 class TestCRMServiceLevelAgreement(UnitTestCase):
-	pass
+	def test_working_seconds_skip_weekends(self):
+		# Friday 17:00 to Monday 10:00
+		start_at, end_at = datetime(2025, 1, 3, 17), datetime(2025, 1, 6, 10)
+		self.assertEqual(get_working_seconds(start_at, end_at, WORKING_HOURS), 2 * HOUR)
+		self.assertEqual(add_working_seconds(start_at, 2 * HOUR, WORKING_HOURS), end_at)
+
+	def test_working_seconds_skip_holidays(self):
+		# Friday 17:00 to Tuesday 10:00, Monday is a holiday
+		start_at, end_at = datetime(2025, 1, 3, 17), datetime(2025, 1, 7, 10)
+		holidays = {date(2025, 1, 6)}
+		self.assertEqual(get_working_seconds(start_at, end_at, WORKING_HOURS, holidays), 2 * HOUR)
+		self.assertEqual(add_working_seconds(start_at, 2 * HOUR, WORKING_HOURS, holidays), end_at)
+
+	def test_working_seconds_outside_working_hours(self):
+		# Monday 8:00 to 20:00
+		start_at, end_at = datetime(2025, 1, 6, 8), datetime(2025, 1, 6, 20)
+		self.assertEqual(get_working_seconds(start_at, end_at, WORKING_HOURS), 9 * HOUR)
+		# Saturday to Sunday
+		saturday, sunday = datetime(2025, 1, 4), datetime(2025, 1, 5, 23)
+		self.assertEqual(get_working_seconds(saturday, sunday, WORKING_HOURS), 0)
+
+	def test_zero_duration(self):
+		start_at = datetime(2025, 1, 6, 10, 30)
+		self.assertEqual(get_working_seconds(start_at, start_at, WORKING_HOURS), 0)
+		self.assertEqual(add_working_seconds(start_at, 0, WORKING_HOURS), start_at)
+		# starting on a Saturday, the time starts running on Monday morning
+		monday_morning = datetime(2025, 1, 6, 9)
+		self.assertEqual(add_working_seconds(datetime(2025, 1, 4, 12), 0, WORKING_HOURS), monday_morning)
+
+	def test_add_working_seconds_across_weeks(self):
+		start_at = datetime(2025, 1, 6, 10, 30)
+		end_at = add_working_seconds(start_at, 5 * 9 * HOUR, WORKING_HOURS)
+		self.assertEqual(end_at, datetime(2025, 1, 13, 10, 30))
+		self.assertEqual(get_working_seconds(start_at, end_at, WORKING_HOURS), 5 * 9 * HOUR)
+
+	def test_no_working_hours(self):
+		self.assertIsNone(add_working_seconds(datetime(2025, 1, 6), HOUR, {}))
+		self.assertIsNone(add_working_seconds(datetime(2025, 1, 6), HOUR, {0: (9 * HOUR, 9 * HOUR)}))
+
+	def test_compile_condition(self):
+		self.assertIsNone(compile_condition(None))
+
+		condition = compile_condition("doc.status == 'New' and frappe.utils.cint(doc.rating) > 2")
+		self.assertTrue(condition(frappe._dict(status="New", rating="3")))
+		self.assertFalse(condition(frappe._dict(status="Lost", rating="3")))
+
+	def test_compile_condition_applies_safe_eval_checks(self):
+		with self.assertRaises(frappe.ValidationError):
+			compile_condition("doc.__class__")
+		with self.assertRaises(SyntaxError):
+			compile_condition("(x := doc.status) == 'New'")
+		with self.assertRaises(NameError):
+			compile_condition("open('/etc/passwd')")(frappe._dict())
@@ -1,51 +1,198 @@
+import json
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
-from frappe.query_builder import JoinType
 from frappe.utils.safe_exec import get_safe_globals
-from frappe.utils import now_datetime
-from pypika import Criterion
+from frappe.utils import getdate, now_datetime
+
+# compiled SLA rules of each site, with the version of the rules they were built from
+_sla_rules = {}
+
+SLA_STATUS_BATCH_SIZE = 500
+
 
 def get_sla(doc: Document) -> Document:
 	"""
 	Get Service Level Agreement for `doc`
 
 	:param doc: Lead/Deal to use
-	:return: Applicable SLA
+	:return: Applicable SLA, shared by all requests of the worker so it must not be modified
 	"""
-	SLA = frappe.qb.DocType("CRM Service Level Agreement")
-	Priority = frappe.qb.DocType("CRM Service Level Priority")
-	now = now_datetime()
+	rules = get_sla_rules()
+	today = now_datetime().date()
 	priority = doc.communication_status
-	q = (
-		frappe.qb.from_(SLA)
-		.select(SLA.name, SLA.condition)
-		.where(SLA.apply_on == doc.doctype)
-		.where(SLA.enabled == True)
-		.where(Criterion.any([SLA.start_date.isnull(), SLA.start_date <= now]))
-		.where(Criterion.any([SLA.end_date.isnull(), SLA.end_date >= now]))
-	)
-	if priority:
-		q = (
-			q.join(Priority, JoinType.inner)
-			.on(Priority.parent == SLA.name)
-			.where(Priority.priority == priority)
+	doc_dict = None
+
+	for rule in rules.rules.get(doc.doctype, []):
+		if rule.start_date and rule.start_date > today:
+			continue
+		if rule.end_date and rule.end_date < today:
+			continue
+		if priority and priority not in rule.priorities:
+			continue
+		if rule.condition:
+			if doc_dict is None:
+				doc_dict = doc.as_dict()
+			if not rule.condition(doc_dict):
+				continue
+		return rules.slas[rule.name]
+
+
+def get_sla_doc(name: str) -> Document | None:
+	"""
+	Get Service Level Agreement `name` with its working hours and holidays preloaded, shared like the SLAs
+	returned by `get_sla` so it must not be modified
+	"""
+	return get_sla_rules().slas.get(name)
+
+
+def get_sla_rules() -> frappe._dict:
+	"""
+	Get SLA rules of the site, built once per worker and rebuilt when an SLA or holiday list changes
+
+	:return: `slas` (name -> SLA) and `rules` (doctype -> enabled SLAs, default last)
+	"""
+	version = get_sla_rules_version()
+	cached = _sla_rules.get(frappe.local.site)
+	if cached and cached[0] == version:
+		return cached[1]
+
+	rules = build_sla_rules()
+	_sla_rules[frappe.local.site] = (version, rules)
+	return rules
+
+
+def build_sla_rules() -> frappe._dict:
+	slas = {sla.name: sla for sla in get_sla_docs()}
+	eval_globals = {"frappe": frappe._dict(utils=get_safe_globals().get("frappe").get("utils"))}
+
+	rules = {}
+	for sla in sorted(slas.values(), key=lambda sla: sla.default):
+		if not sla.enabled:
+			continue
+		try:
+			condition = compile_condition(sla.condition, eval_globals)
+		except Exception:
+			# saved before the condition was checked, not applied until it is fixed
+			frappe.log_error(title=_("Invalid condition of SLA {0}").format(sla.name))
+			continue
+
+		rules.setdefault(sla.apply_on, []).append(
+			frappe._dict(
+				name=sla.name,
+				condition=condition,
+				start_date=getdate(sla.start_date) if sla.start_date else None,
+				end_date=getdate(sla.end_date) if sla.end_date else None,
+				priorities={row.priority for row in sla.priorities},
+			)
 		)
-	sla_list = q.run(as_dict=True)
-	res = None
-
-	# move default sla to the end of the list
-	for sla in sla_list:
-		if sla.get("default") == True:
-			sla_list.remove(sla)
-			sla_list.append(sla)
-			break
-
-	for sla in sla_list:
-		cond = sla.get("condition")
-		if not cond or frappe.safe_eval(cond, None, get_context(doc)):
-			res = sla
-			break
-	return res
+
+	return frappe._dict(slas=slas, rules=rules)
+
+
+def get_sla_docs() -> list[Document]:
+	"""
+	Get all SLAs with their working hours and holidays preloaded, holidays are fetched in a single query
+	"""
+	slas = [
+		frappe.get_doc("CRM Service Level Agreement", name)
+		for name in frappe.get_all("CRM Service Level Agreement", pluck="name")
+	]
+
+	holiday_lists = list({sla.holiday_list for sla in slas if sla.holiday_list})
+	holidays = {}
+	if holiday_lists:
+		for holiday in frappe.get_all(
+			"CRM Holiday",
+			filters={"parenttype": "CRM Holiday List", "parent": ("in", holiday_lists)},
+			fields=["parent", "date"],
+		):
+			holidays.setdefault(holiday.parent, set()).add(getdate(holiday.date))
+
+	for sla in slas:
+		sla.set_holiday_dates(holidays.get(sla.holiday_list, set()))
+		sla.get_business_hours()
+
+	return slas
+
+
+def compile_condition(condition: str | None, eval_globals: dict | None = None):
+	"""
+	Compile SLA condition once into a function of the lead/deal as a dict
+
+	The function is built by `safe_eval`, so the condition goes through the same checks and is evaluated
+	with the same globals as when it is evaluated directly.
+	"""
+	if not condition:
+		return None
+
+	return frappe.safe_eval(f"lambda doc: (\n{condition}\n)", eval_globals)
+
+
+def get_sla_rules_version() -> str:
+	version = frappe.cache.get_value("crm:sla_rules_version")
+	if not version:
+		version = reset_sla_rules_version()
+	return version
+
+
+def reset_sla_rules_version() -> str:
+	version = frappe.generate_hash(length=10)
+	frappe.cache.set_value("crm:sla_rules_version", version)
+	return version
+
+
+def clear_sla_cache(doc=None, method=None):
+	"""
+	Rebuild SLA rules of all workers, called when an SLA or holiday list is changed
+	"""
+	reset_sla_rules_version()
+
+
+def update_overdue_sla_status():
+	"""
+	Mark leads and deals whose first response is overdue as failed
+
+	Runs every 5 minutes, users owning or assigned to the updated documents are notified once per run.
+	"""
+	now = now_datetime()
+	updated = {}
+
+	for doctype, owner_field in (("CRM Lead", "lead_owner"), ("CRM Deal", "deal_owner")):
+		filters = [["sla_status", "=", "First Response Due"], ["response_by", "<=", now]]
+		Table = frappe.qb.DocType(doctype)
+		while True:
+			rows = frappe.db.get_all(
+				doctype,
+				filters=filters,
+				fields=["name", owner_field, "_assign"],
+				limit=SLA_STATUS_BATCH_SIZE,
+				for_update=True,
+			)
+			if not rows:
+				break
+
+			names = [row.name for row in rows]
+			(
+				frappe.qb.update(Table)
+				.set(Table.sla_status, "Failed")
+				.where(Table.name.isin(names))
+				.where(Table.sla_status == "First Response Due")
+			).run()
+			frappe.db.commit()
+
+			for row in rows:
+				for user in {row.get(owner_field), *json.loads(row._assign or "[]")}:
+					if user:
+						updated.setdefault(user, {}).setdefault(doctype, []).append(row.name)
+
+			if len(rows) < SLA_STATUS_BATCH_SIZE:
+				break
+
+	for user, docs in updated.items():
+		frappe.publish_realtime("crm_sla_status_updated", docs, user=user)
+
 
 def get_context(d: Document) -> dict:
 	"""
@@ -58,4 +205,4 @@ def get_context(d: Document) -> dict:
 	return {
 		"doc": d.as_dict(),
 		"frappe": frappe._dict(utils=utils),
-	}
\ No newline at end of file
+	}
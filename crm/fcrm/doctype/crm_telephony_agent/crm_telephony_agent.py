@@ -5,11 +5,19 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from crm.integrations.twilio.twilio_handler import clear_twilio_routing_cache
+
 
 class CRMTelephonyAgent(Document):
 	def validate(self):
 		self.set_primary()
 
+	def on_update(self):
+		clear_twilio_routing_cache()
+
+	def on_trash(self):
+		clear_twilio_routing_cache()
+
 	def set_primary(self):
 		# Used to set primary mobile no.
 		if len(self.phone_nos) == 0:
@@ -6,6 +6,8 @@ from frappe import _
 from frappe.model.document import Document
 from twilio.rest import Client
 
+from crm.integrations.twilio.twilio_handler import clear_twilio_cache
+
 
 class CRMTwilioSettings(Document):
 	friendly_resource_name = "Frappe CRM"  # System creates TwiML app & API keys with this name.
@@ -14,6 +16,8 @@ class CRMTwilioSettings(Document):
 		self.validate_twilio_account()
 
 	def on_update(self):
+		clear_twilio_cache()
+
 		# Single doctype records are created in DB at time of installation and those field values are set as null.
 		# This condition make sure that we handle null.
 		if not self.account_sid:
@@ -6,6 +6,8 @@ import frappe
 from frappe.model.document import Document, get_controller
 from frappe.utils import parse_json
 
+from crm.api.doc import reset_ui_meta_version
+
 
 class CRMViewSettings(Document):
 	pass
@@ -154,12 +156,14 @@ def set_as_default(name=None, type=None, doctype=None):
 		name = doc.name
 
 	# remove default from other views of same user
-	frappe.db.set_value(
-		"CRM View Settings",
-		{"name": ("!=", name), "user": frappe.session.user, "is_default": 1},
-		"is_default",
-		0,
-	)
+	other_defaults = {"name": ("!=", name), "user": frappe.session.user, "is_default": 1}
+	doctypes = {frappe.db.get_value("CRM View Settings", name, "dt")}
+	doctypes.update(frappe.get_all("CRM View Settings", filters=other_defaults, pluck="dt"))
+	frappe.db.set_value("CRM View Settings", other_defaults, "is_default", 0)
+
+	# set_value skips the on_update hook which resets the cached views
+	for dt in doctypes - {None, ""}:
+		reset_ui_meta_version(dt)
 
 
 @frappe.whitelist()
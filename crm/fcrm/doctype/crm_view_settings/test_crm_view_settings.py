@@ -1,9 +1,101 @@
 # Copyright (c) 2023, Frappe Technologies Pvt. Ltd. and Contributors
 # See license.txt
 
-# import frappe
-from frappe.tests import UnitTestCase
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from crm.api.doc import (
+	encode_cursor,
+	get_cursor_pagination,
+	get_kanban_column_counts,
+	get_kanban_column_records,
+	get_keyset_sort,
+	get_next_cursor,
+)
 
 
 class TestCRMViewSettings(UnitTestCase):
-	pass
+	def test_keyset_sort(self):
+		self.assertEqual(get_keyset_sort("CRM Task", "modified desc"), ("modified", "desc"))
+		self.assertEqual(get_keyset_sort("CRM Task", "`tabCRM Task`.`creation` ASC"), ("creation", "asc"))
+		self.assertEqual(get_keyset_sort("CRM Task", "name"), ("name", "desc"))
+		# a nullable field or several fields are paginated with an offset
+		self.assertEqual(get_keyset_sort("CRM Task", "due_date desc"), (None, None))
+		self.assertEqual(get_keyset_sort("CRM Task", "modified desc, name desc"), (None, None))
+		self.assertEqual(get_keyset_sort("CRM Task", None), (None, None))
+
+	def test_cursor_of_another_sort_order_is_rejected(self):
+		cursor = encode_cursor({"order_by": "creation desc", "value": "2026-01-01", "name": "a"})
+		with self.assertRaises(frappe.ValidationError):
+			get_cursor_pagination("CRM Task", {}, "modified desc", cursor)
+		with self.assertRaises(frappe.ValidationError):
+			get_cursor_pagination("CRM Task", {}, "modified desc", "not a cursor")
+
+
+class IntegrationTestCRMViewSettings(IntegrationTestCase):
+	def setUp(self):
+		prefix = f"Cursor Test {frappe.generate_hash(length=6)}"
+		self.filters = {"title": ["like", f"{prefix} %"]}
+		self.tasks = [
+			frappe.get_doc({"doctype": "CRM Task", "title": f"{prefix} {i}"}).insert().name for i in range(7)
+		]
+		# rows with the same sort value are split across pages by `name`
+		for name in self.tasks[:4]:
+			frappe.db.set_value("CRM Task", name, "creation", "2026-01-01 10:00:00", update_modified=False)
+
+	def get_all_pages(self, order_by, page_length=2):
+		names, cursor = [], None
+		while True:
+			pagination = get_cursor_pagination("CRM Task", self.filters, order_by, cursor)
+			data = frappe.get_list(
+				"CRM Task",
+				fields=["name", "creation", "title"],
+				filters=pagination.filters,
+				or_filters=pagination.or_filters,
+				order_by=pagination.order_by,
+				start=pagination.start,
+				page_length=page_length,
+			)
+			names += [row.name for row in data]
+			cursor = get_next_cursor(pagination, data, page_length)
+			if not cursor:
+				return names
+
+	def test_keyset_pages(self):
+		orders = {
+			"creation desc": "creation desc, name desc",
+			"creation asc": "creation asc, name asc",
+			"name asc": "name asc",
+		}
+		for order_by, full_order_by in orders.items():
+			expected = frappe.get_all("CRM Task", filters=self.filters, order_by=full_order_by, pluck="name")
+			self.assertEqual(self.get_all_pages(order_by), expected, order_by)
+
+	def test_offset_pages(self):
+		expected = frappe.get_all("CRM Task", filters=self.filters, order_by="title desc", pluck="name")
+		self.assertEqual(self.get_all_pages("title desc"), expected)
+
+	def test_kanban_columns(self):
+		for name, status in zip(self.tasks, ["Todo"] * 4 + ["Done"] * 2 + ["Backlog"], strict=True):
+			frappe.db.set_value("CRM Task", name, "status", status)
+		filters = [["CRM Task", "title", "like", self.filters["title"][1]]]
+
+		counts = get_kanban_column_counts("CRM Task", "status", filters)
+		self.assertEqual(counts, {"Todo": 4, "Done": 2, "Backlog": 1})
+
+		columns = [{"name": "Todo", "page_length": 3}, {"name": "Done", "page_length": 3}]
+		records = get_kanban_column_records(
+			"CRM Task", ["name", "title"], filters, "status", columns, "title asc"
+		)
+		for column in ("Todo", "Done"):
+			expected = frappe.get_all(
+				"CRM Task",
+				filters={**self.filters, "status": column},
+				order_by="title asc",
+				pluck="name",
+				limit=3,
+			)
+			self.assertEqual([record.name for record in records[column]], expected, column)
+		# only the given columns are fetched, without the column field which isn't one of the rows
+		self.assertNotIn("Backlog", records)
+		self.assertNotIn("status", records["Todo"][0])
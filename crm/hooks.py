@@ -141,13 +141,46 @@ override_doctype_class = {
 doc_events = {
 	"Contact": {
 		"validate": ["crm.api.contact.validate"],
+		"on_update": ["crm.fcrm.doctype.crm_phone_index.crm_phone_index.update_phone_index"],
+		"on_trash": ["crm.fcrm.doctype.crm_phone_index.crm_phone_index.delete_phone_index"],
+	},
+	"CRM Lead": {
+		"on_update": ["crm.fcrm.doctype.crm_phone_index.crm_phone_index.update_phone_index"],
+		"on_trash": ["crm.fcrm.doctype.crm_phone_index.crm_phone_index.delete_phone_index"],
 	},
 	"ToDo": {
 		"after_insert": ["crm.api.todo.after_insert"],
 		"on_update": ["crm.api.todo.on_update"],
 	},
 	"Comment": {
-		"on_update": ["crm.api.comment.on_update"],
+		"on_update": [
+			"crm.api.comment.on_update",
+			"crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed",
+		],
+		"on_trash": ["crm.fcrm.doctype.crm_activity.crm_activity.delete_activity_feed"],
+	},
+	"Version": {
+		"after_insert": ["crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed"],
+	},
+	"Communication": {
+		"on_update": ["crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed"],
+		"on_trash": ["crm.fcrm.doctype.crm_activity.crm_activity.delete_activity_feed"],
+	},
+	"File": {
+		"on_update": ["crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed"],
+		"on_trash": ["crm.fcrm.doctype.crm_activity.crm_activity.delete_activity_feed"],
+	},
+	"CRM Call Log": {
+		"on_update": ["crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed"],
+		"on_trash": ["crm.fcrm.doctype.crm_activity.crm_activity.delete_activity_feed"],
+	},
+	"FCRM Note": {
+		"on_update": ["crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed"],
+		"on_trash": ["crm.fcrm.doctype.crm_activity.crm_activity.delete_activity_feed"],
+	},
+	"CRM Task": {
+		"on_update": ["crm.fcrm.doctype.crm_activity.crm_activity.update_activity_feed"],
+		"on_trash": ["crm.fcrm.doctype.crm_activity.crm_activity.delete_activity_feed"],
 	},
 	"WhatsApp Message": {
 		"validate": ["crm.api.whatsapp.validate"],
@@ -155,35 +188,58 @@ doc_events = {
 	},
 	"CRM Deal": {
 		"on_update": [
-			"crm.fcrm.doctype.erpnext_crm_settings.erpnext_crm_settings.create_customer_in_erpnext"
+			"crm.fcrm.doctype.erpnext_crm_settings.erpnext_crm_settings.create_customer_in_erpnext",
+			"crm.fcrm.doctype.crm_phone_index.crm_phone_index.update_phone_index",
 		],
+		"on_trash": ["crm.fcrm.doctype.crm_phone_index.crm_phone_index.delete_phone_index"],
 	},
 	"User": {
 		"before_validate": ["crm.api.demo.validate_user"],
 		"validate_reset_password": ["crm.api.demo.validate_reset_password"],
 	},
+	"DocType": {
+		"on_update": ["crm.api.doc.clear_ui_meta_cache"],
+		"on_trash": ["crm.api.doc.clear_ui_meta_cache"],
+	},
+	"Custom Field": {
+		"on_update": ["crm.api.doc.clear_ui_meta_cache"],
+		"on_trash": ["crm.api.doc.clear_ui_meta_cache"],
+	},
+	"Property Setter": {
+		"on_update": ["crm.api.doc.clear_ui_meta_cache"],
+		"on_trash": ["crm.api.doc.clear_ui_meta_cache"],
+	},
+	"CRM Form Script": {
+		"on_update": ["crm.api.doc.clear_ui_meta_cache"],
+		"on_trash": ["crm.api.doc.clear_ui_meta_cache"],
+	},
+	"CRM View Settings": {
+		"on_update": ["crm.api.doc.clear_ui_meta_cache"],
+		"on_trash": ["crm.api.doc.clear_ui_meta_cache"],
+	},
 }
 
+# Sessions
+# --------
+
+on_logout = "crm.api.presence.on_logout"
+
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# "all": [
-# "crm.tasks.all"
-# ],
-# "daily": [
-# "crm.tasks.daily"
-# ],
-# "hourly": [
-# "crm.tasks.hourly"
-# ],
-# "weekly": [
-# "crm.tasks.weekly"
-# ],
-# "monthly": [
-# "crm.tasks.monthly"
-# ],
-# }
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"crm.fcrm.doctype.crm_call_event.crm_call_event.enqueue_call_event_processing",
+		],
+		"*/5 * * * *": [
+			"crm.fcrm.doctype.crm_service_level_agreement.utils.update_overdue_sla_status",
+		],
+	},
+	"daily": [
+		"crm.fcrm.doctype.crm_call_event.crm_call_event.delete_processed_call_events",
+	],
+}
 
 # Testing
 # -------
@@ -254,7 +310,10 @@ doc_events = {
 # "crm.auth.validate"
 # ]
 
-after_migrate = ["crm.fcrm.doctype.fcrm_settings.fcrm_settings.after_migrate"]
+after_migrate = [
+	"crm.fcrm.doctype.fcrm_settings.fcrm_settings.after_migrate",
+	"crm.api.whatsapp.add_whatsapp_message_indexes",
+]
 
 standard_dropdown_items = [
 	{
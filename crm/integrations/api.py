@@ -1,8 +1,6 @@
 import frappe
-from frappe.query_builder import Order
-from pypika.functions import Replace
 
-from crm.utils import are_same_phone_number, parse_phone_number
+from crm.fcrm.doctype.crm_phone_index.crm_phone_index import get_references_by_phone_numbers
 
 
 @frappe.whitelist()
@@ -107,75 +105,86 @@ def add_task_to_call_log(call_sid, task):
 @frappe.whitelist()
 def get_contact_by_phone_number(phone_number):
 	"""Get contact by phone number."""
-	number = parse_phone_number(phone_number)
-
-	if number.get("is_valid"):
-		return get_contact(number.get("national_number"), number.get("country"))
-	else:
-		return get_contact(phone_number, number.get("country"), exact_match=True)
+	return get_contact(phone_number)
 
 
-def get_contact(phone_number, country="IN", exact_match=False):
+def get_contact(phone_number, country=None):
+	"""
+	Get contact (preferably one which is the primary contact of a deal) or else an open lead with
+	`phone_number`, looked up by its key in `CRM Phone Index`
+	"""
 	if not phone_number:
 		return {"mobile_no": phone_number}
 
-	cleaned_number = (
-		phone_number.strip()
-		.replace(" ", "")
-		.replace("-", "")
-		.replace("(", "")
-		.replace(")", "")
-		.replace("+", "")
-	)
-
-	# Check if the number is associated with a contact
-	Contact = frappe.qb.DocType("Contact")
-	normalized_phone = Replace(
-		Replace(Replace(Replace(Replace(Contact.mobile_no, " ", ""), "-", ""), "(", ""), ")", ""), "+", ""
-	)
-
-	query = (
-		frappe.qb.from_(Contact)
-		.select(Contact.name, Contact.full_name, Contact.image, Contact.mobile_no)
-		.where(normalized_phone.like(f"%{cleaned_number}%"))
-		.orderby("modified", order=Order.desc)
-	)
-	contacts = query.run(as_dict=True)
-
-	if len(contacts):
+	return frappe._dict(get_contacts_by_phone_numbers([phone_number], country)[phone_number])
+
+
+def get_contacts_by_phone_numbers(phone_numbers, country=None):
+	"""
+	Get contact or lead of each of the `phone_numbers` like `get_contact`, resolving all of them with a few
+	queries. Results are memoized for the rest of the request.
+
+	:return: `{phone_number: contact}`
+	"""
+	memo = frappe.local.cache.setdefault("crm:contacts_by_phone_number", {})
+	missing = {number for number in phone_numbers if number and (number, country) not in memo}
+	if missing:
+		for number, contact in find_contacts_by_phone_numbers(missing, country).items():
+			memo[(number, country)] = contact
+
+	return {number: memo.get((number, country)) or {"mobile_no": number} for number in phone_numbers}
+
+
+def find_contacts_by_phone_numbers(phone_numbers, country=None):
+	references = get_references_by_phone_numbers(phone_numbers, ["Contact", "CRM Lead"], country)
+
+	contact_names = {name for r in references.values() for name in r.get("Contact", [])}
+	lead_names = {name for r in references.values() for name in r.get("CRM Lead", [])}
+
+	contacts = []
+	deals = {}
+	if contact_names:
+		contacts = frappe.db.get_all(
+			"Contact",
+			filters={"name": ("in", list(contact_names))},
+			fields=["name", "full_name", "image", "mobile_no"],
+			order_by="modified desc",
+		)
+		deals = dict(
+			frappe.db.get_all(
+				"CRM Contacts",
+				filters={"parenttype": "CRM Deal", "contact": ("in", list(contact_names)), "is_primary": 1},
+				fields=["contact", "parent"],
+				as_list=True,
+			)
+		)
+
+	leads = []
+	if lead_names:
+		leads = frappe.db.get_all(
+			"CRM Lead",
+			filters={"name": ("in", list(lead_names)), "converted": 0},
+			fields=["name", "lead_name", "image", "mobile_no"],
+			order_by="modified desc",
+		)
+
+	result = {}
+	for number in phone_numbers:
+		_references = references.get(number, {})
+		_contacts = [c for c in contacts if c.name in _references.get("Contact", [])]
+		_leads = [lead for lead in leads if lead.name in _references.get("CRM Lead", [])]
+
 		# Check if the contact is associated with a deal
-		for contact in contacts:
-			if frappe.db.exists("CRM Contacts", {"contact": contact.name, "is_primary": 1}):
-				deal = frappe.db.get_value(
-					"CRM Contacts", {"contact": contact.name, "is_primary": 1}, "parent"
-				)
-				if are_same_phone_number(contact.mobile_no, phone_number, country, validate=not exact_match):
-					contact["deal"] = deal
-					return contact
-		# Else, return the first contact
-		if are_same_phone_number(contacts[0].mobile_no, phone_number, country, validate=not exact_match):
-			return contacts[0]
-
-	# Else, Check if the number is associated with a lead
-	Lead = frappe.qb.DocType("CRM Lead")
-	normalized_phone = Replace(
-		Replace(Replace(Replace(Replace(Lead.mobile_no, " ", ""), "-", ""), "(", ""), ")", ""), "+", ""
-	)
-
-	query = (
-		frappe.qb.from_(Lead)
-		.select(Lead.name, Lead.lead_name, Lead.image, Lead.mobile_no)
-		.where(Lead.converted == 0)
-		.where(normalized_phone.like(f"%{cleaned_number}%"))
-		.orderby("modified", order=Order.desc)
-	)
-	leads = query.run(as_dict=True)
-
-	if len(leads):
-		for lead in leads:
-			if are_same_phone_number(lead.mobile_no, phone_number, country, validate=not exact_match):
-				lead["lead"] = lead.name
-				lead["full_name"] = lead.lead_name
-				return lead
-
-	return {"mobile_no": phone_number}
+		contact = next((c for c in _contacts if c.name in deals), None)
+		if contact:
+			result[number] = {**contact, "deal": deals[contact.name]}
+		# Else, the first contact
+		elif _contacts:
+			result[number] = _contacts[0]
+		# Else, Check if the number is associated with a lead
+		elif _leads:
+			result[number] = {**_leads[0], "lead": _leads[0].name, "full_name": _leads[0].lead_name}
+		else:
+			result[number] = {"mobile_no": number}
+
+	return result
@@ -0,0 +1,104 @@
+import time
+
+import frappe
+import requests
+from requests.adapters import HTTPAdapter
+
+EXOPHONES_CACHE_KEY = "crm:exotel:exophones"
+# exophones older than this are refreshed in the background, the cached list is used meanwhile
+EXOPHONES_TTL = 10 * 60
+EXOPHONES_MAX_AGE = 24 * 60 * 60
+REQUEST_TIMEOUT = 15
+
+# http session shared by all the clients of the worker, keeps the connections to exotel alive
+_session = None
+# client of each site, rebuilt when the settings are modified
+_clients = {}
+
+
+def get_session():
+	global _session
+	if not _session:
+		_session = requests.Session()
+		_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+	return _session
+
+
+class ExotelClient:
+	"""Exotel API client, credentials are read and decrypted once per worker until the settings change"""
+
+	def __init__(self, settings):
+		"""
+		:param settings: `CRM Exotel Settings` doctype
+		"""
+		self.modified = settings.modified
+		self.enabled = settings.enabled
+		self.subdomain = settings.subdomain
+		self.account_sid = settings.account_sid
+		self.api_key = settings.api_key
+		self.api_token = settings.get_password("api_token", raise_exception=False)
+		self.record_call = settings.record_call
+		self.webhook_verify_token = settings.webhook_verify_token
+
+	@classmethod
+	def connect(cls):
+		settings = frappe.get_cached_doc("CRM Exotel Settings")
+		client = _clients.get(frappe.local.site)
+		if not client or client.modified != settings.modified:
+			client = _clients[frappe.local.site] = cls(settings)
+		return client
+
+	def get_endpoint(self, action=None, version="v1", with_credentials=False):
+		credentials = f"{self.api_key}:{self.api_token}@" if with_credentials else ""
+		return f"https://{credentials}{self.subdomain}/{version}/Accounts/{self.account_sid}/{action}"
+
+	def get(self, action, version="v1", **kwargs):
+		return get_session().get(
+			self.get_endpoint(action, version),
+			auth=(self.api_key, self.api_token),
+			timeout=REQUEST_TIMEOUT,
+			**kwargs,
+		)
+
+	def post(self, action, version="v1", **kwargs):
+		return get_session().post(
+			self.get_endpoint(action, version),
+			auth=(self.api_key, self.api_token),
+			timeout=REQUEST_TIMEOUT,
+			**kwargs,
+		)
+
+	def get_exophones(self):
+		"""Get exophones of the account, fetched from exotel only if they were never fetched or are too old"""
+		cached = frappe.cache.get_value(EXOPHONES_CACHE_KEY)
+		if not cached:
+			return self.refresh_exophones()
+
+		if time.time() - cached["fetched_at"] > EXOPHONES_TTL:
+			frappe.enqueue(
+				"crm.integrations.exotel.client.refresh_exophones",
+				queue="short",
+				job_id="crm_exotel_exophones",
+				deduplicate=True,
+			)
+		return cached["numbers"]
+
+	def refresh_exophones(self):
+		response = self.get("IncomingPhoneNumbers", "v2_beta")
+		numbers = [phone.get("friendly_name") for phone in response.json().get("incoming_phone_numbers", [])]
+		frappe.cache.set_value(
+			EXOPHONES_CACHE_KEY,
+			{"numbers": numbers, "fetched_at": time.time()},
+			expires_in_sec=EXOPHONES_MAX_AGE,
+		)
+		return numbers
+
+
+def refresh_exophones():
+	ExotelClient.connect().refresh_exophones()
+
+
+def clear_exotel_cache():
+	"""Drop the client and the exophones of the site, called when `CRM Exotel Settings` is saved"""
+	_clients.pop(frappe.local.site, None)
+	frappe.cache.delete_value(EXOPHONES_CACHE_KEY)
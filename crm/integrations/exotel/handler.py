@@ -4,7 +4,9 @@ import requests
 from frappe import _
 from frappe.integrations.utils import create_request_log
 
+from crm.fcrm.doctype.crm_call_event.crm_call_event import queue_call_event
 from crm.integrations.api import get_contact_by_phone_number
+from crm.integrations.exotel.client import ExotelClient
 
 # Endpoints for webhook
 
@@ -23,6 +25,12 @@ def handle_request(**kwargs):
 	if not is_integration_enabled():
 		return
 
+	if frappe.db.get_single_value("CRM Exotel Settings", "queue_webhooks"):
+		frappe.publish_realtime("exotel_call", kwargs)
+		if kwargs.get("Status") != "free" and kwargs.get("CallSid"):
+			queue_call_event("Exotel", "Status", kwargs.get("CallSid"), kwargs)
+		return
+
 	request_log = create_request_log(
 		kwargs,
 		request_description="Exotel Call",
@@ -66,26 +74,64 @@ def handle_request(**kwargs):
 		frappe.db.commit()
 
 
+def apply_call_events(call_sid, events):
+	"""Apply queued webhook payloads of a call, only the latest status update is applied"""
+	payloads = [event.payload for event in events]
+
+	call_log = get_call_log({"CallSid": call_sid})
+	if not call_log:
+		payload = payloads.pop(0)
+		call_log = create_call_log(
+			call_id=call_sid,
+			from_number=payload.get("CallFrom"),
+			to_number=payload.get("DialWhomNumber"),
+			medium=payload.get("To"),
+			status=get_call_log_status(payload),
+			agent=payload.get("AgentEmail"),
+		)
+
+	if payloads:
+		# failures are raised so that the events are marked as failed
+		set_call_log_details(call_log, get_latest_payload(payloads))
+
+
+def get_latest_payload(payloads):
+	"""Latest of the payloads, a final status is preferred over one which arrived after it"""
+
+	def is_final(payload):
+		status = get_call_log_status(payload, payload.get("Direction"))
+		return status in ["Completed", "No Answer", "Failed", "Canceled"]
+
+	return max(enumerate(payloads), key=lambda p: (is_final(p[1]), p[0]))[1]
+
+
 # Outgoing Call
 @frappe.whitelist()
 def make_a_call(to_number, from_number=None, caller_id=None):
 	if not is_integration_enabled():
 		frappe.throw(_("Please setup Exotel intergration"), title=_("Integration Not Enabled"))
 
-	endpoint = get_exotel_endpoint("Calls/connect.json?details=true")
+	client = ExotelClient.connect()
 
-	if not from_number:
-		from_number = frappe.get_value("CRM Telephony Agent", {"user": frappe.session.user}, "mobile_no")
-
-	if not caller_id:
-		caller_id = frappe.get_value("CRM Telephony Agent", {"user": frappe.session.user}, "exotel_number")
+	if not (from_number and caller_id):
+		agent = (
+			frappe.db.get_value(
+				"CRM Telephony Agent",
+				{"user": frappe.session.user},
+				["mobile_no", "exotel_number"],
+				as_dict=True,
+			)
+			or {}
+		)
+		from_number = from_number or agent.get("mobile_no")
+		caller_id = caller_id or agent.get("exotel_number")
 
 	if not caller_id:
 		frappe.throw(
 			_("You do not have Exotel Number set in your Telephony Agent"), title=_("Exotel Number Missing")
 		)
 
-	if caller_id and caller_id not in get_all_exophones():
+	if caller_id and caller_id not in client.get_exophones():
 		frappe.throw(_("Exotel Number {0} is not valid").format(caller_id), title=_("Invalid Exotel Number"))
 
 	if not from_number:
@@ -93,16 +139,14 @@ def make_a_call(to_number, from_number=None, caller_id=None):
 			_("You do not have mobile number set in your Telephony Agent"), title=_("Mobile Number Missing")
 		)
 
-	record_call = frappe.db.get_single_value("CRM Exotel Settings", "record_call")
-
 	try:
-		response = requests.post(
-			endpoint,
+		response = client.post(
+			"Calls/connect.json?details=true",
 			data={
 				"From": from_number,
 				"To": to_number,
 				"CallerId": caller_id,
-				"Record": "true" if record_call else "false",
+				"Record": "true" if client.record_call else "false",
 				"StatusCallback": get_status_updater_url(),
 				"StatusCallbackEvents[0]": "terminal",
 				"StatusCallbackEvents[1]": "answered",
@@ -131,38 +175,28 @@ def make_a_call(to_number, from_number=None, caller_id=None):
 
 
 def get_exotel_endpoint(action=None, version="v1"):
-	settings = get_exotel_settings()
-	return "https://{api_key}:{api_token}@{subdomain}/{version}/Accounts/{sid}/{action}".format(
-		api_key=settings.api_key,
-		api_token=settings.get_password("api_token"),
-		subdomain=settings.subdomain,
-		version=version,
-		sid=settings.account_sid,
-		action=action,
-	)
+	return ExotelClient.connect().get_endpoint(action, version, with_credentials=True)
 
 
 def get_all_exophones():
-	endpoint = get_exotel_endpoint("IncomingPhoneNumbers", "v2_beta")
-	response = requests.get(endpoint)
-	return [phone.get("friendly_name") for phone in response.json().get("incoming_phone_numbers", [])]
+	return ExotelClient.connect().get_exophones()
 
 
 def get_status_updater_url():
 	from frappe.utils.data import get_url
 
-	webhook_verify_token = frappe.db.get_single_value("CRM Exotel Settings", "webhook_verify_token")
+	webhook_verify_token = ExotelClient.connect().webhook_verify_token
 	return get_url(f"api/method/crm.integrations.exotel.handler.handle_request?key={webhook_verify_token}")
 
 
 def get_exotel_settings():
-	return frappe.get_single("CRM Exotel Settings")
+	return frappe.get_cached_doc("CRM Exotel Settings")
 
 
 def validate_request():
 	# workaround security since exotel does not support request signature
 	# /api/method/<exotel-integration-method>?key=<exotel-webhook=verify-token>
-	webhook_verify_token = frappe.db.get_single_value("CRM Exotel Settings", "webhook_verify_token")
+	webhook_verify_token = ExotelClient.connect().webhook_verify_token
 	key = frappe.request.args.get("key")
 	is_valid = key and key == webhook_verify_token
 
@@ -261,27 +295,29 @@ def get_call_log_status(call_payload, direction="inbound"):
 
 
 def update_call_log(call_payload, status="Ringing", call_log=None):
-	direction = call_payload.get("Direction")
 	call_log = call_log or get_call_log(call_payload)
-	status = get_call_log_status(call_payload, direction)
 	try:
 		if call_log:
-			call_log.status = status
-			# resetting this because call might be redirected to other number
-			call_log.to = call_payload.get("DialWhomNumber") or call_payload.get("To")
-			call_log.duration = (
-				call_payload.get("DialCallDuration") or call_payload.get("ConversationDuration") or 0
-			)
-			call_log.recording_url = call_payload.get("RecordingUrl") if call_payload.get("RecordingUrl") else ""
-			call_log.start_time = call_payload.get("StartTime")
-			call_log.end_time = call_payload.get("EndTime")
-
-			if direction == "incoming" and call_payload.get("AgentEmail"):
-				call_log.receiver = call_payload.get("AgentEmail")
-
-			call_log.save(ignore_permissions=True)
+			set_call_log_details(call_log, call_payload)
 			frappe.db.commit()
 			return call_log
 	except Exception:
 		frappe.log_error(title="Error while updating call record")
 		frappe.db.commit()
+
+
+def set_call_log_details(call_log, call_payload):
+	"""Update `call_log` with the webhook payload, errors are raised to the caller"""
+	direction = call_payload.get("Direction")
+	call_log.status = get_call_log_status(call_payload, direction)
+	# resetting this because call might be redirected to other number
+	call_log.to = call_payload.get("DialWhomNumber") or call_payload.get("To")
+	call_log.duration = call_payload.get("DialCallDuration") or call_payload.get("ConversationDuration") or 0
+	call_log.recording_url = call_payload.get("RecordingUrl") if call_payload.get("RecordingUrl") else ""
+	call_log.start_time = call_payload.get("StartTime")
+	call_log.end_time = call_payload.get("EndTime")
+
+	if direction == "incoming" and call_payload.get("AgentEmail"):
+		call_log.receiver = call_payload.get("AgentEmail")
+
+	call_log.save(ignore_permissions=True)
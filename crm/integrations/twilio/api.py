@@ -4,6 +4,7 @@ import frappe
 from frappe import _
 from werkzeug.wrappers import Response
 
+from crm.fcrm.doctype.crm_call_event.crm_call_event import queue_call_event
 from crm.integrations.api import get_contact_by_phone_number
 
 from .twilio_handler import IncomingCall, Twilio, TwilioCallDetails
@@ -54,21 +55,67 @@ def voice(**kwargs):
 	from_number = _get_caller_number(args.Caller)
 	resp = twilio.generate_twilio_dial_response(from_number, args.To)
 
-	call_details = TwilioCallDetails(args, call_from=from_number)
-	create_call_log(call_details)
+	if is_queue_enabled():
+		queue_call_event("Twilio", "Call", args.CallSid, {**args, "_call_from": from_number})
+	else:
+		create_call_log(TwilioCallDetails(args, call_from=from_number))
 	return Response(resp.to_xml(), mimetype="text/xml")
 
 
 @frappe.whitelist(allow_guest=True)
 def twilio_incoming_call_handler(**kwargs):
 	args = frappe._dict(kwargs)
-	call_details = TwilioCallDetails(args)
-	create_call_log(call_details)
+	if is_queue_enabled():
+		queue_call_event("Twilio", "Call", args.CallSid, args)
+	else:
+		create_call_log(TwilioCallDetails(args))
 
 	resp = IncomingCall(args.From, args.To).process()
 	return Response(resp.to_xml(), mimetype="text/xml")
 
 
+def is_queue_enabled():
+	"""Whether webhooks only queue their payload to be applied in the background"""
+	return frappe.db.get_single_value("CRM Twilio Settings", "queue_webhooks")
+
+
+def apply_call_events(call_sid, events):
+	"""
+	Apply queued webhook payloads of a call, status updates and recordings collapse to the latest
+
+	Statuses are sent to the agent's client by the webhook itself, so only the call log is updated here.
+	"""
+	calls = [frappe._dict(event.payload) for event in events if event.event_type == "Call"]
+	statuses = [frappe._dict(event.payload) for event in events if event.event_type == "Status"]
+	recordings = [frappe._dict(event.payload) for event in events if event.event_type == "Recording"]
+
+	if calls and not frappe.db.exists("CRM Call Log", call_sid):
+		create_call_log(TwilioCallDetails(calls[0], call_from=calls[0].get("_call_from")))
+
+	if not (statuses or recordings):
+		return
+
+	twilio = Twilio.connect()
+	if not (twilio and frappe.db.exists("CRM Call Log", call_sid)):
+		return
+
+	status = get_latest_status(statuses)
+	# failures are raised so that the events are marked as failed
+	set_call_log_details(twilio, call_sid, status=status.CallStatus if status else None)
+
+	if recordings:
+		frappe.db.set_value("CRM Call Log", call_sid, "recording_url", recordings[-1].RecordingUrl)
+
+
+def get_latest_status(statuses):
+	"""Latest of the status updates, a final status is preferred over one which arrived after it"""
+	if not statuses:
+		return None
+
+	final_statuses = ["completed", "busy", "failed", "no-answer", "canceled"]
+	return max(enumerate(statuses), key=lambda s: (s[1].CallStatus in final_statuses, s[0]))[1]
+
+
 def create_call_log(call_details: TwilioCallDetails):
 	details = call_details.to_dict()
 
@@ -104,13 +151,7 @@ def update_call_log(call_sid, status=None):
 		return
 
 	try:
-		call_details = twilio.get_call_info(call_sid)
-		call_log = frappe.get_doc("CRM Call Log", call_sid)
-		call_log.status = TwilioCallDetails.get_call_status(status or call_details.status)
-		call_log.duration = call_details.duration
-		call_log.start_time = get_datetime_from_timestamp(call_details.start_time)
-		call_log.end_time = get_datetime_from_timestamp(call_details.end_time)
-		call_log.save(ignore_permissions=True)
+		call_log = set_call_log_details(twilio, call_sid, status)
 		frappe.db.commit()
 		return call_log
 	except Exception:
@@ -118,10 +159,26 @@ def update_call_log(call_sid, status=None):
 		frappe.db.commit()
 
 
+def set_call_log_details(twilio, call_sid, status=None):
+	"""Update call log with the call details fetched from Twilio, errors are raised to the caller"""
+	call_details = twilio.get_call_info(call_sid)
+	call_log = frappe.get_doc("CRM Call Log", call_sid)
+	call_log.status = TwilioCallDetails.get_call_status(status or call_details.status)
+	call_log.duration = call_details.duration
+	call_log.start_time = get_datetime_from_timestamp(call_details.start_time)
+	call_log.end_time = get_datetime_from_timestamp(call_details.end_time)
+	call_log.save(ignore_permissions=True)
+	return call_log
+
+
 @frappe.whitelist(allow_guest=True)
 def update_recording_info(**kwargs):
 	try:
 		args = frappe._dict(kwargs)
+		if is_queue_enabled():
+			queue_call_event("Twilio", "Recording", args.CallSid, args)
+			return
+
 		recording_url = args.RecordingUrl
 		call_sid = args.CallSid
 		update_call_log(call_sid)
@@ -134,22 +191,40 @@ def update_recording_info(**kwargs):
 def update_call_status_info(**kwargs):
 	try:
 		args = frappe._dict(kwargs)
+		if is_queue_enabled():
+			queue_call_event("Twilio", "Status", args.ParentCallSid, args)
+			# every transition reaches the agent's call UI right away, only the call log update is queued
+			send_call_status(args)
+			return
+
 		parent_call_sid = args.ParentCallSid
 		update_call_log(parent_call_sid, status=args.CallStatus)
+		notify_call_status(args)
+	except Exception:
+		frappe.log_error(title=_("Failed to update Twilio call status"))
 
-		call_info = {
-			"ParentCallSid": args.ParentCallSid,
-			"CallSid": args.CallSid,
-			"CallStatus": args.CallStatus,
-			"CallDuration": args.CallDuration,
-			"From": args.From,
-			"To": args.To,
-		}
 
-		client = Twilio.get_twilio_client()
-		client.calls(args.ParentCallSid).user_defined_messages.create(content=json.dumps(call_info))
+def send_call_status(args):
+	"""Send the status, a failure (e.g. the parent call has already ended) doesn't affect the call log"""
+	try:
+		notify_call_status(args)
 	except Exception:
-		frappe.log_error(title=_("Failed to update Twilio call status"))
+		frappe.log_error(title=_("Failed to send Twilio call status"))
+
+
+def notify_call_status(args):
+	"""Send status of the dialed call to the client on the parent call"""
+	call_info = {
+		"ParentCallSid": args.ParentCallSid,
+		"CallSid": args.CallSid,
+		"CallStatus": args.CallStatus,
+		"CallDuration": args.CallDuration,
+		"From": args.From,
+		"To": args.To,
+	}
+
+	client = Twilio.get_twilio_client()
+	client.calls(args.ParentCallSid).user_defined_messages.create(content=json.dumps(call_info))
 
 
 def get_datetime_from_timestamp(timestamp):
@@ -1,13 +1,22 @@
 import frappe
 from frappe import _
-from frappe.utils.password import get_decrypted_password
 from twilio.jwt.access_token import AccessToken
 from twilio.jwt.access_token.grants import VoiceGrant
 from twilio.rest import Client as TwilioClient
 from twilio.twiml.voice_response import Dial, VoiceResponse
 
+from crm.api.presence import get_online_users
+from crm.fcrm.doctype.crm_phone_index.crm_phone_index import get_references_by_phone
+
 from .utils import get_public_url, merge_dicts
 
+ROUTING_TABLE_CACHE_KEY = "crm:twilio:routing_table"
+# agents' numbers and devices are cached for a short while, saving an agent drops the cache right away
+ROUTING_TABLE_TTL = 60
+
+# connector of each site, rebuilt when the settings are modified
+_connectors = {}
+
 
 class Twilio:
 	"""Twilio connector over TwilioClient."""
@@ -17,19 +26,25 @@ class Twilio:
 		:param settings: `CRM Twilio Settings` doctype
 		"""
 		self.settings = settings
+		self.modified = settings.modified
 		self.account_sid = settings.account_sid
 		self.application_sid = settings.twiml_sid
 		self.api_key = settings.api_key
 		self.api_secret = settings.get_password("api_secret")
-		self.twilio_client = self.get_twilio_client()
+		# the client keeps its http connections alive, so it is shared by all the requests of the worker
+		self.twilio_client = TwilioClient(settings.account_sid, settings.get_password("auth_token"))
 
 	@classmethod
 	def connect(self):
-		"""Make a twilio connection."""
-		settings = frappe.get_doc("CRM Twilio Settings")
+		"""Make a twilio connection, reused by the worker until the settings are modified."""
+		settings = frappe.get_cached_doc("CRM Twilio Settings")
 		if not (settings and settings.enabled):
 			return
-		return Twilio(settings=settings)
+
+		twilio = _connectors.get(frappe.local.site)
+		if not twilio or twilio.modified != settings.modified:
+			twilio = _connectors[frappe.local.site] = Twilio(settings=settings)
+		return twilio
 
 	def get_phone_numbers(self):
 		"""Get account's twilio phone numbers."""
@@ -114,14 +129,10 @@ class Twilio:
 
 	@classmethod
 	def get_twilio_client(self):
-		twilio_settings = frappe.get_doc("CRM Twilio Settings")
-		if not twilio_settings.enabled:
+		twilio = Twilio.connect()
+		if not twilio:
 			frappe.throw(_("Please enable twilio settings before making a call."))
-
-		auth_token = get_decrypted_password("CRM Twilio Settings", "CRM Twilio Settings", "auth_token")
-		client = TwilioClient(twilio_settings.account_sid, auth_token)
-
-		return client
+		return twilio.twilio_client
 
 
 class IncomingCall:
@@ -161,32 +172,65 @@ def get_twilio_number_owners(phone_number):
 	# remove special characters from phone number and get only digits also remove white spaces
 	# keep + sign in the number at start of the number
 	phone_number = "".join([c for c in phone_number if c.isdigit() or c == "+"])
+	return get_routing_table().get(phone_number, {})
+
+
+def get_routing_table():
+	"""Get owners of all the twilio numbers, `{twilio_number: {owner: details}}`"""
+	routing_table = frappe.cache.get_value(ROUTING_TABLE_CACHE_KEY)
+	if routing_table is None:
+		routing_table = build_routing_table()
+		frappe.cache.set_value(ROUTING_TABLE_CACHE_KEY, routing_table, expires_in_sec=ROUTING_TABLE_TTL)
+	return routing_table
+
+
+def build_routing_table():
 	user_voice_settings = frappe.get_all(
 		"CRM Telephony Agent",
-		filters={"twilio_number": phone_number},
-		fields=["name", "call_receiving_device"],
+		filters={"twilio_number": ("is", "set")},
+		fields=["name", "twilio_number", "call_receiving_device"],
 	)
 	user_wise_voice_settings = {user["name"]: user for user in user_voice_settings}
+	if not user_wise_voice_settings:
+		return {}
 
 	user_general_settings = frappe.get_all(
 		"User", filters=[["name", "IN", user_wise_voice_settings.keys()]], fields=["name", "mobile_no"]
 	)
 	user_wise_general_settings = {user["name"]: user for user in user_general_settings}
 
-	return merge_dicts(user_wise_general_settings, user_wise_voice_settings)
+	routing_table = {}
+	for name, details in merge_dicts(user_wise_general_settings, user_wise_voice_settings).items():
+		routing_table.setdefault(details.pop("twilio_number"), {})[name] = details
+	return routing_table
+
+
+def clear_twilio_routing_cache():
+	"""Drop the cached routing table, called when a `CRM Telephony Agent` is saved or deleted"""
+	frappe.cache.delete_value(ROUTING_TABLE_CACHE_KEY)
+
+
+def clear_twilio_cache():
+	"""Drop the connector of the site, called when `CRM Twilio Settings` is saved"""
+	_connectors.pop(frappe.local.site, None)
 
 
 def get_active_loggedin_users(users):
-	"""Filter the current loggedin users from the given users list"""
-	rows = frappe.db.sql(
-		"""
-		SELECT `user`
-		FROM `tabSessions`
-		WHERE `user` IN %(users)s
-		""",
-		{"users": users},
-	)
-	return [row[0] for row in set(rows)]
+	"""Filter the users who are online in the CRM UI from the given users list"""
+	return get_online_users(users)
+
+
+def get_caller_owner(caller):
+	"""Get owner of the deal, or else of the open lead, with the caller's number"""
+	references = get_references_by_phone(caller, ["CRM Deal", "CRM Lead"])
+	owner = None
+	if references.get("CRM Deal"):
+		owner = frappe.db.get_value("CRM Deal", {"name": ("in", references["CRM Deal"])}, "deal_owner")
+	if not owner and references.get("CRM Lead"):
+		owner = frappe.db.get_value(
+			"CRM Lead", {"name": ("in", references["CRM Lead"]), "converted": False}, "lead_owner"
+		)
+	return owner
 
 
 def get_the_call_attender(owners, caller=None):
@@ -196,14 +240,9 @@ def get_the_call_attender(owners, caller=None):
 	current_loggedin_users = get_active_loggedin_users(list(owners.keys()))
 
 	if len(current_loggedin_users) > 1 and caller:
-		deal_owner = frappe.db.get_value("CRM Deal", {"mobile_no": caller}, "deal_owner")
-		if not deal_owner:
-			deal_owner = frappe.db.get_value(
-				"CRM Lead", {"mobile_no": caller, "converted": False}, "lead_owner"
-			)
-		for user in current_loggedin_users:
-			if user == deal_owner:
-				current_loggedin_users = [user]
+		deal_owner = get_caller_owner(caller)
+		if deal_owner in current_loggedin_users:
+			current_loggedin_users = [deal_owner]
 
 	for name, details in owners.items():
 		if (details["call_receiving_device"] == "Phone" and details["mobile_no"]) or (
@@ -0,0 +1,12 @@
+import frappe
+
+
+def execute():
+	frappe.enqueue(
+		"crm.fcrm.doctype.crm_activity.crm_activity.backfill_activity_feed",
+		queue="long",
+		timeout=4 * 60 * 60,
+		job_id="crm_activity_feed_backfill",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
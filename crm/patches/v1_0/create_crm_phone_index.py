@@ -0,0 +1,12 @@
+import frappe
+
+
+def execute():
+	frappe.enqueue(
+		"crm.fcrm.doctype.crm_phone_index.crm_phone_index.rebuild_phone_index",
+		queue="long",
+		timeout=4 * 60 * 60,
+		job_id="crm_phone_index_rebuild",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
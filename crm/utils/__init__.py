@@ -1,33 +1,77 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+import frappe
 import phonenumbers
 from frappe.utils import floor
 from phonenumbers import NumberParseException
 from phonenumbers import PhoneNumberFormat as PNF
 
 
-def parse_phone_number(phone_number, default_country="IN"):
+PHONE_NUMBER_CACHE_SIZE = 4096
+
+
+class PhoneNumber(NamedTuple):
+	"""Parsed phone number, `error` is set if the number could not be parsed"""
+
+	is_valid: bool = False
+	is_possible: bool = False
+	country_code: int | None = None
+	national_number: str | None = None
+	region: str | None = None
+	number_type: int | None = None
+	e164: str | None = None
+	international: str | None = None
+	national: str | None = None
+	rfc3966: str | None = None
+	error: str | None = None
+
+
+@lru_cache(maxsize=PHONE_NUMBER_CACHE_SIZE)
+def get_phone_number(phone_number: str, default_region: str = "IN") -> PhoneNumber:
+	"""
+	Parse phone number, results are cached per process by (number, region) so that the same number
+	is parsed only once.
+	"""
 	try:
-		# Parse the number
-		number = phonenumbers.parse(phone_number, default_country)
-
-		# Get various information about the number
-		result = {
-			"is_valid": phonenumbers.is_valid_number(number),
-			"country_code": number.country_code,
-			"national_number": str(number.national_number),
-			"formats": {
-				"international": phonenumbers.format_number(number, PNF.INTERNATIONAL),
-				"national": phonenumbers.format_number(number, PNF.NATIONAL),
-				"E164": phonenumbers.format_number(number, PNF.E164),
-				"RFC3966": phonenumbers.format_number(number, PNF.RFC3966),
-			},
-			"type": phonenumbers.number_type(number),
-			"country": phonenumbers.region_code_for_number(number),
-			"is_possible": phonenumbers.is_possible_number(number),
-		}
-
-		return {"success": True, **result}
+		number = phonenumbers.parse(phone_number, default_region)
 	except NumberParseException as e:
-		return {"success": False, "error": str(e)}
+		return PhoneNumber(error=str(e))
+
+	return PhoneNumber(
+		is_valid=phonenumbers.is_valid_number(number),
+		is_possible=phonenumbers.is_possible_number(number),
+		country_code=number.country_code,
+		national_number=str(number.national_number),
+		region=phonenumbers.region_code_for_number(number),
+		number_type=phonenumbers.number_type(number),
+		e164=phonenumbers.format_number(number, PNF.E164),
+		international=phonenumbers.format_number(number, PNF.INTERNATIONAL),
+		national=phonenumbers.format_number(number, PNF.NATIONAL),
+		rfc3966=phonenumbers.format_number(number, PNF.RFC3966),
+	)
+
+
+def parse_phone_number(phone_number, default_country="IN"):
+	number = get_phone_number(phone_number, default_country)
+	if number.error:
+		return {"success": False, "error": number.error}
+
+	return {
+		"success": True,
+		"is_valid": number.is_valid,
+		"country_code": number.country_code,
+		"national_number": number.national_number,
+		"formats": {
+			"international": number.international,
+			"national": number.national,
+			"E164": number.e164,
+			"RFC3966": number.rfc3966,
+		},
+		"type": number.number_type,
+		"country": number.region,
+		"is_possible": number.is_possible,
+	}
 
 
 def are_same_phone_number(number1, number2, default_region="IN", validate=True):
@@ -42,23 +86,50 @@ def are_same_phone_number(number1, number2, default_region="IN", validate=True):
 	Returns:
 	    bool: True if numbers are same, False otherwise
 	"""
-	try:
-		# Parse both numbers
-		parsed1 = phonenumbers.parse(number1, default_region)
-		parsed2 = phonenumbers.parse(number2, default_region)
+	parsed1 = get_phone_number(number1, default_region)
+	parsed2 = get_phone_number(number2, default_region)
 
-		# Check if both numbers are valid
-		if validate and not (phonenumbers.is_valid_number(parsed1) and phonenumbers.is_valid_number(parsed2)):
-			return False
+	if parsed1.error or parsed2.error:
+		return False
 
-		# Convert both to E164 format and compare
-		formatted1 = phonenumbers.format_number(parsed1, phonenumbers.PhoneNumberFormat.E164)
-		formatted2 = phonenumbers.format_number(parsed2, phonenumbers.PhoneNumberFormat.E164)
+	# Check if both numbers are valid
+	if validate and not (parsed1.is_valid and parsed2.is_valid):
+		return False
 
-		return formatted1 == formatted2
+	return parsed1.e164 == parsed2.e164
 
-	except phonenumbers.NumberParseException:
-		return False
+
+def get_default_phone_region():
+	"""Get the region numbers without a country code are parsed in, the country of System Settings or India"""
+	country = frappe.db.get_single_value("System Settings", "country")
+	code = country and frappe.db.get_value("Country", country, "code", cache=True)
+	return (code or "IN").upper()
+
+
+def get_phone_keys(phone_number, default_region=None):
+	"""
+	Get the keys a phone number is indexed with, so that the same number in any format has the same keys.
+
+	A valid number has its E.164 format as the main key and its national number as a fallback key, which
+	matches the number saved without its country code. Other numbers have their digits as the only key.
+
+	:param default_region: region of numbers without a country code, defaults to the system country
+	"""
+	if not phone_number:
+		return []
+
+	number = get_phone_number(phone_number, default_region or get_default_phone_region())
+	if number.is_valid:
+		return [number.e164, number.national_number]
+
+	digits = "".join(c for c in phone_number if c.isdigit())
+	return [digits] if digits else []
+
+
+def get_phone_key(phone_number, default_region=None):
+	"""Get the main key of a phone number, see `get_phone_keys`"""
+	keys = get_phone_keys(phone_number, default_region)
+	return keys[0] if keys else None
 
 
 def seconds_to_duration(seconds):
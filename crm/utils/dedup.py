@@ -0,0 +1,124 @@
+import frappe
+from frappe.query_builder.functions import Lower, Trim
+
+from crm.fcrm.doctype.crm_phone_index.crm_phone_index import get_references_by_phone_numbers
+
+# fields of a candidate record checked against existing contacts, in order of precedence
+CONTACT_MATCH_FIELDS = ("email", "phone", "mobile_no")
+
+
+def normalize_email(email):
+	return (email or "").strip().lower() or None
+
+
+def normalize_organization_name(organization_name):
+	return (organization_name or "").strip().lower() or None
+
+
+def find_contact_matches(records, fields=CONTACT_MATCH_FIELDS, default_region=None):
+	"""
+	Find existing contacts of candidate records, e.g. leads being converted or rows being imported
+
+	Emails are matched case-insensitively against Contact Email and phone numbers by their normalized keys
+	against the phone index, with one query each for the whole batch.
+
+	:param records: dicts (or documents) with any of `fields`
+	:param fields: fields to match, the first matching one wins
+	:param default_region: region of phone numbers without a country code, defaults to the system country
+	:return: a match per record, in order, `{"contact", "field", "value"}` or `None`
+	"""
+	emails = {}
+	phone_numbers = set()
+	for record in records:
+		for field in fields:
+			value = record.get(field)
+			if not value:
+				continue
+			if field == "email":
+				emails[value] = normalize_email(value)
+			else:
+				phone_numbers.add(value)
+
+	contacts_by_email = get_contacts_by_emails(set(emails.values()) - {None})
+	contacts_by_phone = get_contacts_by_phone_numbers(phone_numbers, default_region)
+
+	matches = []
+	for record in records:
+		match = None
+		for field in fields:
+			value = record.get(field)
+			if not value:
+				continue
+			if field == "email":
+				contact = contacts_by_email.get(emails[value])
+			else:
+				contact = contacts_by_phone.get(value)
+			if contact:
+				match = frappe._dict(contact=contact, field=field, value=value)
+				break
+		matches.append(match)
+	return matches
+
+
+def get_contacts_by_emails(emails):
+	"""Get `{normalized email: contact}`, the oldest contact wins if several have the email"""
+	if not emails:
+		return {}
+
+	contacts = {}
+	for row in frappe.get_all(
+		"Contact Email",
+		filters={"email_id": ("in", list(emails)), "parenttype": "Contact"},
+		fields=["email_id", "parent"],
+		order_by="creation asc",
+	):
+		contacts.setdefault(normalize_email(row.email_id), row.parent)
+	return contacts
+
+
+def get_contacts_by_phone_numbers(phone_numbers, default_region=None):
+	"""Get `{phone number: contact}` using the phone index"""
+	if not phone_numbers:
+		return {}
+
+	return {
+		phone_number: sorted(references["Contact"])[0]
+		for phone_number, references in get_references_by_phone_numbers(
+			phone_numbers, ["Contact"], default_region
+		).items()
+		if references.get("Contact")
+	}
+
+
+def find_organization_matches(organization_names):
+	"""
+	Find existing organizations by name, ignoring case and surrounding whitespace, with a single query
+
+	Whitespace within the names is compared as is, e.g. "Acme  Inc" doesn't match "Acme Inc".
+
+	:return: a `CRM Organization` name or `None` per given name, in order
+	"""
+	keys = [normalize_organization_name(name) for name in organization_names]
+	organizations = get_organizations_by_names(set(keys) - {None})
+	return [organizations.get(key) for key in keys]
+
+
+def get_organizations_by_names(names):
+	"""Get `{normalized organization name: name}` of the organizations with the normalized `names`"""
+	if not names:
+		return {}
+
+	# normalized in the query as well, so that matching doesn't depend on the collation of the column
+	Organization = frappe.qb.DocType("CRM Organization")
+	rows = (
+		frappe.qb.from_(Organization)
+		.select(Organization.name, Organization.organization_name)
+		.where(Lower(Trim(Organization.organization_name)).isin(list(names)))
+		.orderby(Organization.creation)
+		.run(as_dict=True)
+	)
+
+	organizations = {}
+	for row in rows:
+		organizations.setdefault(normalize_organization_name(row.organization_name), row.name)
+	return organizations
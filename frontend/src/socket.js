@@ -2,6 +2,10 @@ import { io } from 'socket.io-client'
 import { socketio_port } from '../../../../sites/common_site_config.json'
 import { getCachedListResource } from 'frappe-ui/src/resources/listResource'
 import { getCachedResource } from 'frappe-ui/src/resources/resources'
+import { call } from 'frappe-ui'
+
+// keeps the user online for call routing, the server expires presence after 90 seconds
+const HEARTBEAT_INTERVAL = 30 * 1000
 
 export function initSocket() {
   let host = window.location.hostname
@@ -24,5 +28,22 @@ export function initSocket() {
       }
     }
   })
+  trackPresence(socket)
   return socket
+}
+
+function trackPresence(socket) {
+  let interval = null
+  const heartbeat = () => call('crm.api.presence.heartbeat').catch(() => {})
+
+  socket.on('connect', () => {
+    heartbeat()
+    clearInterval(interval)
+    interval = setInterval(heartbeat, HEARTBEAT_INTERVAL)
+  })
+  // other tabs of the user may still be open, so presence is left to expire instead of being removed
+  socket.on('disconnect', () => {
+    clearInterval(interval)
+    interval = null
+  })
 }
\ No newline at end of file
@@ -4,22 +4,55 @@ import { computed, ref } from 'vue'
 
 export const visible = ref(false)
 
+const pageLength = 20
+export const hasMoreNotifications = ref(false)
+
 export const notifications = createResource({
   url: 'crm.api.notifications.get_notifications',
+  makeParams: () => ({ limit: pageLength }),
   initialData: [],
   auto: true,
+  onSuccess: (data) => {
+    hasMoreNotifications.value = data.length == pageLength
+  },
+})
+
+const nextNotifications = createResource({
+  url: 'crm.api.notifications.get_notifications',
+  onSuccess: (data) => {
+    hasMoreNotifications.value = data.length == pageLength
+    notifications.setData([...notifications.data, ...data])
+  },
+})
+
+export function loadMoreNotifications() {
+  let last = notifications.data?.[notifications.data.length - 1]
+  if (!last || nextNotifications.loading) return
+  nextNotifications.submit({
+    limit: pageLength,
+    before: JSON.stringify([last.creation, last.name]),
+  })
+}
+
+export const unreadCount = createResource({
+  url: 'crm.api.notifications.get_unread_count',
+  initialData: 0,
+  auto: true,
 })
 
-export const unreadNotificationsCount = computed(
-  () => notifications.data?.filter((n) => !n.read).length || 0,
-)
+export const unreadNotificationsCount = computed(() => unreadCount.data || 0)
+
+export function reloadNotifications() {
+  notifications.reload()
+  unreadCount.reload()
+}
 
 export const notificationsStore = defineStore('crm-notifications', () => {
   const mark_as_read = createResource({
     url: 'crm.api.notifications.mark_as_read',
     onSuccess: () => {
       mark_as_read.params = {}
-      notifications.reload()
+      reloadNotifications()
     },
   })
 
@@ -0,0 +1,32 @@
+"""
+Time parsing of phone numbers with and without the cache, usage from the bench directory:
+
+`./env/bin/python apps/crm/scripts/benchmark_phone_number_parsing.py [runs]`
+"""
+
+import sys
+from timeit import timeit
+
+from crm.utils import get_phone_number
+
+
+def benchmark(runs=10000):
+	"""Returns average time taken per parse in microseconds"""
+	numbers = ["+91 (766) 667-6666", "07666676666", "+1 415 555 2671", "12345"]
+
+	def uncached():
+		for number in numbers:
+			get_phone_number.__wrapped__(number, "IN")
+
+	def cached():
+		for number in numbers:
+			get_phone_number(number, "IN")
+
+	return {
+		"uncached_us": timeit(uncached, number=runs) / runs / len(numbers) * 1e6,
+		"cached_us": timeit(cached, number=runs) / runs / len(numbers) * 1e6,
+	}
+
+
+if __name__ == "__main__":
+	print(benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
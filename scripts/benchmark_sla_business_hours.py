@@ -0,0 +1,42 @@
+"""
+Time SLA working hours calculations over spans of a few weeks, usage from the bench directory:
+
+`./env/bin/python apps/crm/scripts/benchmark_sla_business_hours.py [runs]`
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+from timeit import timeit
+
+from crm.fcrm.doctype.crm_service_level_agreement.business_hours import (
+	add_working_seconds,
+	get_working_seconds,
+)
+
+
+def benchmark(weeks: int = 4, runs: int = 1000) -> dict:
+	"""Returns average time taken per calculation in microseconds"""
+	working_hours = {weekday: (9 * 3600, 18 * 3600) for weekday in range(5)}
+	start_at = datetime(2025, 1, 6, 10, 30)
+	end_at = start_at + timedelta(weeks=weeks, hours=3)
+	holidays = {date(2025, 1, 26), date(2025, 1, 14)}
+	working_seconds = get_working_seconds(start_at, end_at, working_hours, holidays)
+
+	def elapsed():
+		get_working_seconds(start_at, end_at, working_hours, holidays)
+
+	def target():
+		add_working_seconds(start_at, working_seconds, working_hours, holidays)
+
+	return {
+		"weeks": weeks,
+		"working_seconds": working_seconds,
+		"elapsed_time_us": timeit(elapsed, number=runs) / runs * 1e6,
+		"target_time_us": timeit(target, number=runs) / runs * 1e6,
+	}
+
+
+if __name__ == "__main__":
+	runs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	for weeks in (1, 4, 12):
+		print(benchmark(weeks, runs))